@@ -1,3 +1,4 @@
+import { gzipSync } from 'zlib';
 import { getPostgresPool } from '../database/connection.js';
 
 /**
@@ -223,13 +224,30 @@ class DropoutTrackingController {
   /**
    * Get training data for ML model
    * GET /api/dropout/training-data
+   * Optional ?limit=N&cursor=<student_id> returns one page ordered by student id;
+   * pass the response's next_cursor to get the next page (null on the last one).
+   * Responses are gzipped when the client accepts it.
    */
   async getTrainingData(req, res) {
     try {
       const schoolId = req.user.schoolId;
       const pool = getPostgresPool();
+      const limit = req.query.limit ? Math.min(Math.max(parseInt(req.query.limit) || 1, 1), 50000) : null;
+      const cursor = req.query.cursor || null;
+      
+      const params = [schoolId];
+      let pageFilter = '';
+      let pageClause = '';
+      if (limit) {
+        if (cursor) {
+          params.push(cursor);
+          pageFilter = `AND s.id > $${params.length}`;
+        }
+        params.push(limit);
+        pageClause = `ORDER BY s.id LIMIT $${params.length}`;
+      }
       
-      // Get all students with their features and dropout status
+      // Get all students (or one page of them) with their features and dropout status
       const query = `
         SELECT 
           s.id as student_id,
@@ -249,12 +267,13 @@ class DropoutTrackingController {
         LEFT JOIN attendance a ON s.id = a.student_id
         LEFT JOIN marks m ON s.id = m.student_id
         LEFT JOIN behavior b ON s.id = b.student_id
-        WHERE s.school_id = $1
+        WHERE s.school_id = $1 ${pageFilter}
         GROUP BY s.id, s.name, s.dropout_status, s.dropout_date, s.dropout_reason
         HAVING COUNT(DISTINCT a.id) >= 3 AND COUNT(DISTINCT m.id) >= 1
+        ${pageClause}
       `;
       
-      const result = await pool.query(query, [schoolId]);
+      const result = await pool.query(query, params);
       
       // Format for ML training
       const trainingData = result.rows.map(row => {
@@ -285,14 +304,27 @@ class DropoutTrackingController {
         };
       });
       
-      return res.json({
+      const nextCursor = limit && result.rows.length === limit
+        ? result.rows[result.rows.length - 1].student_id
+        : null;
+      
+      const body = JSON.stringify({
         success: true,
         total_records: trainingData.length,
         dropped_out_count: trainingData.filter(d => d.dropped_out === 1).length,
         active_count: trainingData.filter(d => d.dropped_out === 0).length,
+        next_cursor: nextCursor,
         training_data: trainingData
       });
       
+      res.type('application/json');
+      if (/\bgzip\b/.test(req.headers['accept-encoding'] || '')) {
+        res.set('Content-Encoding', 'gzip');
+        res.set('Vary', 'Accept-Encoding');
+        return res.send(gzipSync(body));
+      }
+      return res.send(body);
+      
     } catch (error) {
       console.error('Get training data error:', error);
       return res.status(500).json({
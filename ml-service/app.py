@@ -1,10 +1,38 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, after_this_request, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from config import Config
-from models.ml_predictor import MLPredictor
-from models.gemini_explainer import GeminiExplainer
+from models.explanation_cache import ExplanationCache
+from models.batch_payload import (
+    ROWS, FORMAT_MIMETYPES, decode_columnar, encode_columnar, gzip_response, request_format, response_format
+)
+from models.explanation_jobs import ExplanationJobs
+from models.feature_schema import DATA_TIER_SCHEMA, FEATURE_SCHEMA, NO_ISSUE_DEFAULTS, TRAINING_SCHEMA
+from models.prediction_cache import PredictionCache, canonical_feature_vector
+from models.prediction_coalescer import PredictionCoalescer
+from models.metrics import (
+    BATCH_SIZE,
+    EXPLANATIONS,
+    REQUEST_LATENCY,
+    REQUESTS,
+    record_cache_lookups,
+    render_metrics,
+    set_model_version,
+    time_stage,
+    time_startup_phase
+)
+from models.model_registry import (
+    promote_shadow, read_current_version, read_shadow_version, set_shadow_version, version_paths
+)
+from models.retrain_jobs import RetrainJobRunner
+from models.shadow_scoring import ShadowScorer
+from models.student_aggregates import StudentAggregates
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import json
 import logging
 import os
+import random
+import threading
+import time
 
 app = Flask(__name__)
 CORS(app)
@@ -13,39 +41,350 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize ML predictor
-ml_predictor = None
-try:
-    model_path = 'models/dropout_model.pkl'
-    if os.path.exists(model_path):
-        ml_predictor = MLPredictor(model_path)
-        logger.info("ML model loaded successfully")
-    else:
-        logger.error(f"Model file not found: {model_path}")
-        logger.error("Please run 'python generate_and_train.py' first to train the model")
-except Exception as e:
-    logger.error(f"Failed to load ML model: {e}")
+LEGACY_MODEL_PATH = 'models/dropout_model.pkl'
+
+def _load_model():
+    """
+    Load the model every worker should serve: the registry's CURRENT version,
+    or the legacy models/dropout_model.pkl if nothing has been published yet.
+    
+    Returns:
+        Tuple (MLPredictor, registry version or None)
+    """
+    from models.ml_predictor import MLPredictor
+    
+    version = read_current_version(Config.MODEL_REGISTRY_DIR)
+    if version:
+        model_path, metadata_path = version_paths(version, Config.MODEL_REGISTRY_DIR)
+        predictor = MLPredictor(
+            model_path,
+            engine=Config.INFERENCE_ENGINE,
+            metadata_path=metadata_path
+        )
+        return predictor, version
+    
+    return MLPredictor(LEGACY_MODEL_PATH, engine=Config.INFERENCE_ENGINE), None
 
-# Initialize Gemini explainer
+# Set by _startup(): the model, Gemini and the explanation pool
+ml_predictor = None
+loaded_registry_version = None
 gemini_explainer = None
-if Config.GEMINI_API_KEY:
+explanation_jobs = None
+
+def _init_model():
+    """Load the served model (see _load_model), logging instead of raising"""
+    global ml_predictor, loaded_registry_version
+    try:
+        if read_current_version(Config.MODEL_REGISTRY_DIR) or os.path.exists(LEGACY_MODEL_PATH):
+            ml_predictor, loaded_registry_version = _load_model()
+            logger.info(f"ML model loaded successfully (version {ml_predictor.model_version})")
+        else:
+            logger.error(f"Model file not found: {LEGACY_MODEL_PATH}")
+            logger.error("Please run 'python generate_and_train.py' first to train the model")
+    except Exception as e:
+        logger.error(f"Failed to load ML model: {e}")
+
+def _init_gemini():
+    """Gemini explainer, plus the thread pool for deadline-bounded explanations"""
+    global gemini_explainer, explanation_jobs
+    if not Config.GEMINI_API_KEY:
+        logger.warning("GEMINI_API_KEY not set - using fallback explanations")
+        return
+    
     try:
-        gemini_explainer = GeminiExplainer(Config.GEMINI_API_KEY)
+        from models.gemini_explainer import GeminiExplainer
+        gemini_explainer = GeminiExplainer(Config.GEMINI_API_KEY, timeout=Config.GEMINI_TIMEOUT_SECONDS)
         logger.info("Gemini AI initialized successfully")
     except Exception as e:
         logger.warning(f"Gemini AI initialization failed: {e}")
-else:
-    logger.warning("GEMINI_API_KEY not set - using fallback explanations")
+        return
+    
+    # Gemini calls that may outlive the /predict deadline
+    if Config.EXPLANATION_DEADLINE_SECONDS > 0:
+        explanation_jobs = ExplanationJobs(
+            Config.EXPLANATION_JOBS_PATH,
+            max_workers=Config.EXPLANATION_WORKERS,
+            ttl_seconds=Config.EXPLANATION_JOBS_TTL_SECONDS
+        )
+
+# Startup progress. The import of this module stays light (Flask, NumPy,
+# SQLite); sklearn, pandas, the model and Gemini are loaded by _startup().
+startup_timings = {}
+_startup_done = threading.Event()
+_startup_lock = threading.Lock()
+_startup_pid = None
+
+def _startup():
+    """Heavy imports, model load, Gemini init and warm-up, each timed as a startup phase"""
+    try:
+        with time_startup_phase('imports', startup_timings):
+            if Config.INFERENCE_ENGINE == 'sklearn':
+                # Unpickling the forest needs sklearn; its predictions need
+                # pandas. The compiled engine reads forest.npz with NumPy.
+                import pandas  # noqa: F401
+                import sklearn.ensemble  # noqa: F401
+            import models.ml_predictor  # noqa: F401
+        with time_startup_phase('model_load', startup_timings):
+            _init_model()
+        with time_startup_phase('gemini_init', startup_timings):
+            _init_gemini()
+        if Config.WARMUP_ON_BOOT:
+            with time_startup_phase('warm_up', startup_timings):
+                _warm_up()
+    except Exception as e:
+        logger.error(f"Startup failed: {e}")
+    finally:
+        _startup_done.set()
+    
+    logger.info("Startup finished: " + ", ".join(
+        f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in startup_timings.items()
+    ))
+
+def start_background_startup():
+    """
+    STARTUP_MODE=background: run _startup() on a daemon thread, once per
+    process. Called by gunicorn's post_worker_init hook and by the first
+    request, so the port answers liveness probes while the model loads.
+    """
+    global _startup_pid
+    with _startup_lock:
+        if _startup_done.is_set() or _startup_pid == os.getpid():
+            return
+        _startup_pid = os.getpid()
+    threading.Thread(target=_startup, name='startup', daemon=True).start()
+
+def _warm_up():
+    """
+    Prime the model and explanation paths before serving traffic. With
+    gunicorn's preload_app this runs once in the master, before fork.
+    """
+    if ml_predictor is None:
+        return
+    
+    try:
+        seconds = ml_predictor.warm_up()
+        sample = dict.fromkeys(ml_predictor.feature_columns, 0)
+        _generate_fallback_explanation(sample, ml_predictor.predict(sample))
+        logger.info(f"Model warm-up finished in {seconds * 1000:.1f} ms")
+    except Exception as e:
+        logger.warning(f"Model warm-up failed: {e}")
+
+def _process_memory():
+    """
+    This process's memory in MB from /proc/self/smaps_rollup. Pss splits
+    copy-on-write pages shared with the master across the processes sharing them.
+    """
+    fields = {'Rss': 'rss_mb', 'Pss': 'pss_mb', 'Shared_Clean': 'shared_clean_mb',
+              'Shared_Dirty': 'shared_dirty_mb', 'Private_Clean': 'private_clean_mb',
+              'Private_Dirty': 'private_dirty_mb'}
+    memory = {'pid': os.getpid()}
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in fields:
+                    memory[fields[name]] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        import resource
+        memory['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return memory
+
+# Background retraining; status files are shared by all workers
+retrain_jobs = RetrainJobRunner(Config.RETRAIN_JOBS_DIR)
+
+_model_swap_lock = threading.Lock()
+_last_model_check = 0.0
+
+def _load_shadow_predictor(version):
+    """MLPredictor for a candidate registry version (loaded on the shadow thread)"""
+    from models.ml_predictor import MLPredictor
+    
+    model_path, metadata_path = version_paths(version, Config.MODEL_REGISTRY_DIR)
+    return MLPredictor(model_path, engine=Config.INFERENCE_ENGINE, metadata_path=metadata_path)
+
+# Candidate model scored next to the served one, after each response is sent
+shadow_version = None
+shadow_scorer = ShadowScorer(
+    _load_shadow_predictor,
+    Config.SHADOW_REPORT_PATH,
+    queue_size=Config.SHADOW_QUEUE_SIZE,
+    flush_seconds=Config.SHADOW_FLUSH_SECONDS
+)
+
+# Initialize explanation cache
+explanation_cache = None
+if Config.EXPLANATION_CACHE_ENABLED:
+    explanation_cache = ExplanationCache(
+        Config.EXPLANATION_CACHE_PATH,
+        max_entries=Config.EXPLANATION_CACHE_MAX_ENTRIES,
+        ttl_seconds=Config.EXPLANATION_CACHE_TTL_SECONDS
+    )
+
+# Initialize prediction cache (shared by all workers through one SQLite file)
+prediction_cache = None
+if Config.PREDICTION_CACHE_ENABLED:
+    prediction_cache = PredictionCache(
+        Config.PREDICTION_CACHE_PATH,
+        max_entries=Config.PREDICTION_CACHE_MAX_ENTRIES
+    )
+
+# Running per-student features fed by POST /events
+student_aggregates = None
+if Config.STUDENT_AGGREGATES_ENABLED:
+    student_aggregates = StudentAggregates(
+        Config.STUDENT_AGGREGATES_PATH,
+        tier_minimums=(
+            (Config.TIER_0_MIN_DAYS, Config.TIER_0_MIN_EXAMS),
+            (Config.TIER_1_MIN_DAYS, Config.TIER_1_MIN_EXAMS),
+            (Config.TIER_2_MIN_DAYS, Config.TIER_2_MIN_EXAMS)
+        )
+    )
+
+# Concurrent single-row predictions on this worker, scored in one model call
+prediction_coalescer = None
+if Config.PREDICTION_BATCH_WINDOW_MS > 0:
+    prediction_coalescer = PredictionCoalescer(
+        window_seconds=Config.PREDICTION_BATCH_WINDOW_MS / 1000,
+        max_batch=Config.PREDICTION_BATCH_MAX_SIZE
+    )
+
+def _refresh_model(force=False):
+    """
+    Swap in the registry's CURRENT version if another worker (or a background
+    job) has published a newer one. Checked at most every MODEL_POLL_SECONDS.
+    
+    The swap rebinds the module-level reference; requests already running
+    keep the predictor they snapshotted in g, so none of them fail mid-swap.
+    """
+    global ml_predictor, loaded_registry_version, shadow_version, _last_model_check
+    
+    now = time.monotonic()
+    if not force and now - _last_model_check < Config.MODEL_POLL_SECONDS:
+        return
+    _last_model_check = now
+    
+    version = read_current_version(Config.MODEL_REGISTRY_DIR)
+    candidate = read_shadow_version(Config.MODEL_REGISTRY_DIR)
+    shadow_version = candidate if candidate != version else None
+    if version is None or version == loaded_registry_version:
+        return
+    
+    with _model_swap_lock:
+        if version == loaded_registry_version:
+            return
+        try:
+            new_predictor, new_version = _load_model()
+            if Config.WARMUP_ON_BOOT:
+                new_predictor.warm_up()
+        except Exception as e:
+            logger.error(f"Failed to load model version {version}, keeping current model: {e}")
+            return
+        
+        ml_predictor = new_predictor
+        loaded_registry_version = new_version
+    
+    logger.info(f"Switched to model version {new_predictor.model_version}")
+    
+    # Predictions and explanations cached for older models no longer apply
+    for cache in (prediction_cache, explanation_cache):
+        if cache is None:
+            continue
+        try:
+            cache.invalidate(keep_version=new_predictor.model_version)
+        except Exception as e:
+            logger.warning(f"{type(cache).__name__} invalidation failed: {e}")
+
+# Probes and metrics answer at once, even while the model is still loading
+_STARTUP_EXEMPT_ENDPOINTS = {'liveness', 'readiness', 'health_check', 'metrics'}
+
+@app.before_request
+def _snapshot_model():
+    """Pick up newly published models, then pin this request to one predictor"""
+    g.request_start = time.perf_counter()
+    if not _startup_done.is_set():
+        start_background_startup()
+        if request.endpoint not in _STARTUP_EXEMPT_ENDPOINTS:
+            _startup_done.wait(Config.STARTUP_WAIT_SECONDS)
+    if _startup_done.is_set():
+        _refresh_model()
+    g.ml_predictor = ml_predictor
+    _report_model_version(ml_predictor)
+    g.shadow_scorer = shadow_scorer
+    shadow_scorer.request_started()
+
+@app.teardown_request
+def _request_finished(exc):
+    """Let the shadow thread use the worker again once no request is running"""
+    scorer = g.pop('shadow_scorer', None)
+    if scorer is not None:
+        scorer.request_finished()
+
+@app.after_request
+def _record_request(response):
+    """Per-endpoint latency and status counts (streamed bodies: time to first byte)"""
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_LATENCY.labels(endpoint).observe(time.perf_counter() - g.request_start)
+    REQUESTS.labels(endpoint, str(response.status_code)).inc()
+    return response
+
+_reported_model = None
+
+def _report_model_version(predictor):
+    """
+    Publish the served model version from each worker (not the preloading
+    master, whose samples would outlive every swap)
+    """
+    global _reported_model
+    
+    version = predictor.model_version if predictor is not None else None
+    if _reported_model == (os.getpid(), version):
+        return
+    
+    previous = _reported_model[1] if _reported_model and _reported_model[0] == os.getpid() else None
+    set_model_version(version, previous)
+    _reported_model = (os.getpid(), version)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics, aggregated across gunicorn workers"""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route('/health/live', methods=['GET'])
+def liveness():
+    """Liveness probe: the worker is up and answering, whether or not the model has loaded"""
+    return jsonify({'status': 'alive', 'pid': os.getpid()}), 200
+
+@app.route('/health/ready', methods=['GET'])
+def readiness():
+    """Readiness probe: 200 once startup has finished and a model is being served"""
+    if not _startup_done.is_set():
+        status, code = 'starting', 503
+    elif g.ml_predictor is None:
+        status, code = 'model_not_loaded', 503
+    else:
+        status, code = 'ready', 200
+    
+    return jsonify({
+        'status': status,
+        'model_version': g.ml_predictor.model_version if g.ml_predictor else None,
+        'startup_seconds': {phase: round(seconds, 3) for phase, seconds in startup_timings.items()}
+    }), code
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
-        'status': 'healthy' if ml_predictor is not None else 'degraded',
+        'status': 'healthy' if g.ml_predictor is not None else ('degraded' if _startup_done.is_set() else 'starting'),
         'service': 'ml-dropout-prediction',
-        'model_loaded': ml_predictor is not None,
+        'model_loaded': g.ml_predictor is not None,
         'gemini_available': gemini_explainer is not None,
-        'model_type': 'RandomForestClassifier' if ml_predictor else None
+        'model_type': 'RandomForestClassifier' if g.ml_predictor else None,
+        'model_version': g.ml_predictor.model_version if g.ml_predictor else None,
+        'explanation_cache': explanation_cache.stats() if explanation_cache else None,
+        'prediction_cache': prediction_cache.stats() if prediction_cache else None,
+        'startup_seconds': {phase: round(seconds, 3) for phase, seconds in startup_timings.items()},
+        'worker': _process_memory()
     })
 
 @app.route('/predict', methods=['POST'])
@@ -74,17 +413,23 @@ def predict_risk():
             "class_name": "10-A"
         }
     }
+    
+    Without "features", the student is scored from the running aggregates
+    of their ingested events (see POST /events).
     """
     try:
         # Check if model is loaded
-        if ml_predictor is None:
+        if g.ml_predictor is None:
             return jsonify({
                 'error': 'ML model not loaded',
                 'message': 'Please run generate_and_train.py to train the model first'
             }), 503
         
-        data = request.get_json()
+        with time_stage('parse_json'):
+            data = request.get_json()
         
+        if data:
+            _fill_features_from_events([data])
         if not data or 'features' not in data:
             return jsonify({
                 'error': 'Missing required field: features'
@@ -93,6 +438,11 @@ def predict_risk():
         features = data['features']
         student_id = data.get('student_id')
         metadata = data.get('metadata', {})
+        if not isinstance(features, dict):
+            return jsonify({
+                'error': 'Invalid features',
+                'message': 'features must be an object'
+            }), 400
         
         # Validate data tier
         data_tier = features.get('data_tier', 0)
@@ -105,7 +455,15 @@ def predict_risk():
             }), 400
         
         # Get ML prediction
-        prediction_result = ml_predictor.predict(features)
+        prediction_result = _predict_cached([features], include_contributions=True)[0]
+        if 'error' in prediction_result:
+            # The features failed schema validation (wrong type, out of
+            # range, or inconsistent counts)
+            return jsonify({
+                'error': 'Invalid features',
+                'message': prediction_result['error']
+            }), 400
+        _shadow_score([features])
         
         # Map confidence based on data tier
         confidence_map = {1: 'low', 2: 'medium', 3: 'high'}
@@ -113,13 +471,16 @@ def predict_risk():
         
         # Generate explanation with feature importance
         explanation_result = None
+        explanation_id = None
         if gemini_explainer:
-            explanation_result = gemini_explainer.generate_explanation(
+            explain = _generate_explanation_within_deadline if explanation_jobs else _generate_explanation
+            explanation_result = explain(
                 {
                     'student_id': student_id, 
                     'features': features, 
                     'metadata': metadata,
-                    'feature_importance': prediction_result['feature_importance']
+                    'feature_importance': prediction_result['feature_importance'],
+                    'feature_contributions': prediction_result['feature_contributions']
                 },
                 {
                     'risk_score': prediction_result['risk_score'],
@@ -127,12 +488,15 @@ def predict_risk():
                     'confidence': confidence
                 }
             )
+            explanation_id = explanation_result.get('explanation_id')
         else:
-            explanation_result = _generate_fallback_explanation(
-                features, 
-                prediction_result,
-                prediction_result['feature_importance']
-            )
+            with time_stage('explanation_fallback'):
+                explanation_result = _generate_fallback_explanation(
+                    features, 
+                    prediction_result,
+                    prediction_result['feature_contributions']
+                )
+            EXPLANATIONS.labels('fallback').inc()
         
         # Build response
         response = {
@@ -145,11 +509,19 @@ def predict_risk():
                 'model_type': 'RandomForest'
             },
             'feature_importance': prediction_result['feature_importance'],
+            'feature_contributions': prediction_result['feature_contributions'],
             'explanation': explanation_result.get('explanation', ''),
             'recommendations': explanation_result.get('recommendations', []),
             'priority_actions': explanation_result.get('priority_actions', []),
             'metadata': metadata
         }
+        if explanation_id:
+            # Gemini missed the deadline; the explanation above is rule-based
+            response.update(
+                explanation_id=explanation_id,
+                explanation_status='pending',
+                explanation_url=f'/explanations/{explanation_id}'
+            )
         
         logger.info(f"ML prediction for student {student_id}: {prediction_result['risk_level']} risk ({prediction_result['risk_score']:.3f})")
         
@@ -162,6 +534,27 @@ def predict_risk():
             'message': str(e)
         }), 500
 
+@app.route('/explanations/<explanation_id>', methods=['GET'])
+def get_explanation(explanation_id):
+    """Gemini explanation that missed the /predict deadline: 202 while pending, 200 once ready"""
+    entry = explanation_jobs.get(explanation_id) if explanation_jobs else None
+    if entry is None:
+        return jsonify({'error': 'Unknown or expired explanation', 'explanation_id': explanation_id}), 404
+    
+    if entry['status'] == 'pending':
+        return jsonify(entry), 202
+    if entry['status'] == 'failed':
+        return jsonify(entry), 500
+    
+    result = entry.pop('result')
+    entry.update(
+        source='gemini' if result.get('success') else 'fallback',
+        explanation=result.get('explanation', ''),
+        recommendations=result.get('recommendations', []),
+        priority_actions=result.get('priority_actions', [])
+    )
+    return jsonify(entry), 200
+
 @app.route('/batch-predict', methods=['POST'])
 def batch_predict():
     """
@@ -171,59 +564,336 @@ def batch_predict():
     {
         "students": [
             {"student_id": "uuid1", "features": {...}},
-            {"student_id": "uuid2", "features": {...}}
-        ]
+            {"student_id": "uuid2", "features": {...}},
+            {"student_id": "uuid3"}          // scored from ingested events
+        ],
+        "include_factors": false,                // optional: per-student top_factors
+        "explain": false,                        // optional: add explanations
+        "explain_levels": ["high", "critical"]   // optional: only explain these levels
     }
+    
+    Columnar JSON (application/vnd.dropout.columnar+json) and MessagePack
+    (application/msgpack) bodies carry one array per column instead; see
+    models/batch_payload.py. Accept picks the response format (default: the
+    request's), and large responses are gzipped for clients that accept it.
     """
     try:
-        if ml_predictor is None:
+        if g.ml_predictor is None:
             return jsonify({
                 'error': 'ML model not loaded',
                 'message': 'Please run generate_and_train.py first'
             }), 503
         
-        data = request.get_json()
+        fmt = request_format(request.mimetype)
+        if fmt != ROWS:
+            return _batch_predict_columnar(fmt)
+        
+        with time_stage('parse_json'):
+            data = request.get_json()
         students = data.get('students', [])
         
         if not students:
             return jsonify({'error': 'No students provided'}), 400
         
-        results = []
-        for student_data in students:
-            features = student_data.get('features', {})
-            data_tier = features.get('data_tier', 0)
-            
-            if data_tier == 0:
-                results.append({
-                    'student_id': student_data.get('student_id'),
-                    'error': 'Insufficient data',
-                    'data_tier': 0
-                })
-                continue
+        BATCH_SIZE.labels('/batch-predict').observe(len(students))
+        _fill_features_from_events(students)
+        include_factors = bool(data.get('include_factors'))
+        results, scored = _score_students(
+            students,
+            include_factors=include_factors,
+            include_contributions=include_factors or bool(data.get('explain'))
+        )
+        _shadow_score([students[i]['features'] for i, _ in scored])
+        
+        # Optional explanations, packed into as few Gemini calls as possible
+        if data.get('explain'):
+            explain_levels = data.get('explain_levels')
+            explain_rows = [
+                (i, prediction) for i, prediction in scored
+                if not explain_levels or prediction['risk_level'] in explain_levels
+            ]
+            items = [
+                (
+                    {
+                        'student_id': students[i].get('student_id'),
+                        'features': students[i]['features'],
+                        'metadata': students[i].get('metadata', {}),
+                        'feature_importance': prediction['feature_importance'],
+                        'feature_contributions': prediction['feature_contributions']
+                    },
+                    {
+                        'risk_score': results[i]['risk_score'],
+                        'risk_level': results[i]['risk_level'],
+                        'confidence': results[i]['confidence']
+                    }
+                )
+                for i, prediction in explain_rows
+            ]
             
-            try:
-                prediction = ml_predictor.predict(features)
-                confidence_map = {1: 'low', 2: 'medium', 3: 'high'}
-                
-                results.append({
-                    'student_id': student_data.get('student_id'),
-                    'risk_score': prediction['risk_score'],
-                    'risk_level': prediction['risk_level'],
-                    'confidence': confidence_map.get(data_tier, 'low'),
-                    'data_tier': data_tier
-                })
-            except Exception as e:
-                results.append({
-                    'student_id': student_data.get('student_id'),
-                    'error': str(e)
-                })
-        
-        return jsonify({'predictions': results}), 200
+            for (i, _), explanation_result in zip(explain_rows, _generate_batch_explanations(items)):
+                results[i]['explanation'] = explanation_result.get('explanation', '')
+                results[i]['recommendations'] = explanation_result.get('recommendations', [])
+                results[i]['priority_actions'] = explanation_result.get('priority_actions', [])
+        
+        if response_format(request.accept_mimetypes, ROWS) != ROWS:
+            return _encode_batch_response(_rows_to_columns(results))
+        with time_stage('serialize_json'):
+            response = jsonify({'predictions': results})
+        return gzip_response(response, request.accept_encodings, Config.BATCH_RESPONSE_GZIP_MIN_BYTES), 200
     
     except Exception as e:
         logger.error(f"Batch prediction error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+BATCH_RESULT_COLUMNS = ('student_id', 'risk_score', 'risk_level', 'confidence', 'data_tier', 'error')
+EXPLANATION_COLUMNS = ('explanation', 'recommendations', 'priority_actions')
+
+def _batch_predict_columnar(fmt):
+    """/batch-predict for a columnar JSON or MessagePack body, scored without a dict per student"""
+    with time_stage('parse_json'):
+        try:
+            data, n_rows = decode_columnar(request.get_data(), fmt)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    if not n_rows:
+        return jsonify({'error': 'No students provided'}), 400
+    
+    BATCH_SIZE.labels('/batch-predict').observe(n_rows)
+    predictor = g.ml_predictor
+    columns = data['features']
+    include_factors = bool(data.get('include_factors'))
+    explain = bool(data.get('explain'))
+    student_ids = data.get('student_id') or [None] * n_rows
+    tiers, bad_tiers, tier_reasons = DATA_TIER_SCHEMA.extract_columns(columns, n_rows)
+    data_tiers = [None if bad else int(tier) for tier, bad in zip(tiers[:, 0].tolist(), bad_tiers)]
+    
+    scored = predictor.predict_columns(columns, n_rows, include_contributions=include_factors or explain)
+    
+    # Rows without enough data are answered like in the row format; a bad
+    # data_tier fails its own row
+    confidence_map = {1: 'low', 2: 'medium', 3: 'high'}
+    errors = scored['error']
+    confidence = [None] * n_rows
+    for i, data_tier in enumerate(data_tiers):
+        if data_tier is None:
+            errors[i] = tier_reasons[i]
+        elif not data_tier:
+            errors[i] = 'Insufficient data'
+        elif errors[i] is None:
+            confidence[i] = confidence_map[data_tier]
+    risk_levels = [level if errors[i] is None else None for i, level in enumerate(scored['risk_level'])]
+    
+    result = {
+        'student_id': student_ids,
+        'risk_score': [
+            None if level is None else score
+            for score, level in zip(scored['risk_score'].tolist(), risk_levels)
+        ],
+        'risk_level': risk_levels,
+        'confidence': confidence,
+        'data_tier': data_tiers,
+        'error': errors
+    }
+    if include_factors:
+        result['top_factors'] = [
+            factors if level is not None else None
+            for factors, level in zip(scored['top_factors'], risk_levels)
+        ]
+    
+    scored_rows = [i for i, level in enumerate(risk_levels) if level is not None]
+    _shadow_score(lambda: [
+        {name: values[i] for name, values in columns.items()} for i in scored_rows
+    ] if scored_rows else None)
+    
+    if explain:
+        explain_levels = data.get('explain_levels')
+        explain_rows = [i for i in scored_rows if not explain_levels or risk_levels[i] in explain_levels]
+        feature_importance = predictor._get_feature_importance()
+        items = []
+        for i in explain_rows:
+            features = {name: values[i] for name, values in columns.items()}
+            items.append((
+                {
+                    'student_id': student_ids[i],
+                    'features': features,
+                    'metadata': {},
+                    'feature_importance': feature_importance,
+                    'feature_contributions': predictor._contributions_dict(scored['contributions'][i])
+                },
+                {
+                    'risk_score': result['risk_score'][i],
+                    'risk_level': risk_levels[i],
+                    'confidence': confidence[i]
+                }
+            ))
+        
+        for name in EXPLANATION_COLUMNS:
+            result[name] = [None] * n_rows
+        for i, explanation_result in zip(explain_rows, _generate_batch_explanations(items)):
+            result['explanation'][i] = explanation_result.get('explanation', '')
+            result['recommendations'][i] = explanation_result.get('recommendations', [])
+            result['priority_actions'][i] = explanation_result.get('priority_actions', [])
+    
+    return _encode_batch_response(result, default_format=fmt)
+
+def _rows_to_columns(results):
+    """Row-format /batch-predict results as result columns"""
+    names = list(BATCH_RESULT_COLUMNS)
+    for name in ('top_factors',) + EXPLANATION_COLUMNS:
+        if any(name in row for row in results):
+            names.append(name)
+    return {name: [row.get(name) for row in results] for name in names}
+
+def _encode_batch_response(columns, default_format=ROWS):
+    """Result columns in the format the client accepts, gzipped if it accepts that"""
+    fmt = response_format(request.accept_mimetypes, default_format)
+    with time_stage('serialize_json'):
+        if fmt == ROWS:
+            names = list(columns)
+            response = jsonify({'predictions': [
+                {name: value for name, value in zip(names, row) if value is not None or name == 'student_id'}
+                for row in zip(*columns.values())
+            ]})
+        else:
+            response = Response(encode_columnar(columns, fmt), mimetype=FORMAT_MIMETYPES[fmt])
+    return gzip_response(response, request.accept_encodings, Config.BATCH_RESPONSE_GZIP_MIN_BYTES), 200
+
+@app.route('/batch-predict/stream', methods=['POST'])
+def batch_predict_stream():
+    """
+    Streaming batch prediction for very large student sets.
+    
+    Request body is NDJSON (Content-Type: application/x-ndjson), one student
+    per line:
+        {"student_id": "uuid1", "features": {...}}
+        {"student_id": "uuid2", "features": {...}}
+    
+    Students are scored in chunks of STREAM_CHUNK_SIZE and each chunk's
+    results are streamed back as NDJSON lines, in input order, as soon as it
+    is scored. Memory stays bounded by the chunk size regardless of input size.
+    Pass ?include_factors=true for per-student top_factors.
+    """
+    if g.ml_predictor is None:
+        return jsonify({
+            'error': 'ML model not loaded',
+            'message': 'Please run generate_and_train.py first'
+        }), 503
+    
+    include_factors = request.args.get('include_factors', 'false').lower() == 'true'
+    chunk_size = Config.STREAM_CHUNK_SIZE
+    
+    def score_chunk(chunk):
+        """Score parsed lines; lines that were not valid JSON keep their error"""
+        students = [student for student in chunk if 'parse_error' not in student]
+        results, _ = _score_students(
+            students,
+            include_factors=include_factors,
+            include_contributions=include_factors,
+            use_cache=False
+        )
+        
+        scored = iter(results)
+        for student in chunk:
+            if 'parse_error' in student:
+                result = {'line': student['line'], 'error': student['parse_error']}
+            else:
+                result = next(scored)
+            yield json.dumps(result) + '\n'
+    
+    def generate():
+        chunk = []
+        n_students = 0
+        try:
+            for line_number, line in enumerate(request.stream, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                
+                try:
+                    student = json.loads(line)
+                    if not isinstance(student, dict):
+                        raise ValueError('Each line must be a JSON object')
+                except ValueError as e:
+                    student = {'line': line_number, 'parse_error': f'Invalid JSON: {e}'}
+                chunk.append(student)
+                n_students += 1
+                
+                if len(chunk) >= chunk_size:
+                    yield from score_chunk(chunk)
+                    chunk = []
+            
+            if chunk:
+                yield from score_chunk(chunk)
+            BATCH_SIZE.labels('/batch-predict/stream').observe(n_students)
+        
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            logger.error(f"Streaming batch prediction error: {str(e)}")
+            yield json.dumps({'error': 'Batch prediction failed', 'message': str(e)}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/events', methods=['POST'])
+def ingest_events():
+    """
+    Record raw attendance, exam and incident events in each student's
+    running aggregates, so later predictions can be served from them.
+    
+    Expected payload:
+    {
+        "events": [
+            {"type": "attendance", "student_id": "uuid", "date": "2024-09-02", "status": "present"},
+            {"type": "exam", "student_id": "uuid", "exam_id": "uuid",
+             "marks_obtained": 42, "total_marks": 50, "status": "verified"},
+            {"type": "incident", "student_id": "uuid", "incident_id": "uuid", "behavior_type": "negative"}
+        ]
+    }
+    
+    An event with the same key as an earlier one (student and date, exam_id
+    or incident_id) replaces it; add "deleted": true to retract one.
+    Malformed events are skipped and reported (up to 20 of them).
+    """
+    try:
+        if student_aggregates is None:
+            return jsonify({'error': 'Event ingestion is disabled (STUDENT_AGGREGATES_ENABLED=false)'}), 503
+        
+        with time_stage('parse_json'):
+            data = request.get_json(silent=True)
+        events = data.get('events') if isinstance(data, dict) else None
+        if not isinstance(events, list) or not events:
+            return jsonify({'error': 'Missing required field: events'}), 400
+        
+        result = student_aggregates.ingest(events)
+        
+        return jsonify({
+            'success': True,
+            'applied': result['applied'],
+            'rejected_events': len(result['rejected']),
+            'rejected': result['rejected'][:20]
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Event ingestion error: {str(e)}")
+        return jsonify({
+            'error': 'Event ingestion failed',
+            'message': str(e)
+        }), 500
+
+@app.route('/students/<student_id>/features', methods=['GET'])
+def student_features(student_id):
+    """A student's current features and data tier, from their ingested events"""
+    if student_aggregates is None:
+        return jsonify({'error': 'Event ingestion is disabled (STUDENT_AGGREGATES_ENABLED=false)'}), 503
+    
+    columns, found = student_aggregates.get_many([student_id])
+    if not found[0]:
+        return jsonify({'error': f'No events recorded for student {student_id}'}), 404
+    return jsonify({
+        'student_id': student_id,
+        'features': {name: values[0].item() for name, values in columns.items()}
+    }), 200
+
 @app.route('/retrain', methods=['POST'])
 def retrain_model():
     """
@@ -231,6 +901,11 @@ def retrain_model():
     
     Expected payload:
     {
+        "background": false,    // optional: train in a background job, respond 202
+        "mode": "full",         // optional: "incremental" grows the current forest
+                                // with trees fitted on training_data only
+        "shadow": false,        // optional: publish as the shadow candidate instead
+                                // of serving it (default: SHADOW_NEW_MODELS)
         "training_data": [
             {
                 "attendance_rate": 0.85,
@@ -249,10 +924,9 @@ def retrain_model():
         ]
     }
     """
-    global ml_predictor
-    
     try:
-        data = request.get_json()
+        with time_stage('parse_json'):
+            data = request.get_json()
         training_data = data.get('training_data', [])
         
         if not training_data:
@@ -264,42 +938,71 @@ def retrain_model():
                 'message': 'Need at least 10 samples to retrain the model'
             }), 400
         
-        logger.info(f"Retraining model with {len(training_data)} samples...")
-        
-        # Retrain the model
-        import pandas as pd
-        from models.ml_predictor import train_new_model
-        
-        df = pd.DataFrame(training_data)
-        
         # Validate required columns
-        required_cols = [
-            'attendance_rate', 'avg_marks_percentage', 'behavior_score',
-            'days_tracked', 'exams_completed', 'days_present', 'days_absent',
-            'total_incidents', 'positive_incidents', 'negative_incidents',
-            'dropped_out'
-        ]
-        
-        missing_cols = set(required_cols) - set(df.columns)
+        present_cols = set().union(*(row.keys() for row in training_data if isinstance(row, dict)))
+        missing_cols = set(TRAINING_SCHEMA.columns) - present_cols
         if missing_cols:
             return jsonify({
                 'error': 'Missing required columns',
                 'missing': list(missing_cols)
             }), 400
         
-        # Train new model
-        model_path = 'models/dropout_model.pkl'
-        metrics = train_new_model(df, model_path)
+        # Rows failing the feature schema are left out (and reported, up to
+        # 20 of them); what remains must still be enough to train on
+        _, _, reasons = TRAINING_SCHEMA.extract_rows(training_data)
+        rejected = [{'row': i, 'reason': reason} for i, reason in enumerate(reasons) if reason is not None]
+        if rejected:
+            training_data = [row for row, reason in zip(training_data, reasons) if reason is None]
+            if len(training_data) < 10:
+                return jsonify({
+                    'error': 'Insufficient valid training data',
+                    'message': f'Only {len(training_data)} of {len(reasons)} samples pass validation; '
+                               'need at least 10 to retrain the model',
+                    'rejected_rows': len(rejected),
+                    'rejected': rejected[:20]
+                }), 400
+            logger.warning(f"Retraining without {len(rejected)} invalid samples, e.g. {rejected[0]}")
+        
+        mode = data.get('mode', 'full')
+        if mode not in ('full', 'incremental'):
+            return jsonify({'error': f'Unknown mode: {mode}'}), 400
+        if mode == 'incremental' and g.ml_predictor is None:
+            return jsonify({'error': 'No model loaded to update incrementally'}), 400
+        base_model_path = g.ml_predictor.model_path if mode == 'incremental' else None
+        # Full refits keep the served model's (possibly tuned) hyperparameters
+        hyperparameters = g.ml_predictor.metadata.get('hyperparameters') if g.ml_predictor else None
+        shadow = bool(data.get('shadow', Config.SHADOW_NEW_MODELS))
+        
+        if data.get('background'):
+            job_id = retrain_jobs.submit(_retrain, training_data, base_model_path, hyperparameters, shadow)
+            logger.info(f"Queued retraining job {job_id} with {len(training_data)} samples")
+            
+            return jsonify({
+                'success': True,
+                'message': 'Retraining started',
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': f'/retrain/{job_id}',
+                'training_samples': len(training_data),
+                'rejected_rows': len(rejected),
+                'rejected': rejected[:20]
+            }), 202
+        
+        with retrain_jobs.fit_lock():
+            metrics = _retrain(training_data, base_model_path, hyperparameters, shadow)
         
-        # Reload model into memory
-        ml_predictor = MLPredictor(model_path)
+        # Serve the new model (or start shadowing it) from this worker right
+        # away; the others pick it up from the registry on their next request
+        _refresh_model(force=True)
         
-        logger.info("Model retrained and reloaded successfully")
+        logger.info("Model retrained and published as shadow candidate" if shadow else "Model retrained and reloaded successfully")
         
         return jsonify({
             'success': True,
-            'message': 'Model retrained successfully',
+            'message': 'Model retrained as shadow candidate' if shadow else 'Model retrained successfully',
             'training_samples': len(training_data),
+            'rejected_rows': len(rejected),
+            'rejected': rejected[:20],
             'metrics': metrics
         }), 200
     
@@ -310,8 +1013,402 @@ def retrain_model():
             'message': str(e)
         }), 500
 
+@app.route('/retrain/<job_id>', methods=['GET'])
+def retrain_status(job_id):
+    """Status of a background retraining job started with "background": true"""
+    status = retrain_jobs.get(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown job', 'job_id': job_id}), 404
+    
+    status.pop('traceback', None)
+    return jsonify(status), 200
+
+@app.route('/shadow', methods=['GET'])
+def shadow_report():
+    """How the shadow candidate compares with the served model on live traffic"""
+    return jsonify({
+        'current_version': loaded_registry_version,
+        'shadow_version': shadow_version,
+        'sample_rate': Config.SHADOW_SAMPLE_RATE,
+        'comparisons': shadow_scorer.report()
+    }), 200
+
+@app.route('/shadow/promote', methods=['POST'])
+def shadow_promote():
+    """Make the shadow candidate the served model; every worker switches on its next poll"""
+    previous_version = loaded_registry_version
+    try:
+        version = promote_shadow(Config.MODEL_REGISTRY_DIR)
+    except ValueError as e:
+        return jsonify({'error': 'Promotion failed', 'message': str(e)}), 400
+    
+    report = [
+        comparison for comparison in shadow_scorer.report()
+        if comparison['shadow_version'] == version
+    ]
+    _refresh_model(force=True)
+    logger.info(f"Promoted shadow model {version} (was {previous_version})")
+    
+    return jsonify({
+        'success': True,
+        'previous_version': previous_version,
+        'current_version': version,
+        'comparisons': report
+    }), 200
+
+@app.route('/shadow', methods=['DELETE'])
+def shadow_discard():
+    """Stop shadow scoring; the candidate stays in the registry"""
+    set_shadow_version(None, Config.MODEL_REGISTRY_DIR)
+    _refresh_model(force=True)
+    return jsonify({'success': True, 'shadow_version': None}), 200
+
+def _shadow_score(features_list):
+    """
+    Queue features_list for the shadow candidate once the response has been
+    sent, so shadow scoring never adds to the client's latency. A callable
+    is called only then, to build the list off the request path.
+    """
+    version, predictor = shadow_version, g.ml_predictor
+    if version is None or predictor is None or not features_list:
+        return
+    if Config.SHADOW_SAMPLE_RATE < 1 and random.random() >= Config.SHADOW_SAMPLE_RATE:
+        return
+    
+    def submit():
+        rows = features_list() if callable(features_list) else features_list
+        if rows:
+            shadow_scorer.submit(rows, predictor, version)
+    
+    @after_this_request
+    def _submit_after_close(response):
+        response.call_on_close(submit)
+        return response
+
+def _retrain(training_data, base_model_path=None, hyperparameters=None, shadow=False):
+    """
+    Train on training_data and publish the result as the registry's CURRENT
+    version (or its SHADOW candidate with shadow=True). With base_model_path,
+    grow that model incrementally instead of refitting from scratch; otherwise
+    refit with hyperparameters (defaults if None).
+    """
+    import pandas as pd
+    from models.ml_predictor import train_new_model, update_model_incrementally
+    
+    df = pd.DataFrame(training_data)
+    
+    if base_model_path:
+        logger.info(f"Updating model incrementally with {len(training_data)} samples...")
+        return update_model_incrementally(
+            df,
+            base_model_path,
+            LEGACY_MODEL_PATH,
+            registry_dir=Config.MODEL_REGISTRY_DIR,
+            n_new_trees=Config.INCREMENTAL_TREES_PER_UPDATE,
+            max_trees=Config.INCREMENTAL_MAX_TREES,
+            max_tree_age_days=Config.INCREMENTAL_MAX_TREE_AGE_DAYS,
+            shadow=shadow
+        )
+    
+    logger.info(f"Retraining model with {len(training_data)} samples...")
+    return train_new_model(
+        df,
+        LEGACY_MODEL_PATH,
+        registry_dir=Config.MODEL_REGISTRY_DIR,
+        hyperparameters=hyperparameters,
+        shadow=shadow
+    )
+
+def _fill_features_from_events(students):
+    """
+    Give every student dict sent with a student_id but no features the
+    current features from their ingested events, in one lookup. Students
+    without events get zero counts (data tier 0).
+    """
+    if student_aggregates is None:
+        return
+    missing = [
+        student for student in students
+        if isinstance(student, dict) and 'features' not in student and student.get('student_id') is not None
+    ]
+    if missing:
+        with time_stage('feature_lookup'):
+            features_list = student_aggregates.get_features([student['student_id'] for student in missing])
+        for student, features in zip(missing, features_list):
+            student['features'] = features
+
+def _score_students(students, include_factors=False, include_contributions=False, use_cache=True):
+    """
+    Score a list of {"student_id", "features"} dicts with one model call.
+    Identical feature rows are scored once; use_cache=False skips the
+    prediction cache (for one-off bulk runs that would only churn it).
+    
+    Returns:
+        Tuple (results, scored): results holds one response dict per student
+        in input order; scored lists (index, prediction) for every student
+        the model scored successfully.
+    """
+    confidence_map = {1: 'low', 2: 'medium', 3: 'high'}
+    
+    # Rows without enough data are answered directly; everything else is
+    # scored together in a single model call
+    results = [None] * len(students)
+    scored_indices = []
+    for i, student_data in enumerate(students):
+        # Features that aren't an object are passed on and come back with
+        # the schema's error
+        features = student_data.get('features', {})
+        data_tier = features.get('data_tier', 0) if isinstance(features, dict) else None
+        if data_tier == 0:
+            results[i] = {
+                'student_id': student_data.get('student_id'),
+                'error': 'Insufficient data',
+                'data_tier': 0
+            }
+        else:
+            scored_indices.append(i)
+    
+    predictions = _predict_cached(
+        [students[i].get('features', {}) for i in scored_indices],
+        include_contributions=include_contributions,
+        use_cache=use_cache
+    )
+    
+    scored = []
+    for i, prediction in zip(scored_indices, predictions):
+        student_data = students[i]
+        if 'error' in prediction:
+            results[i] = {
+                'student_id': student_data.get('student_id'),
+                'error': prediction['error']
+            }
+            continue
+        
+        data_tier = student_data['features']['data_tier']
+        results[i] = {
+            'student_id': student_data.get('student_id'),
+            'risk_score': prediction['risk_score'],
+            'risk_level': prediction['risk_level'],
+            'confidence': confidence_map.get(data_tier, 'low'),
+            'data_tier': data_tier
+        }
+        if include_factors:
+            results[i]['top_factors'] = prediction['top_factors']
+        scored.append((i, prediction))
+    
+    return results, scored
+
+def _predict_cached(features_list, include_contributions=False, use_cache=True):
+    """
+    predict_many with identical feature rows scored once, and rows seen
+    before (by any worker, for the same model version) served from the
+    prediction cache. Returns one prediction per input row, in order.
+    """
+    predictor = g.ml_predictor
+    cache = prediction_cache if use_cache else None
+    
+    # Rows sharing a canonical feature vector share one prediction. Rows
+    # that can't be canonicalized are scored on their own (and get the
+    # model's per-row error).
+    groups = {}
+    for i, features in enumerate(features_list):
+        vector = canonical_feature_vector(features, predictor.feature_columns)
+        groups.setdefault(vector if vector is not None else ('row', i), []).append(i)
+    
+    keys = {}
+    unique = {}
+    if cache is not None:
+        keys = {
+            group: cache.make_key(predictor.model_version, group)
+            for group in groups if group[0] != 'row'
+        }
+        try:
+            with time_stage('prediction_cache_lookup'):
+                cached = cache.get_many(list(keys.values()), require_contributions=include_contributions)
+        except Exception as e:
+            logger.warning(f"Prediction cache lookup failed: {e}")
+            cached = {}
+        record_cache_lookups('prediction', len(cached), len(keys) - len(cached))
+        for group, key in keys.items():
+            if key in cached:
+                unique[group] = cached[key]
+    
+    missing = [group for group in groups if group not in unique]
+    if len(missing) == 1 and prediction_coalescer is not None:
+        # A lone row (a /predict call) is batched with concurrent ones
+        predictions = [prediction_coalescer.predict(
+            predictor,
+            features_list[groups[missing[0]][0]],
+            include_contributions=include_contributions
+        )]
+    else:
+        predictions = predictor.predict_many(
+            [features_list[groups[group][0]] for group in missing],
+            include_contributions=include_contributions
+        ) if missing else []
+    unique.update(zip(missing, predictions))
+    
+    if cache is not None:
+        try:
+            cache.put_many(predictor.model_version, {
+                keys[group]: prediction
+                for group, prediction in zip(missing, predictions)
+                if group in keys and 'error' not in prediction
+            })
+        except Exception as e:
+            logger.warning(f"Prediction cache store failed: {e}")
+    
+    results = [None] * len(features_list)
+    for group, indices in groups.items():
+        for i in indices:
+            results[i] = unique[group]
+    return results
+
+def _explanation_cache_key(student_data, risk_result):
+    """Explanation cache key for a student, or None when caching is off"""
+    if explanation_cache is None:
+        return None
+    return explanation_cache.make_key(
+        g.ml_predictor.model_version,
+        risk_result['risk_level'],
+        student_data['features'],
+        student_data.get('feature_contributions') or student_data.get('feature_importance')
+    )
+
+def _cache_lookup(cache_key):
+    """Read from the explanation cache; cache failures never fail a prediction"""
+    if cache_key is None:
+        return None
+    try:
+        cached = explanation_cache.get(cache_key)
+    except Exception as e:
+        logger.warning(f"Explanation cache read failed: {e}")
+        return None
+    record_cache_lookups('explanation', int(cached is not None), int(cached is None))
+    return cached
+
+def _cache_store(cache_key, model_version, explanation_result):
+    """Cache a successful Gemini explanation (fallbacks are never cached)"""
+    if cache_key is None or not explanation_result.get('success'):
+        return
+    try:
+        explanation_cache.put(cache_key, model_version, {
+            'success': True,
+            'explanation': explanation_result.get('explanation', ''),
+            'recommendations': explanation_result.get('recommendations', []),
+            'priority_actions': explanation_result.get('priority_actions', [])
+        })
+    except Exception as e:
+        logger.warning(f"Explanation cache write failed: {e}")
+
+def _generate_explanation(student_data, risk_result):
+    """Gemini explanation for one student, served from the explanation cache when possible"""
+    cache_key = _explanation_cache_key(student_data, risk_result)
+    cached = _cache_lookup(cache_key)
+    if cached is not None:
+        EXPLANATIONS.labels('cache').inc()
+        return cached
+    
+    return _explain_with_gemini(student_data, risk_result, cache_key, g.ml_predictor.model_version)
+
+def _generate_explanation_within_deadline(student_data, risk_result):
+    """
+    Like _generate_explanation, but waits at most EXPLANATION_DEADLINE_SECONDS.
+    A late Gemini call keeps running; the rule-based explanation is returned
+    instead, with the explanation_id to fetch Gemini's from later.
+    """
+    cache_key = _explanation_cache_key(student_data, risk_result)
+    cached = _cache_lookup(cache_key)
+    if cached is not None:
+        EXPLANATIONS.labels('cache').inc()
+        return cached
+    
+    explanation_id, future = explanation_jobs.submit(
+        _explain_with_gemini, student_data, risk_result, cache_key, g.ml_predictor.model_version
+    )
+    try:
+        return future.result(timeout=Config.EXPLANATION_DEADLINE_SECONDS)
+    except FutureTimeoutError:
+        pass
+    except Exception as e:
+        logger.warning(f"Explanation {explanation_id} failed: {e}")
+        explanation_id = None
+    
+    with time_stage('explanation_fallback'):
+        explanation_result = _generate_fallback_explanation(
+            student_data['features'],
+            risk_result,
+            student_data.get('feature_contributions')
+        )
+    EXPLANATIONS.labels('deadline_fallback' if explanation_id else 'gemini_fallback').inc()
+    explanation_result['explanation_id'] = explanation_id
+    return explanation_result
+
+def _explain_with_gemini(student_data, risk_result, cache_key, model_version):
+    """One Gemini call, cached on success; safe to run off the request thread"""
+    with time_stage('explanation_gemini'):
+        explanation_result = gemini_explainer.generate_explanation(student_data, risk_result)
+    _record_gemini_outcomes([explanation_result])
+    _cache_store(cache_key, model_version, explanation_result)
+    return explanation_result
+
+def _generate_batch_explanations(items):
+    """
+    Explanations for many (student_data, risk_result) pairs.
+    Uses the explanation cache and batched Gemini prompts when available,
+    rule-based otherwise.
+    """
+    if gemini_explainer:
+        results = [None] * len(items)
+        cache_keys = [_explanation_cache_key(*item) for item in items]
+        missing = []
+        for i, cache_key in enumerate(cache_keys):
+            results[i] = _cache_lookup(cache_key)
+            if results[i] is None:
+                missing.append(i)
+        
+        if len(missing) < len(items):
+            EXPLANATIONS.labels('cache').inc(len(items) - len(missing))
+        if missing:
+            with time_stage('explanation_gemini_batch'):
+                generated = gemini_explainer.generate_explanations_batch(
+                    [items[i] for i in missing],
+                    token_budget=Config.GEMINI_BATCH_TOKEN_BUDGET
+                )
+            _record_gemini_outcomes(generated)
+            for i, explanation_result in zip(missing, generated):
+                results[i] = explanation_result
+                _cache_store(cache_keys[i], g.ml_predictor.model_version, explanation_result)
+        
+        return results
+    
+    with time_stage('explanation_fallback'):
+        results = [
+            _generate_fallback_explanation(
+                student_data['features'],
+                risk_result,
+                student_data['feature_contributions']
+            )
+            for student_data, risk_result in items
+        ]
+    EXPLANATIONS.labels('fallback').inc(len(results))
+    return results
+
+def _record_gemini_outcomes(explanation_results):
+    """Count Gemini successes and the failures answered with a fallback"""
+    succeeded = sum(1 for result in explanation_results if result.get('success'))
+    if succeeded:
+        EXPLANATIONS.labels('gemini').inc(succeeded)
+    if len(explanation_results) > succeeded:
+        EXPLANATIONS.labels('gemini_fallback').inc(len(explanation_results) - succeeded)
+
 def _generate_fallback_explanation(features, risk_result, feature_importance=None):
-    """Generate rule-based explanation with feature importance"""
+    """
+    Generate rule-based explanation with feature importance.
+    Key factors are ranked by feature_importance, which callers fill with the
+    student's own feature contributions.
+    """
+    features = FEATURE_SCHEMA.normalize(features, NO_ISSUE_DEFAULTS)
     risk_level = risk_result['risk_level']
     
     # Identify top risk factors
@@ -332,13 +1429,13 @@ def _generate_fallback_explanation(features, risk_result, feature_importance=Non
     recommendations = []
     
     # Generate recommendations based on features
-    if features.get('attendance_rate', 1) < 0.75:
+    if features['attendance_rate'] < 0.75:
         recommendations.append("Improve attendance through parent engagement and monitoring")
-    if features.get('avg_marks_percentage', 100) < 50:
+    if features['avg_marks_percentage'] < 50:
         recommendations.append("Provide intensive academic tutoring and remedial classes")
-    if features.get('behavior_score', 100) < 60:
+    if features['behavior_score'] < 60:
         recommendations.append("Implement behavior intervention and counseling support")
-    if features.get('exams_completed', 10) < 3:
+    if features['exams_completed'] < 3:
         recommendations.append("Ensure regular exam participation and assessment")
     
     if not recommendations:
@@ -351,7 +1448,13 @@ def _generate_fallback_explanation(features, risk_result, feature_importance=Non
         'fallback': True
     }
 
+# Blocking startup runs at import, so a preloaded gunicorn master loads and
+# warms up once for all workers. Background startup begins in each worker.
+if Config.STARTUP_MODE != 'background':
+    _startup()
+
 if __name__ == '__main__':
+    start_background_startup()
     app.run(
         host='0.0.0.0',
         port=Config.FLASK_PORT,
@@ -24,6 +24,69 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+def incremental_retrain():
+    """
+    Grow the served forest with trees fitted on outcomes recorded since
+    its newest trees were trained, instead of refitting every tree.
+    
+    Returns:
+        Result dict from update_model_incrementally, or None when there is
+        nothing to build on (no current model or no new outcomes)
+    """
+    import json
+    import pandas as pd
+    from config import Config
+    from generate_and_train import fetch_real_training_data, training_store
+    from models.ml_predictor import parse_window_time, update_model_incrementally
+    from models.model_registry import read_current_version, version_paths
+    
+    version = read_current_version(Config.MODEL_REGISTRY_DIR)
+    if version:
+        base_model_path, base_metadata_path = version_paths(version, Config.MODEL_REGISTRY_DIR)
+    else:
+        base_model_path, base_metadata_path = 'models/dropout_model.pkl', 'models/model_metadata.json'
+    if not os.path.exists(base_model_path):
+        logger.info("No current model to grow")
+        return None
+    
+    df = fetch_real_training_data(os.getenv('BACKEND_URL', 'http://localhost:5000'))
+    if df is None or df.empty:
+        logger.info("No training data available")
+        return None
+    logger.info(f"Appended {training_store().append(df)} new rows to the training store")
+    
+    # New outcomes are dropouts dated after the newest trees' data window.
+    # Active students' rows describe them as of today, so they are recent too.
+    last_window_end = None
+    if os.path.exists(base_metadata_path):
+        with open(base_metadata_path, 'r') as f:
+            windows = json.load(f).get('tree_windows') or []
+        if windows:
+            last_window_end = max(parse_window_time(window['end']) for window in windows)
+    
+    dropout_dates = pd.to_datetime(df['dropout_date'], errors='coerce', utc=True) \
+        if 'dropout_date' in df else pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns, UTC]')
+    is_new_dropout = (df['dropped_out'] == 1)
+    if last_window_end is not None:
+        is_new_dropout &= dropout_dates > pd.Timestamp(last_window_end)
+    recent = df[is_new_dropout | (df['dropped_out'] == 0)]
+    
+    if not is_new_dropout.any():
+        logger.info("No new dropout outcomes since the last update")
+        return None
+    
+    logger.info(f"Growing model {version or base_model_path} with {int(is_new_dropout.sum())} new outcomes "
+                f"({len(recent)} rows)")
+    return update_model_incrementally(
+        recent,
+        base_model_path,
+        registry_dir=Config.MODEL_REGISTRY_DIR,
+        n_new_trees=Config.INCREMENTAL_TREES_PER_UPDATE,
+        max_trees=Config.INCREMENTAL_MAX_TREES,
+        max_tree_age_days=Config.INCREMENTAL_MAX_TREE_AGE_DAYS,
+        shadow=Config.SHADOW_NEW_MODELS
+    )
+
 def main():
     """Main retraining function"""
     try:
@@ -31,11 +94,24 @@ def main():
         logger.info("🤖 AUTOMATED MODEL RETRAINING STARTED")
         logger.info("="*60)
         
-        # Import and run the training script
-        from generate_and_train import main as train_main
+        result = None
+        if os.getenv('RETRAIN_MODE', 'full').lower() == 'incremental':
+            logger.info("Starting incremental update...")
+            try:
+                result = incremental_retrain()
+            except ValueError as e:
+                logger.warning(f"Incremental update not possible ({e}), falling back to a full refit")
+            if result is not None:
+                logger.info(f"Added {result['trees_added']} trees, retired {result['trees_retired']} "
+                            f"({result['n_estimators']} total), ROC-AUC {result['roc_auc']:.4f}")
         
-        logger.info("Starting training process...")
-        train_main()
+        if result is None:
+            # Import and run the training script
+            from config import Config
+            from generate_and_train import main as train_main
+            
+            logger.info("Starting training process...")
+            train_main(['--shadow'] if Config.SHADOW_NEW_MODELS else [])
         
         # Save performance metrics to database
         logger.info("\n📊 Saving performance metrics to database...")
@@ -51,7 +127,7 @@ def main():
         logger.info("="*60)
         
         return 0
-        
+    
     except Exception as e:
         logger.error("="*60)
         logger.error(f"❌ AUTOMATED RETRAINING FAILED: {e}")
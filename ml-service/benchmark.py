@@ -0,0 +1,695 @@
+"""
+Latency benchmarks for the ML service
+Run after training the model: python benchmark.py
+
+In-process suite with a JSON report and regression check:
+    python benchmark.py --suite --report benchmark_report.json
+    python benchmark.py --suite --save-baseline benchmark_baseline.json
+    python benchmark.py --suite --baseline benchmark_baseline.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from generate_and_train import (
+    TRAINING_COLUMNS,
+    generate_synthetic_data,
+    generate_synthetic_data_fast,
+    iter_synthetic_data
+)
+from config import Config
+from models.ml_predictor import MLPredictor, train_new_model, update_model_incrementally
+from models.model_registry import load_fitted_model, publish_model, write_artifact
+from models.prediction_coalescer import PredictionCoalescer
+from models.risk_calculator import RiskCalculator
+from models.training_store import TrainingDataStore
+
+MODEL_PATH = 'models/dropout_model.pkl'
+
+SUITE_BATCH_SIZES = (1, 100, 10_000, 100_000)
+SUITE_GENERATION_SIZES = (1_000, 10_000, 100_000)
+SUITE_TRAINING_SIZES = (1_000, 5_000, 20_000)
+SUITE_STORE_SIZES = (100_000, 1_000_000)
+CONCURRENCY_LEVELS = (1, 4, 16, 64)
+
+
+def _percentiles(timings):
+    """p50/p99 of a list of durations in seconds, reported in microseconds"""
+    timings_us = np.array(timings) * 1e6
+    return {
+        'p50_us': float(np.percentile(timings_us, 50)),
+        'p99_us': float(np.percentile(timings_us, 99)),
+        'mean_us': float(timings_us.mean())
+    }
+
+
+def _sample_features(n_samples, random_state=123):
+    """Feature dicts shaped like a /predict payload"""
+    df = generate_synthetic_data_fast(n_samples=n_samples, random_state=random_state)
+    rows = df.drop(columns=['dropped_out']).to_dict('records')
+    for row in rows:
+        row['data_tier'] = 2
+    return rows
+
+
+def bench_predict(engine, n_calls=500, warmup=20):
+    """Single-row MLPredictor.predict latency for one inference engine"""
+    predictor = MLPredictor(MODEL_PATH, engine=engine)
+    features = _sample_features(n_calls)
+    
+    for row in features[:warmup]:
+        predictor.predict(row)
+    
+    timings = []
+    for row in features:
+        start = time.perf_counter()
+        predictor.predict(row)
+        timings.append(time.perf_counter() - start)
+    
+    return _percentiles(timings)
+
+
+
+def bench_risk_batch(n_rows=1_000_000, n_scalar=20_000):
+    """RiskCalculator.calculate_risk_batch throughput vs the scalar path"""
+    calculator = RiskCalculator()
+    rng = np.random.default_rng(0)
+    columns = {
+        'attendance_rate': rng.beta(8, 2, n_rows),
+        'avg_marks_percentage': np.clip(rng.normal(65, 20, n_rows), 0, 100),
+        'behavior_score': rng.beta(8, 2, n_rows) * 100,
+        'data_tier': rng.integers(0, 4, n_rows)
+    }
+    
+    start = time.perf_counter()
+    calculator.calculate_risk_batch(columns)
+    batch_seconds = time.perf_counter() - start
+    
+    rows = [{name: values[i] for name, values in columns.items()} for i in range(n_scalar)]
+    start = time.perf_counter()
+    for row in rows:
+        calculator.calculate_risk(row)
+    scalar_seconds = (time.perf_counter() - start) * n_rows / n_scalar
+    
+    return {
+        'rows': n_rows,
+        'batch_seconds': batch_seconds,
+        'scalar_seconds_estimated': scalar_seconds
+    }
+
+
+
+def bench_data_generation(n_legacy=10_000, n_fast=1_000_000, chunk_size=100_000):
+    """Rows per second of the legacy and columnar synthetic data generators"""
+    start = time.perf_counter()
+    generate_synthetic_data(n_samples=n_legacy)
+    legacy_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for _ in iter_synthetic_data(n_samples=n_fast, chunk_size=chunk_size):
+        pass
+    fast_seconds = time.perf_counter() - start
+    
+    return {
+        'legacy_rows_per_second': n_legacy / legacy_seconds,
+        'fast_rows_per_second': n_fast / fast_seconds,
+        'fast_rows': n_fast
+    }
+
+
+
+def bench_contributions(n_rows=10_000, repeats=3):
+    """Overhead of per-student feature contributions on a batch"""
+    predictor = MLPredictor(MODEL_PATH)
+    features = _sample_features(n_rows)
+    
+    def best_of(include_contributions):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            predictor.predict_many(features, include_contributions=include_contributions)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+    
+    best_of(True)  # compile the path forest outside the timed runs
+    return {
+        'rows': n_rows,
+        'without_seconds': best_of(False),
+        'with_seconds': best_of(True)
+    }
+
+
+def bench_concurrent_predict(predictor, concurrency_levels=CONCURRENCY_LEVELS, n_requests=1024,
+                             window_ms=2.0, max_batch=32):
+    """
+    Single-row predictions (as /predict makes them) from concurrent threads,
+    each row scored on its own vs micro-batched by PredictionCoalescer.
+    Returns {concurrency: {'direct_rps', 'coalesced_rps', 'mean_batch'}}.
+    """
+    features = _sample_features(n_requests)
+    
+    def run(concurrency, predict_one):
+        per_thread = n_requests // concurrency
+        barrier = threading.Barrier(concurrency + 1)
+        
+        def client(rows):
+            barrier.wait()
+            for row in rows:
+                predict_one(row)
+        
+        threads = [
+            threading.Thread(target=client, args=(features[i * per_thread:(i + 1) * per_thread],))
+            for i in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return per_thread * concurrency / (time.perf_counter() - start)
+    
+    predictor.predict_many(features[:20], include_contributions=True)
+    report = {}
+    for concurrency in concurrency_levels:
+        coalescer = PredictionCoalescer(window_seconds=window_ms / 1000, max_batch=max_batch)
+        report[concurrency] = {
+            'direct_rps': run(
+                concurrency,
+                lambda row: predictor.predict_many([row], include_contributions=True)
+            ),
+            'coalesced_rps': run(
+                concurrency,
+                lambda row: coalescer.predict(predictor, row, include_contributions=True)
+            ),
+            'mean_batch': coalescer.rows_scored / coalescer.batches_scored
+        }
+    return report
+
+
+def _worker_memory(results, done, n_requests):
+    """Serve a few requests like a gunicorn worker, then report this process's memory"""
+    import app as service
+    
+    client = service.app.test_client()
+    for row in _sample_features(n_requests):
+        client.post('/predict', json={'features': row})
+    
+    results.put(service._process_memory())
+    done.wait()
+
+
+def bench_worker_memory(n_workers=2, n_requests=20):
+    """
+    Per-worker memory with each worker loading the app itself (gunicorn's
+    default) vs the app preloaded in the parent and shared copy-on-write
+    """
+    report = {}
+    for mode in ('per_worker', 'preloaded'):
+        if mode == 'preloaded':
+            import gc
+            import app as service  # noqa: F401 - loaded before fork, like preload_app
+            gc.collect()
+            gc.freeze()
+            context = multiprocessing.get_context('fork')
+        else:
+            # Fresh interpreters, like workers forked from a master that
+            # never imported the app
+            context = multiprocessing.get_context('spawn')
+        
+        results, done = context.Queue(), context.Event()
+        workers = [
+            context.Process(target=_worker_memory, args=(results, done, n_requests))
+            for _ in range(n_workers)
+        ]
+        for worker in workers:
+            worker.start()
+        
+        # Measure while every worker is alive so Pss splits shared pages evenly
+        report[mode] = [results.get(timeout=120) for _ in workers]
+        done.set()
+        for worker in workers:
+            worker.join()
+    
+    return report
+
+
+def _best_of(fn, repeats):
+    """Fastest of repeats timed calls, in seconds"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def suite_training(workdir, sizes=SUITE_TRAINING_SIZES):
+    """
+    train_new_model wall time at increasing sizes. The largest model is
+    kept and used by the API benchmarks, so every run scores the same model.
+    """
+    results = {}
+    model_path = None
+    for n_rows in sizes:
+        df = generate_synthetic_data_fast(n_samples=n_rows, random_state=42)
+        model_path = os.path.join(workdir, 'dropout_model.pkl')
+        
+        start = time.perf_counter()
+        train_new_model(df, model_path)
+        results[f'train_new_model_{n_rows}_rows_seconds'] = time.perf_counter() - start
+    
+    return results, model_path
+
+
+def bench_incremental_vs_full(workdir, n_base=20_000, n_new=2_000, n_holdout=5_000):
+    """
+    Retrain time and held-out ROC-AUC of an incremental update on n_new
+    fresh rows vs a full refit on all n_base + n_new rows
+    """
+    import joblib
+    import pandas as pd
+    from sklearn.metrics import roc_auc_score
+    
+    base = generate_synthetic_data_fast(n_samples=n_base, random_state=1)
+    new = generate_synthetic_data_fast(n_samples=n_new, random_state=2)
+    holdout = generate_synthetic_data_fast(n_samples=n_holdout, random_state=3)
+    
+    paths = {}
+    for name in ('base', 'full', 'incremental'):
+        os.makedirs(os.path.join(workdir, name), exist_ok=True)
+        paths[name] = os.path.join(workdir, name, 'dropout_model.pkl')
+    train_new_model(base, paths['base'])
+    
+    start = time.perf_counter()
+    train_new_model(pd.concat([base, new], ignore_index=True), paths['full'])
+    full_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    update_model_incrementally(new, paths['base'], paths['incremental'])
+    incremental_seconds = time.perf_counter() - start
+    
+    def holdout_auc(path):
+        model = joblib.load(path)
+        X = holdout[list(model.feature_names_in_)]
+        return float(roc_auc_score(holdout['dropped_out'], model.predict_proba(X)[:, 1]))
+    
+    return {
+        'full_seconds': full_seconds,
+        'incremental_seconds': incremental_seconds,
+        'full_roc_auc': holdout_auc(paths['full']),
+        'incremental_roc_auc': holdout_auc(paths['incremental']),
+        'base_rows': n_base,
+        'new_rows': n_new
+    }
+
+
+def suite_api(predictor, batch_sizes=SUITE_BATCH_SIZES, n_calls=500):
+    """/predict and /batch-predict through the Flask test client"""
+    import app as service
+    
+    # Measure the request path and the model, not the caches or Gemini
+    service.ml_predictor = predictor
+    service.prediction_cache = None
+    service.explanation_cache = None
+    service.gemini_explainer = None
+    client = service.app.test_client()
+    
+    results = {}
+    features = _sample_features(max(n_calls, max(batch_sizes)))
+    
+    for row in features[:20]:
+        client.post('/predict', json={'features': row})
+    timings = []
+    for row in features[:n_calls]:
+        start = time.perf_counter()
+        response = client.post('/predict', json={'features': row})
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.get_json()
+    stats = _percentiles(timings)
+    results['predict_api_p50_us'] = stats['p50_us']
+    results['predict_api_p99_us'] = stats['p99_us']
+    
+    for n_rows in batch_sizes:
+        payload = {'students': [
+            {'student_id': str(i), 'features': row}
+            for i, row in enumerate(features[:n_rows])
+        ]}
+        repeats = 5 if n_rows <= 10_000 else 2
+        results[f'batch_predict_api_{n_rows}_rows_seconds'] = _best_of(
+            lambda: client.post('/batch-predict', json=payload),
+            repeats
+        )
+    
+    return results
+
+
+def bench_batch_payloads(predictor, n_rows=50_000, repeats=3):
+    """
+    /batch-predict for n_rows students in each payload format, through the
+    Flask test client: request time (parse, score, serialize) and body sizes
+    """
+    import msgpack
+    import orjson
+    import app as service
+    from models.batch_payload import COLUMNAR_JSON_MIMETYPE, MSGPACK_MIMETYPE
+    
+    service.ml_predictor = predictor
+    service.prediction_cache = None
+    service.gemini_explainer = None
+    client = service.app.test_client()
+    
+    features = _sample_features(n_rows)
+    student_ids = [str(i) for i in range(n_rows)]
+    columnar = {
+        'student_id': student_ids,
+        'features': {name: [row[name] for row in features] for name in features[0]}
+    }
+    requests = {
+        'rows': (json.dumps({'students': [
+            {'student_id': student_id, 'features': row} for student_id, row in zip(student_ids, features)
+        ]}).encode(), 'application/json'),
+        'columnar_json': (orjson.dumps(columnar), COLUMNAR_JSON_MIMETYPE),
+        'msgpack': (msgpack.packb(columnar), MSGPACK_MIMETYPE)
+    }
+    
+    report = {}
+    for fmt, (body, mimetype) in requests.items():
+        for encoding in ('identity', 'gzip'):
+            headers = {'Accept': mimetype, 'Accept-Encoding': encoding}
+            response = client.post('/batch-predict', data=body, content_type=mimetype, headers=headers)
+            assert response.status_code == 200, response.data[:200]
+            report[(fmt, encoding)] = {
+                'seconds': _best_of(
+                    lambda: client.post('/batch-predict', data=body, content_type=mimetype, headers=headers),
+                    repeats
+                ),
+                'request_bytes': len(body),
+                'response_bytes': len(response.data)
+            }
+    return report
+
+
+def suite_models(predictor, n_rows=10_000):
+    """MLPredictor.predict_many and RiskCalculator directly, without HTTP"""
+    features = _sample_features(n_rows)
+    results = {
+        f'predict_many_{n_rows}_rows_seconds': _best_of(
+            lambda: predictor.predict_many(features), 3
+        ),
+        f'predict_many_contributions_{n_rows}_rows_seconds': _best_of(
+            lambda: predictor.predict_many(features, include_contributions=True), 3
+        )
+    }
+    
+    risk = bench_risk_batch(n_rows=1_000_000, n_scalar=10_000)
+    results['risk_batch_1000000_rows_seconds'] = risk['batch_seconds']
+    results['risk_scalar_per_row_us'] = risk['scalar_seconds_estimated'] / risk['rows'] * 1e6
+    return results
+
+
+def suite_data_generation(sizes=SUITE_GENERATION_SIZES):
+    """generate_synthetic_data and the columnar generator at increasing sizes"""
+    results = {}
+    for n_rows in sizes:
+        results[f'generate_synthetic_data_{n_rows}_rows_seconds'] = _best_of(
+            lambda: generate_synthetic_data(n_samples=n_rows), 1
+        )
+    for n_rows in sizes + (1_000_000,):
+        results[f'generate_synthetic_data_fast_{n_rows}_rows_seconds'] = _best_of(
+            lambda: generate_synthetic_data_fast(n_samples=n_rows), 5
+        )
+    return results
+
+
+def suite_training_store(workdir, sizes=SUITE_STORE_SIZES):
+    """Loading training data from a CSV vs the columnar training store"""
+    results = {}
+    for n_rows in sizes:
+        df = generate_synthetic_data_fast(n_samples=n_rows, random_state=42)
+        csv_path = os.path.join(workdir, f'training_data_{n_rows}.csv')
+        df.to_csv(csv_path, index=False)
+        results[f'training_data_csv_load_{n_rows}_rows_seconds'] = _best_of(
+            lambda: pd.read_csv(csv_path), 3
+        )
+        
+        store = TrainingDataStore(os.path.join(workdir, f'training_store_{n_rows}'))
+        start = time.perf_counter()
+        store.append(df)
+        results[f'training_store_append_{n_rows}_rows_seconds'] = time.perf_counter() - start
+        results[f'training_store_load_{n_rows}_rows_seconds'] = _best_of(
+            lambda: store.load(TRAINING_COLUMNS), 3
+        )
+    return results
+
+
+def suite_model_load(workdir, model_path):
+    """
+    Loading the pickled model vs its registry artifact, with sklearn
+    already imported (a cold process also pays about 1.5 s importing
+    sklearn for the pickle and the sklearn engine). The compressed entry is
+    the sklearn engine on an artifact with the zlib-3 checkpoint that
+    versions were written with before.
+    """
+    model = load_fitted_model(model_path)
+    registry_dir = os.path.join(workdir, 'registry')
+    version = publish_model(model, {}, registry_dir)['model_version']
+    version_dir = os.path.join(registry_dir, version)
+    compressed_dir = os.path.join(workdir, 'compressed_artifact')
+    os.makedirs(compressed_dir, exist_ok=True)
+    write_artifact(model, {}, compressed_dir, compress=3)
+    return {
+        'model_load_pickle_seconds': _best_of(lambda: MLPredictor(model_path), 3),
+        'model_load_artifact_compiled_seconds': _best_of(
+            lambda: MLPredictor(version_dir, engine='compiled'), 3
+        ),
+        'model_load_artifact_sklearn_seconds': _best_of(lambda: MLPredictor(version_dir), 3),
+        'model_load_artifact_sklearn_compressed_seconds': _best_of(lambda: MLPredictor(compressed_dir), 3)
+    }
+
+
+def run_suite(quick=False):
+    """
+    Run every suite benchmark in-process and return the JSON report.
+    quick drops the 100k-row sizes.
+    """
+    batch_sizes = tuple(n for n in SUITE_BATCH_SIZES if not quick or n < 100_000)
+    generation_sizes = tuple(n for n in SUITE_GENERATION_SIZES if not quick or n < 100_000)
+    training_sizes = tuple(n for n in SUITE_TRAINING_SIZES if not quick or n < 20_000)
+    store_sizes = tuple(n for n in SUITE_STORE_SIZES if not quick or n < 1_000_000)
+    
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        training, model_path = suite_training(workdir, training_sizes)
+        results.update(training)
+        results.update(suite_model_load(workdir, model_path))
+        
+        predictor = MLPredictor(
+            model_path,
+            engine=Config.INFERENCE_ENGINE,
+            metadata_path=os.path.join(workdir, 'model_metadata.json')
+        )
+        predictor.warm_up()
+        results.update(suite_api(predictor, batch_sizes))
+        results.update(suite_models(predictor))
+        for (fmt, encoding), stats in bench_batch_payloads(predictor, n_rows=10_000).items():
+            results[f'batch_predict_api_10000_rows_{fmt}_{encoding}_seconds'] = stats['seconds']
+        for concurrency, stats in bench_concurrent_predict(predictor, (1, 16), n_requests=512).items():
+            for mode in ('direct', 'coalesced'):
+                results[f'predict_{concurrency}_threads_{mode}_us_per_request'] = 1e6 / stats[f'{mode}_rps']
+        
+        retrain = bench_incremental_vs_full(workdir)
+        results[f"retrain_full_{retrain['base_rows'] + retrain['new_rows']}_rows_seconds"] = retrain['full_seconds']
+        results[f"retrain_incremental_{retrain['new_rows']}_rows_seconds"] = retrain['incremental_seconds']
+        
+        results.update(suite_training_store(workdir, store_sizes))
+    
+    results.update(suite_data_generation(generation_sizes))
+    
+    return {
+        'generated_at': datetime.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'scikit_learn': sklearn.__version__,
+            'inference_engine': Config.INFERENCE_ENGINE,
+            'quick': quick
+        },
+        'results': {name: round(value, 6) for name, value in results.items()},
+        # Not durations, so not checked against the baseline
+        'quality': {
+            'retrain_full_holdout_roc_auc': round(retrain['full_roc_auc'], 4),
+            'retrain_incremental_holdout_roc_auc': round(retrain['incremental_roc_auc'], 4)
+        }
+    }
+
+
+def compare_reports(report, baseline, tolerance=0.25, min_delta_seconds=0.005):
+    """
+    Compare a report against a baseline report. Every metric is a duration,
+    so a result more than tolerance (as a fraction) above its baseline is
+    a regression, unless it is also within min_delta_seconds of it (timer
+    noise on sub-millisecond runs). Metrics missing from either report are
+    skipped.
+    
+    Returns:
+        List of {'metric', 'baseline', 'current', 'ratio', 'regressed'}
+    """
+    comparison = []
+    for name, current in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        ratio = current / previous
+        delta_seconds = (current - previous) / (1e6 if name.endswith('_us') else 1)
+        comparison.append({
+            'metric': name,
+            'baseline': previous,
+            'current': current,
+            'ratio': round(ratio, 3),
+            'regressed': ratio > 1 + tolerance and delta_seconds > min_delta_seconds
+        })
+    return comparison
+
+
+def main_suite(args):
+    """--suite entry point; returns the process exit code"""
+    print("=" * 60)
+    print("ML Service - Benchmark Suite")
+    print("=" * 60)
+    
+    report = run_suite(quick=args.quick)
+    for name, value in list(report['results'].items()) + list(report['quality'].items()):
+        print(f"   {name:<52} {value:>14.6f}")
+    
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.report}")
+    
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    
+    if not args.baseline:
+        return 0
+    
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    comparison = compare_reports(report, baseline, args.tolerance, args.min_delta)
+    
+    print(f"\nCompared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+    for entry in comparison:
+        flag = 'REGRESSION' if entry['regressed'] else 'ok'
+        print(f"   {entry['metric']:<52} {entry['ratio']:>6.2f}x  {flag}")
+    
+    regressions = [entry for entry in comparison if entry['regressed']]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) found")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ML service benchmarks')
+    parser.add_argument('--suite', action='store_true',
+                        help='run the in-process suite and write a JSON report')
+    parser.add_argument('--report', default='benchmark_report.json',
+                        help='where to write the suite report')
+    parser.add_argument('--baseline', help='compare the suite against this stored report')
+    parser.add_argument('--save-baseline', help='also store the suite report here as a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown vs the baseline before flagging (0.25 = 25%%)')
+    parser.add_argument('--min-delta', type=float, default=0.005,
+                        help='ignore slowdowns smaller than this many seconds')
+    parser.add_argument('--quick', action='store_true', help='skip the 100k-row sizes')
+    args = parser.parse_args()
+    
+    if args.suite:
+        return main_suite(args)
+    
+    if not os.path.exists(MODEL_PATH):
+        print(f"Model file not found: {MODEL_PATH}")
+        print("Please run 'python generate_and_train.py' first")
+        return 1
+    
+    print("=" * 60)
+    print("ML Service - Latency Benchmarks")
+    print("=" * 60)
+    
+    print("\nSingle-row /predict inference (MLPredictor.predict):")
+    results = {}
+    for engine in ('sklearn', 'compiled'):
+        results[engine] = bench_predict(engine)
+        stats = results[engine]
+        print(f"   {engine:<10} p50 {stats['p50_us']:>10.1f} us   "
+              f"p99 {stats['p99_us']:>10.1f} us")
+    
+    speedup = results['sklearn']['p50_us'] / results['compiled']['p50_us']
+    print(f"\n   Compiled engine p50 speedup: {speedup:.1f}x")
+    
+    print("\nRule-based RiskCalculator:")
+    stats = bench_risk_batch()
+    print(f"   calculate_risk_batch  {stats['rows']:,} rows in {stats['batch_seconds']:.3f} s")
+    print(f"   calculate_risk loop   {stats['rows']:,} rows in ~{stats['scalar_seconds_estimated']:.1f} s (extrapolated)")
+    
+    print("\nSynthetic data generation:")
+    stats = bench_data_generation()
+    print(f"   generate_synthetic_data  {stats['legacy_rows_per_second']:>12,.0f} rows/s")
+    print(f"   iter_synthetic_data      {stats['fast_rows_per_second']:>12,.0f} rows/s "
+          f"({stats['fast_rows']:,} rows)")
+    
+    print("\nPer-student feature contributions (predict_many):")
+    stats = bench_contributions()
+    overhead = stats['with_seconds'] - stats['without_seconds']
+    print(f"   {stats['rows']:,} rows without contributions  {stats['without_seconds']:.3f} s")
+    print(f"   {stats['rows']:,} rows with contributions     {stats['with_seconds']:.3f} s "
+          f"(+{overhead:.3f} s)")
+    
+    print(f"\nConcurrent single-row predictions ({Config.INFERENCE_ENGINE} engine, 2 ms window, batches of up to 32):")
+    predictor = MLPredictor(MODEL_PATH, engine=Config.INFERENCE_ENGINE)
+    for concurrency, stats in bench_concurrent_predict(predictor).items():
+        print(f"   {concurrency:>3} threads  direct {stats['direct_rps']:>9,.0f} req/s   "
+              f"coalesced {stats['coalesced_rps']:>9,.0f} req/s   mean batch {stats['mean_batch']:.1f}")
+    
+    print(f"\n/batch-predict payload formats (50,000 students, {Config.INFERENCE_ENGINE} engine):")
+    predictor = MLPredictor(MODEL_PATH, engine=Config.INFERENCE_ENGINE)
+    for (fmt, encoding), stats in bench_batch_payloads(predictor).items():
+        print(f"   {fmt:<14} {encoding:<9} {stats['seconds']:>6.3f} s   request {stats['request_bytes'] / 1e6:>5.1f} MB   "
+              f"response {stats['response_bytes'] / 1e6:>5.1f} MB")
+    
+    print("\nIncremental retraining vs full refit:")
+    with tempfile.TemporaryDirectory() as workdir:
+        stats = bench_incremental_vs_full(workdir)
+    print(f"   full refit   {stats['base_rows'] + stats['new_rows']:>6,} rows  {stats['full_seconds']:.2f} s   "
+          f"holdout ROC-AUC {stats['full_roc_auc']:.4f}")
+    print(f"   incremental  {stats['new_rows']:>6,} rows  {stats['incremental_seconds']:.2f} s   "
+          f"holdout ROC-AUC {stats['incremental_roc_auc']:.4f}")
+    
+    print("\nPer-worker memory (2 workers, after serving /predict):")
+    report = bench_worker_memory()
+    for mode, label in (('per_worker', 'load per worker'), ('preloaded', 'preload_app')):
+        for memory in report[mode]:
+            print(f"   {label:<16} pid {memory['pid']:<8} RSS {memory.get('rss_mb', 0):>7.1f} MB   "
+                  f"PSS {memory.get('pss_mb', 0):>7.1f} MB   "
+                  f"private {memory.get('private_dirty_mb', 0) + memory.get('private_clean_mb', 0):>7.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
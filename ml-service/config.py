@@ -8,11 +8,96 @@ class Config:
     FLASK_PORT = int(os.getenv('FLASK_PORT', 5001))
     FLASK_ENV = os.getenv('FLASK_ENV', 'development')
     
+    # Inference engine: 'sklearn' (model.predict_proba) or 'compiled' (CompiledForest)
+    INFERENCE_ENGINE = os.getenv('INFERENCE_ENGINE', 'sklearn')
+    
+    # Students scored per chunk on /batch-predict/stream
+    STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 1000))
+    
+    # Approximate token limit per batched Gemini call on /batch-predict
+    GEMINI_BATCH_TOKEN_BUDGET = int(os.getenv('GEMINI_BATCH_TOKEN_BUDGET', 8000))
+    
+    # Persistent Gemini explanation cache (SQLite, shared by all workers)
+    EXPLANATION_CACHE_ENABLED = os.getenv('EXPLANATION_CACHE_ENABLED', 'true').lower() == 'true'
+    EXPLANATION_CACHE_PATH = os.getenv('EXPLANATION_CACHE_PATH', 'models/explanation_cache.db')
+    EXPLANATION_CACHE_MAX_ENTRIES = int(os.getenv('EXPLANATION_CACHE_MAX_ENTRIES', 10000))
+    EXPLANATION_CACHE_TTL_SECONDS = int(os.getenv('EXPLANATION_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+    
+    # /predict waits at most EXPLANATION_DEADLINE_SECONDS for Gemini, then answers
+    # with the rule-based explanation and an ID for GET /explanations/<id>
+    # (0 = wait for Gemini). Pending explanations run on EXPLANATION_WORKERS
+    # threads per worker and are kept for EXPLANATION_JOBS_TTL_SECONDS.
+    EXPLANATION_DEADLINE_SECONDS = float(os.getenv('EXPLANATION_DEADLINE_SECONDS', 2.0))
+    EXPLANATION_WORKERS = int(os.getenv('EXPLANATION_WORKERS', 4))
+    EXPLANATION_JOBS_PATH = os.getenv('EXPLANATION_JOBS_PATH', 'models/explanation_jobs.db')
+    EXPLANATION_JOBS_TTL_SECONDS = int(os.getenv('EXPLANATION_JOBS_TTL_SECONDS', 3600))
+    
+    # Upper bound on a single Gemini call
+    GEMINI_TIMEOUT_SECONDS = float(os.getenv('GEMINI_TIMEOUT_SECONDS', 30))
+    
+    # Prediction cache (SQLite, shared by all workers)
+    PREDICTION_CACHE_ENABLED = os.getenv('PREDICTION_CACHE_ENABLED', 'true').lower() == 'true'
+    PREDICTION_CACHE_PATH = os.getenv('PREDICTION_CACHE_PATH', 'models/prediction_cache.db')
+    PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv('PREDICTION_CACHE_MAX_ENTRIES', 100000))
+    
+    # /batch-predict responses of at least this many bytes are gzipped for
+    # clients that send Accept-Encoding: gzip (0 = never)
+    BATCH_RESPONSE_GZIP_MIN_BYTES = int(os.getenv('BATCH_RESPONSE_GZIP_MIN_BYTES', 1024))
+    
+    # Micro-batching: concurrent /predict calls on one worker (gunicorn
+    # threads > 1) that arrive within PREDICTION_BATCH_WINDOW_MS of each
+    # other are scored in one model call of up to PREDICTION_BATCH_MAX_SIZE
+    # rows (0 = score each request on its own)
+    PREDICTION_BATCH_WINDOW_MS = float(os.getenv('PREDICTION_BATCH_WINDOW_MS', 0))
+    PREDICTION_BATCH_MAX_SIZE = int(os.getenv('PREDICTION_BATCH_MAX_SIZE', 32))
+    
+    # Event ingestion (POST /events): per-student running aggregates of raw
+    # attendance, exam and incident events (SQLite, shared by all workers).
+    # /predict and /batch-predict score students sent without features from them.
+    STUDENT_AGGREGATES_ENABLED = os.getenv('STUDENT_AGGREGATES_ENABLED', 'true').lower() == 'true'
+    STUDENT_AGGREGATES_PATH = os.getenv('STUDENT_AGGREGATES_PATH', 'models/student_aggregates.db')
+    
+    # Model registry: versioned artifacts, hot-swapped by every worker
+    MODEL_REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR', 'models/registry')
+    MODEL_POLL_SECONDS = float(os.getenv('MODEL_POLL_SECONDS', 5))
+    RETRAIN_JOBS_DIR = os.getenv('RETRAIN_JOBS_DIR', 'models/jobs')
+    
+    # Incremental retraining: trees added per update, forest size cap, and
+    # age after which a tree's data is considered stale
+    INCREMENTAL_TREES_PER_UPDATE = int(os.getenv('INCREMENTAL_TREES_PER_UPDATE', 20))
+    INCREMENTAL_MAX_TREES = int(os.getenv('INCREMENTAL_MAX_TREES', 100))
+    INCREMENTAL_MAX_TREE_AGE_DAYS = int(os.getenv('INCREMENTAL_MAX_TREE_AGE_DAYS', 180))
+    
+    # Shadow scoring: retrained models are published as a candidate that
+    # scores a sample of /predict and /batch-predict inputs after each
+    # response is sent, until POST /shadow/promote makes it current.
+    # The queue is per worker; batches beyond it are dropped, not waited on.
+    SHADOW_NEW_MODELS = os.getenv('SHADOW_NEW_MODELS', 'false').lower() == 'true'
+    SHADOW_SAMPLE_RATE = float(os.getenv('SHADOW_SAMPLE_RATE', 1.0))
+    SHADOW_QUEUE_SIZE = int(os.getenv('SHADOW_QUEUE_SIZE', 100))
+    SHADOW_REPORT_PATH = os.getenv('SHADOW_REPORT_PATH', 'models/shadow_report.db')
+    SHADOW_FLUSH_SECONDS = float(os.getenv('SHADOW_FLUSH_SECONDS', 5))
+    
+    # Prime the model at startup (before fork when gunicorn preloads the app)
+    WARMUP_ON_BOOT = os.getenv('WARMUP_ON_BOOT', 'true').lower() == 'true'
+    
+    # 'blocking': load sklearn, the model and Gemini while importing the app
+    # (shared copy-on-write with gunicorn's preload_app). 'background': import
+    # only Flask and load the rest on a thread in each worker, so the port and
+    # /health/live answer at once; requests wait up to STARTUP_WAIT_SECONDS.
+    # Blocking stays the default because with preload_app the master loads
+    # and warms up once before forking; background loads in every worker.
+    STARTUP_MODE = os.getenv('STARTUP_MODE', 'blocking')
+    STARTUP_WAIT_SECONDS = float(os.getenv('STARTUP_WAIT_SECONDS', 60))
+    
     # Risk thresholds
     LOW_RISK_THRESHOLD = 0.3
     MEDIUM_RISK_THRESHOLD = 0.6
     HIGH_RISK_THRESHOLD = 0.8
     
+    # Optional JSON file overriding RiskCalculator breakpoint tables
+    RISK_TABLES_PATH = os.getenv('RISK_TABLES_PATH')
+    
     # Data tier thresholds (HACKATHON MODE: Reduced for quick demo)
     TIER_0_MIN_DAYS = 3   # Minimum for any prediction
     TIER_0_MIN_EXAMS = 1
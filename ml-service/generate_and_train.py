@@ -4,16 +4,22 @@ This script creates realistic training data and trains the dropout prediction mo
 Can also use real dropout data from database for better accuracy
 """
 
+import argparse
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, accuracy_score, precision_score, recall_score, f1_score
-import joblib
-import json
-import requests
 import os
-from datetime import datetime
+from models.feature_schema import FEATURE_COLUMNS, LABEL_COLUMN, validate_training_frame
+from models.ml_predictor import DEFAULT_HYPERPARAMETERS, build_model, data_window, save_trained_model
+from models.tuning import successive_halving_search
+from models.model_registry import REGISTRY_DIR
+from models.training_store import TRAINING_STORE_DIR, TrainingDataStore
+from models.training_data_client import ColumnarBuffer, TrainingDataClient
+
+# Columns training reads back from the store
+TRAINING_COLUMNS = FEATURE_COLUMNS + [LABEL_COLUMN, 'dropout_date']
 
 def generate_synthetic_data(n_samples=1000, random_state=42):
     """
@@ -128,59 +134,180 @@ def calculate_dropout_probability(attendance_rate, avg_marks, behavior_score,
     # Cap probability
     return min(prob, 0.95)
 
-def fetch_real_training_data(backend_url='http://localhost:5000'):
+def calculate_dropout_probability_batch(attendance_rate, avg_marks, behavior_score,
+                                        days_tracked, exams_completed):
+    """
+    Vectorized calculate_dropout_probability over NumPy arrays
+    Applies the same rules to whole columns at once
+    """
+    # Base probability
+    prob = np.full(len(attendance_rate), 0.1)
+    
+    # Attendance impact (40% weight)
+    prob += np.select(
+        [attendance_rate < 0.60, attendance_rate < 0.75, attendance_rate < 0.85],
+        [0.40, 0.25, 0.10],
+        default=0.0
+    )
+    
+    # Academic performance impact (40% weight)
+    prob += np.select(
+        [avg_marks < 40, avg_marks < 50, avg_marks < 60],
+        [0.40, 0.25, 0.10],
+        default=0.0
+    )
+    
+    # Behavior impact (20% weight)
+    prob += np.select(
+        [behavior_score < 40, behavior_score < 60, behavior_score < 80],
+        [0.20, 0.10, 0.05],
+        default=0.0
+    )
+    
+    # Data quality impact (less data = more uncertainty, slight increase)
+    prob += np.where(days_tracked < 30, 0.05, 0.0)
+    prob += np.where(exams_completed < 3, 0.05, 0.0)
+    
+    # Interaction effects (combined risk factors)
+    prob += np.where((attendance_rate < 0.70) & (avg_marks < 50), 0.15, 0.0)  # Double jeopardy
+    prob += np.where((behavior_score < 50) & (avg_marks < 50), 0.10, 0.0)  # Behavior + academic issues
+    
+    # Cap probability
+    return np.minimum(prob, 0.95)
+
+def _generate_synthetic_chunk(rng, n_samples):
+    """
+    Draw one chunk of synthetic students column by column
+    Same distributions and derivations as generate_synthetic_data
+    """
+    attendance_rate = np.clip(rng.beta(8, 2, n_samples), 0, 1)
+    avg_marks_percentage = np.clip(rng.normal(65, 20, n_samples), 0, 100)
+    behavior_score = np.clip(rng.beta(8, 2, n_samples) * 100, 0, 100)
+    days_tracked = rng.integers(14, 101, n_samples)
+    exams_completed = rng.integers(1, 11, n_samples)
+    
+    days_present = (days_tracked * attendance_rate).astype(np.int64)
+    days_absent = days_tracked - days_present
+    
+    total_incidents = rng.poisson(np.maximum(0, (100 - behavior_score) / 10))
+    negative_incidents = (total_incidents * 0.7).astype(np.int64)
+    positive_incidents = total_incidents - negative_incidents
+    
+    dropout_prob = calculate_dropout_probability_batch(
+        attendance_rate,
+        avg_marks_percentage,
+        behavior_score,
+        days_tracked,
+        exams_completed
+    )
+    dropped_out = (rng.random(n_samples) < dropout_prob).astype(np.int64)
+    
+    return pd.DataFrame({
+        'attendance_rate': np.round(attendance_rate, 3),
+        'avg_marks_percentage': np.round(avg_marks_percentage, 2),
+        'behavior_score': np.round(behavior_score, 2),
+        'days_tracked': days_tracked,
+        'exams_completed': exams_completed,
+        'days_present': days_present,
+        'days_absent': days_absent,
+        'total_incidents': total_incidents,
+        'positive_incidents': positive_incidents,
+        'negative_incidents': negative_incidents,
+        'dropped_out': dropped_out
+    })
+
+def iter_synthetic_data(n_samples=1000, chunk_size=100_000, random_state=42):
+    """
+    Yield synthetic student data as DataFrames of at most chunk_size rows
+    
+    Columns are drawn in bulk from a single np.random.Generator seeded with
+    random_state, so output is reproducible for a given (random_state,
+    chunk_size). It follows the same distributions as generate_synthetic_data
+    but not its exact legacy np.random stream.
+    """
+    rng = np.random.default_rng(random_state)
+    
+    for start in range(0, n_samples, chunk_size):
+        yield _generate_synthetic_chunk(rng, min(chunk_size, n_samples - start))
+
+def generate_synthetic_data_fast(n_samples=1000, random_state=42, chunk_size=100_000):
+    """Vectorized generate_synthetic_data returning a single DataFrame"""
+    chunks = list(iter_synthetic_data(n_samples, chunk_size, random_state))
+    if not chunks:
+        return _generate_synthetic_chunk(np.random.default_rng(random_state), 0)
+    return pd.concat(chunks, ignore_index=True)
+
+def write_synthetic_data(path, n_samples, chunk_size=100_000, random_state=42):
+    """
+    Stream synthetic data to a CSV file chunk by chunk
+    Memory stays bounded by chunk_size regardless of n_samples
+    """
+    rows_written = 0
+    for i, chunk in enumerate(iter_synthetic_data(n_samples, chunk_size, random_state)):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        rows_written += len(chunk)
+    return rows_written
+
+def fetch_real_training_data(backend_url='http://localhost:5000', page_size=5000):
     """
     Fetch real training data from backend API
     Returns DataFrame with real student outcomes
+    Pages through the endpoint page_size students at a time (gzip, one
+    pooled connection, parsed as it streams) instead of one huge response
     """
+    client = TrainingDataClient(backend_url, page_size=page_size)
     try:
         print(f"\nFetching real training data from {backend_url}...")
         
         # Note: In production, you'd need authentication token
-        # For now, assuming internal service-to-service call
-        response = requests.get(
-            f'{backend_url}/api/dropout/training-data',
-            headers={'Authorization': 'Bearer YOUR_TOKEN_HERE'},
-            timeout=30
-        )
+        # (BACKEND_API_TOKEN); for now, assuming internal service-to-service call
+        buffer = ColumnarBuffer()
+        dropped_out, active, pages = 0, 0, 0
+        for page in client.iter_pages(buffer):
+            pages += 1
+            dropped_out += page.get('dropped_out_count', 0)
+            active += page.get('active_count', 0)
+        df = buffer.to_frame()
         
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('success') and data.get('training_data'):
-                df = pd.DataFrame(data['training_data'])
-                print(f"✅ Fetched {len(df)} real student records")
-                print(f"   - Dropped out: {data.get('dropped_out_count', 0)}")
-                print(f"   - Active: {data.get('active_count', 0)}")
-                return df
+        if not df.empty:
+            print(f"✅ Fetched {len(df)} real student records in {pages} page(s)")
+            print(f"   - Dropped out: {dropped_out}")
+            print(f"   - Active: {active}")
+            return df
         
-        print(f"⚠️  Failed to fetch real data (status {response.status_code})")
+        print("⚠️  Backend returned no training data")
         return None
-        
+    
     except Exception as e:
         print(f"⚠️  Error fetching real data: {e}")
         return None
+    
+    finally:
+        client.close()
 
-def train_model(df, model_path='models/dropout_model.pkl', use_real_data=False):
+def training_store(real_data=True):
+    """Store for fetched outcomes, or for synthetic data (kept apart so they never mix)"""
+    return TrainingDataStore(os.path.join(TRAINING_STORE_DIR, 'real' if real_data else 'synthetic'))
+
+def train_model(df, model_path='models/dropout_model.pkl', use_real_data=False,
+                registry_dir=REGISTRY_DIR, hyperparameters=None, tuning=None, shadow=False):
     """
     Train Random Forest classifier on the data
     Includes comprehensive validation metrics
+    Publishes the model to registry_dir (if set) so running services pick it up,
+    or with shadow=True as the candidate they score in shadow until promoted
+    hyperparameters defaults to DEFAULT_HYPERPARAMETERS; tuning (the result of
+    a --tune search) is recorded in the metadata
+    Rows that fail the feature schema /predict validates against are left out
     """
-    # Define features (match Node.js feature extractor)
-    feature_columns = [
-        'attendance_rate',
-        'avg_marks_percentage',
-        'behavior_score',
-        'days_tracked',
-        'exams_completed',
-        'days_present',
-        'days_absent',
-        'total_incidents',
-        'positive_incidents',
-        'negative_incidents'
-    ]
+    df, rejected = validate_training_frame(df)
+    if rejected:
+        print(f"⚠️  Left out {len(rejected)} rows that fail the feature schema, "
+              f"e.g. row {next(iter(rejected))}: {next(iter(rejected.values()))}")
     
+    feature_columns = list(FEATURE_COLUMNS)
     X = df[feature_columns]
-    y = df['dropped_out']
+    y = df[LABEL_COLUMN]
     
     # Check if we have enough data
     if len(df) < 10:
@@ -202,17 +329,13 @@ def train_model(df, model_path='models/dropout_model.pkl', use_real_data=False):
     print(f"   Overall dropout rate: {y.mean():.2%}")
     
     # Train Random Forest
-    model = RandomForestClassifier(
-        n_estimators=100,
-        max_depth=10,
-        min_samples_split=10,
-        min_samples_leaf=5,
-        random_state=42,
-        class_weight='balanced'  # Handle class imbalance
-    )
+    hyperparameters = hyperparameters or DEFAULT_HYPERPARAMETERS
+    model = build_model(hyperparameters)
     
     print("\n🔄 Training Random Forest model...")
+    print(f"   Hyperparameters: {hyperparameters}")
     model.fit(X_train, y_train)
+    model.set_params(n_jobs=None)  # serve single-threaded
     
     # Evaluate on test set
     y_pred = model.predict(X_test)
@@ -260,45 +383,79 @@ def train_model(df, model_path='models/dropout_model.pkl', use_real_data=False):
     print("\n🎯 Feature Importance:")
     print(feature_importance.to_string(index=False))
     
-    # Save model
-    joblib.dump(model, model_path)
-    print(f"\n💾 Model saved to: {model_path}")
-    
-    # Save comprehensive metadata
+    # Save model and metadata (same schema as /retrain)
     metadata = {
-        'model_version': f'v{datetime.now().strftime("%Y%m%d_%H%M%S")}',
-        'training_date': datetime.now().isoformat(),
         'data_source': 'real_data' if use_real_data else 'synthetic_data',
-        'feature_columns': feature_columns,
-        'n_estimators': model.n_estimators,
         'training_samples': len(X_train),
         'test_samples': len(X_test),
         'total_samples': len(df),
+        'rejected_samples': len(rejected),
         'dropout_rate': float(y.mean()),
-        'metrics': {
-            'accuracy': float(accuracy),
-            'precision': float(precision),
-            'recall': float(recall),
-            'f1_score': float(f1),
-            'roc_auc': float(roc_auc)
-        },
-        'confusion_matrix': {
-            'true_negatives': int(tn),
-            'false_positives': int(fp),
-            'false_negatives': int(fn),
-            'true_positives': int(tp)
+        'accuracy': float(accuracy),
+        'precision': float(precision),
+        'recall': float(recall),
+        'f1_score': float(f1),
+        'roc_auc': float(roc_auc),
+        'confusion_matrix': {'tn': int(tn), 'fp': int(fp), 'fn': int(fn), 'tp': int(tp)},
+        'feature_importance': {
+            feature: float(importance) for feature, importance in zip(feature_columns, model.feature_importances_)
         },
-        'feature_importance': feature_importance.to_dict('records')
+        'training_mode': 'full',
+        'hyperparameters': hyperparameters,
+        'tree_windows': [data_window(df)] * len(model.estimators_)
     }
+    if tuning is not None:
+        metadata['tuning'] = tuning
+    
+    metadata = save_trained_model(model, metadata, model_path, registry_dir, shadow=shadow)
+    if registry_dir:
+        print(f"\n💾 Model published to registry{' as the shadow candidate' if shadow else ''}: "
+              f"{registry_dir}/{metadata['model_version']} "
+              f"(content hash {metadata['artifact']['content_hash'][:12]})")
+    if not (registry_dir and shadow):
+        print(f"💾 Model saved to: {model_path}")
+        print(f"💾 Model metadata saved to: {os.path.join(os.path.dirname(model_path), 'model_metadata.json')}")
     
-    with open('models/model_metadata.json', 'w') as f:
-        json.dump(metadata, f, indent=2)
+    return model, feature_importance, metadata
+
+def tune_hyperparameters(df, budget_seconds=300, n_candidates=27):
+    """
+    Successive-halving search over all cores for the best ROC-AUC /
+    latency trade-off
     
-    print("💾 Model metadata saved to: models/model_metadata.json")
+    Returns:
+        (winning hyperparameters, tuning record for model_metadata.json)
+    """
+    print(f"\n🔎 Tuning hyperparameters ({n_candidates} candidates, {budget_seconds:.0f}s budget)...")
+    df, _ = validate_training_frame(df)
+    search = successive_halving_search(
+        df[FEATURE_COLUMNS],
+        df[LABEL_COLUMN],
+        budget_seconds=budget_seconds,
+        n_candidates=n_candidates,
+        baseline=DEFAULT_HYPERPARAMETERS
+    )
     
-    return model, feature_importance, metadata
+    print(f"   Finished {search['rungs_completed']} rung(s), {len(search['trace'])} fits "
+          f"on {search['n_jobs']} cores in {search['elapsed_seconds']:.1f}s")
+    print(f"   Winner: {search['best']}")
+    print(f"   Validation ROC-AUC {search['roc_auc']:.4f}, "
+          f"{search['latency_us_per_row']:.1f} us/row, objective {search['objective']:.4f}")
+    
+    return search['best'], search
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate training data and train the dropout model')
+    parser.add_argument('--tune', action='store_true',
+                        help='search hyperparameters before training (successive halving, all cores)')
+    parser.add_argument('--tune-budget', type=float, default=300,
+                        help='wall-clock budget for --tune in seconds (default 300)')
+    parser.add_argument('--tune-candidates', type=int, default=27,
+                        help='configurations in the first --tune round (default 27)')
+    parser.add_argument('--shadow', action='store_true',
+                        help='publish as the shadow candidate; promote it once its live comparison looks good')
+    args = parser.parse_args(argv)
+    
     print("="*60)
     print("🎓 DROPOUT PREDICTION MODEL TRAINING")
     print("="*60)
@@ -320,15 +477,37 @@ def main():
         df = generate_synthetic_data(n_samples=1000)
         use_real_data = False
     
-    # Save training data
-    df.to_csv('models/training_data.csv', index=False)
-    print(f"💾 Training data saved to: models/training_data.csv")
+    # Append to the training store; rows already stored by earlier runs are skipped
+    store = training_store(use_real_data)
+    written = store.append(df)
+    print(f"💾 Training data: {written} new rows appended to {store.root} ({store.stats()['rows']} stored)")
+    
+    if use_real_data:
+        # Outcomes accumulate across runs; train on the newest row per student
+        df = store.load(
+            TRAINING_COLUMNS,
+            latest_by='student_id' if 'student_id' in df else None
+        )
+        print(f"   Training on {len(df)} stored students")
     
     print("\n📊 Data Summary:")
     print(df.describe())
     
+    hyperparameters, tuning = None, None
+    if args.tune:
+        try:
+            hyperparameters, tuning = tune_hyperparameters(df, args.tune_budget, args.tune_candidates)
+        except TimeoutError:
+            print("⚠️  No tuning round finished within the budget; using default hyperparameters")
+    
     # Train model with validation
-    model, feature_importance, metadata = train_model(df, use_real_data=use_real_data)
+    model, feature_importance, metadata = train_model(
+        df,
+        use_real_data=use_real_data,
+        hyperparameters=hyperparameters,
+        tuning=tuning,
+        shadow=args.shadow
+    )
     
     print("\n" + "="*60)
     print("✅ TRAINING COMPLETE")
@@ -0,0 +1,69 @@
+"""
+Gunicorn settings for the ML service
+Run with: gunicorn -c gunicorn.conf.py app:app
+
+The app is loaded once in the master before workers fork (preload_app), so
+the model, its compiled arrays and the sklearn/pandas/Gemini imports are
+shared copy-on-write instead of being duplicated in every worker.
+With STARTUP_MODE=background the import is cheap and each worker loads
+those on a thread after it boots instead.
+"""
+
+import gc
+import glob
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5001)}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+# More than one thread per worker selects the gthread worker; concurrent
+# /predict calls on one worker can then share a model call (see
+# PREDICTION_BATCH_WINDOW_MS)
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Workers write Prometheus samples to per-process files here and /metrics
+# sums them. Must be set before the app (and prometheus_client) is imported.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'ml-service-metrics')
+)
+# Created while the config loads: gunicorn preloads the app (whose imports
+# already write samples) before any server hook runs. It is cleared once,
+# in on_starting, not here: the config is re-read on every SIGHUP reload,
+# while live workers still write to their files.
+os.makedirs(metrics_dir, exist_ok=True)
+
+
+def on_starting(server):
+    # Samples left over from a previous run would be summed in. The
+    # master's own files, written while preloading the app, are kept.
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        if not path.endswith(f'_{os.getpid()}.db'):
+            os.remove(path)
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the collector's reach. Otherwise
+    # the first GC pass in each worker writes to every object header and
+    # un-shares the pages holding the preloaded model.
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} started (preload_app={preload_app})")
+
+
+def post_worker_init(worker):
+    # STARTUP_MODE=background: start loading the model as soon as the worker
+    # has imported the app, rather than on its first request
+    import app
+    app.start_background_startup()
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges; its counters are kept
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,167 @@
+"""
+Persistent cache for Gemini explanations
+Students with near-identical profiles and the same risk level share one
+explanation, so repeat /predict calls skip the remote model entirely
+"""
+
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+# Bucket width per feature. Values inside the same bucket share a cache key.
+FEATURE_BUCKETS = {
+    'attendance_rate': 0.05,
+    'avg_marks_percentage': 5,
+    'behavior_score': 5,
+    'days_tracked': 10,
+    'exams_completed': 1,
+    'days_present': 10,
+    'days_absent': 5,
+    'total_incidents': 1,
+    'positive_incidents': 1,
+    'negative_incidents': 1
+}
+
+
+class ExplanationCache:
+    """
+    LRU + TTL cache of explanation dicts backed by SQLite
+    The database file survives restarts and is shared by every gunicorn
+    worker pointing at the same path
+    """
+    
+    def __init__(self, path: str, max_entries: int = 10000, ttl_seconds: int = 7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+    
+    def make_key(self, model_version: str, risk_level: str, features: Dict,
+                 feature_importance: Optional[Dict] = None, top_n: int = 3) -> str:
+        """
+        Build a cache key from the model version, risk level and bucketed
+        attendance/marks/behavior plus the student's top features
+        """
+        bucketed = {
+            name: self._bucket(name, features.get(name, 0))
+            for name in ('attendance_rate', 'avg_marks_percentage', 'behavior_score')
+        }
+        
+        top_features = sorted(
+            (feature_importance or {}).items(),
+            key=lambda x: x[1],
+            reverse=True
+        )[:top_n]
+        for name, _ in top_features:
+            bucketed[name] = self._bucket(name, features.get(name, 0))
+        
+        payload = json.dumps(
+            [model_version, risk_level, [name for name, _ in top_features], bucketed],
+            sort_keys=True
+        )
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """Cached explanation for key, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                'SELECT value FROM explanations WHERE key = ? AND created_at >= ?',
+                (key, now - self.ttl_seconds)
+            ).fetchone()
+            
+            if row is None:
+                self.misses += 1
+                return None
+            
+            conn.execute('UPDATE explanations SET last_access = ? WHERE key = ?', (now, key))
+            conn.commit()
+            self.hits += 1
+        
+        return json.loads(row[0])
+    
+    def put(self, key: str, model_version: str, explanation: Dict):
+        """Store an explanation and evict least recently used entries over max_entries"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO explanations (key, model_version, value, created_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, model_version, json.dumps(explanation), now, now)
+            )
+            conn.execute(
+                'DELETE FROM explanations WHERE created_at < ? OR key IN ('
+                '  SELECT key FROM explanations ORDER BY last_access DESC LIMIT -1 OFFSET ?'
+                ')',
+                (now - self.ttl_seconds, self.max_entries)
+            )
+            conn.commit()
+    
+    def invalidate(self, keep_version: Optional[str] = None):
+        """Drop every entry not produced by keep_version (all entries if None)"""
+        with self._lock:
+            conn = self._connection()
+            if keep_version is None:
+                conn.execute('DELETE FROM explanations')
+            else:
+                conn.execute('DELETE FROM explanations WHERE model_version != ?', (keep_version,))
+            conn.commit()
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process and current entry count"""
+        with self._lock:
+            entries = self._connection().execute('SELECT COUNT(*) FROM explanations').fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': entries
+        }
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Per-process connection; reopened after fork so workers never share one"""
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS explanations ('
+                '  key TEXT PRIMARY KEY,'
+                '  model_version TEXT NOT NULL,'
+                '  value TEXT NOT NULL,'
+                '  created_at REAL NOT NULL,'
+                '  last_access REAL NOT NULL'
+                ')'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_explanations_last_access ON explanations (last_access)'
+            )
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+    
+    @staticmethod
+    def _bucket(name: str, value) -> float:
+        """Quantize a feature value to the lower edge of its bucket"""
+        width = FEATURE_BUCKETS.get(name, 1)
+        try:
+            # Small epsilon so values on a bucket edge (0.75 / 0.05) don't
+            # fall into the bucket below through float error
+            return round(math.floor(float(value) / width + 1e-9) * width, 4)
+        except (TypeError, ValueError):
+            return str(value)
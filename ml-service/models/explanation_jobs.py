@@ -0,0 +1,124 @@
+"""
+Deadline-bounded explanation jobs
+/predict hands the Gemini call to a thread pool and waits only up to a
+deadline. Explanations that miss it keep running and are stored under an
+explanation ID in a SQLite file, so any gunicorn worker can serve
+GET /explanations/<id> once they finish
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+EXPLANATION_JOBS_PATH = 'models/explanation_jobs.db'
+
+
+class ExplanationJobs:
+    """Runs explanation callables in the background and keeps their results for ttl_seconds"""
+    
+    def __init__(self, path: str = EXPLANATION_JOBS_PATH, max_workers: int = 4, ttl_seconds: int = 3600):
+        self.path = path
+        self.max_workers = max_workers
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._conn = None
+        self._pid = None
+    
+    def submit(self, fn: Callable[..., Dict], *args) -> Tuple[str, Future]:
+        """
+        Start fn(*args) in the background
+        
+        Returns:
+            (explanation_id, future). The future resolves to fn's explanation
+            dict, which is also stored under explanation_id.
+        """
+        explanation_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT INTO explanation_jobs (id, status, value, created_at) VALUES (?, 'pending', NULL, ?)",
+                (explanation_id, now)
+            )
+            conn.execute('DELETE FROM explanation_jobs WHERE created_at < ?', (now - self.ttl_seconds,))
+            conn.commit()
+        
+        return explanation_id, self._get_executor().submit(self._run, explanation_id, fn, args)
+    
+    def get(self, explanation_id: str) -> Optional[Dict]:
+        """{'explanation_id', 'status', 'result'?, 'error'?} or None if unknown or expired"""
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT status, value FROM explanation_jobs WHERE id = ? AND created_at >= ?',
+                (explanation_id, time.time() - self.ttl_seconds)
+            ).fetchone()
+        if row is None:
+            return None
+        
+        status, value = row
+        entry = {'explanation_id': explanation_id, 'status': status}
+        if value is not None:
+            entry['result' if status == 'ready' else 'error'] = json.loads(value)
+        return entry
+    
+    def _run(self, explanation_id: str, fn: Callable[..., Dict], args) -> Dict:
+        """Execute one job and record its result (or error) under its ID"""
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self._finish(explanation_id, 'failed', str(e))
+            raise
+        self._finish(explanation_id, 'ready', result)
+        return result
+    
+    def _finish(self, explanation_id: str, status: str, value):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                'UPDATE explanation_jobs SET status = ?, value = ? WHERE id = ?',
+                (status, json.dumps(value), explanation_id)
+            )
+            conn.commit()
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Per-process executor; threads do not survive a fork"""
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='explanation'
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Per-process connection; reopened after fork so workers never share one"""
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS explanation_jobs ('
+                '  id TEXT PRIMARY KEY,'
+                '  status TEXT NOT NULL,'
+                '  value TEXT,'
+                '  created_at REAL NOT NULL'
+                ')'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_explanation_jobs_created_at ON explanation_jobs (created_at)'
+            )
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
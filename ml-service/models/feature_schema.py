@@ -0,0 +1,242 @@
+"""
+Feature schema shared by serving and training
+One place defines the model's input columns (order, dtype, valid range,
+default) and the cross-field rules a student's features must satisfy.
+FeatureSchema compiles them into NumPy arrays once, so a whole batch is
+coerced into the model's float64 matrix and checked with a few vectorized
+operations instead of key by key. Rows that fail are masked with a reason
+rather than failing the batch.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FLOAT = 'float'
+COUNT = 'count'
+
+
+class Feature:
+    """One input column: a float or a whole-number count within [minimum, maximum]"""
+    
+    def __init__(self, name: str, dtype: str = FLOAT, minimum: float = 0.0,
+                 maximum: float = np.inf, default: Optional[float] = 0.0):
+        """
+        Args:
+            name: Column name (the key in a request's features object)
+            dtype: FLOAT or COUNT
+            minimum: Smallest valid value
+            maximum: Largest valid value
+            default: Value used when the column is missing or null; None
+                     makes the column required
+        """
+        if dtype not in (FLOAT, COUNT):
+            raise ValueError(f"Unknown feature dtype: {dtype}")
+        self.name = name
+        self.dtype = dtype
+        self.minimum = minimum
+        self.maximum = maximum
+        self.default = default
+    
+    def describe_range(self) -> str:
+        """The valid range, for error messages"""
+        if np.isfinite(self.maximum):
+            return f"between {self.minimum:g} and {self.maximum:g}"
+        return f"at least {self.minimum:g}"
+
+
+class FeatureSchema:
+    """
+    Ordered columns plus "parts add up to at most total" rules, compiled for
+    batch validation
+    
+    extract_rows and extract_columns return (X, invalid, reasons): the
+    values as an n_rows x n_columns float64 matrix in column order, a boolean
+    mask of rows that failed validation, and one message per row (None where
+    the row is valid). Missing and null values take the column default.
+    Values in invalid rows are not meaningful.
+    """
+    
+    def __init__(self, features: Sequence[Feature], sum_rules: Sequence[Tuple[Sequence[str], str]] = ()):
+        """
+        Args:
+            features: Columns in model order
+            sum_rules: (parts, total) pairs; a row is invalid when its parts
+                       add up to more than its total
+        """
+        self.features = tuple(features)
+        self.columns = [feature.name for feature in self.features]
+        self.sum_rules = tuple((tuple(parts), total) for parts, total in sum_rules)
+        
+        index = {name: j for j, name in enumerate(self.columns)}
+        self._minimum = np.array([feature.minimum for feature in self.features], dtype=np.float64)
+        self._maximum = np.array([feature.maximum for feature in self.features], dtype=np.float64)
+        self._required = np.array([feature.default is None for feature in self.features])
+        self._default = np.array([
+            0.0 if feature.default is None else feature.default for feature in self.features
+        ], dtype=np.float64)
+        self._counts = np.array([feature.dtype == COUNT for feature in self.features])
+        self._rules = [
+            ([index[part] for part in parts], index[total], ' + '.join(parts), total)
+            for parts, total in self.sum_rules
+        ]
+    
+    def columns_of(self, dtype: str) -> Tuple[str, ...]:
+        """Names of the columns with the given dtype, in order"""
+        return tuple(feature.name for feature in self.features if feature.dtype == dtype)
+    
+    def extract_rows(self, rows: Sequence[Dict]) -> Tuple[np.ndarray, np.ndarray, List[Optional[str]]]:
+        """Validate a list of feature dicts; keys outside the schema are ignored"""
+        reasons = {}
+        try:
+            columns = {col: [row.get(col) for row in rows] for col in self.columns}
+        except AttributeError:
+            # Rows that aren't objects are invalid; the rest are still read
+            for i, row in enumerate(rows):
+                if not isinstance(row, dict):
+                    reasons[i] = ['features must be an object']
+            rows = [row if isinstance(row, dict) else {} for row in rows]
+            columns = {col: [row.get(col) for row in rows] for col in self.columns}
+        return self._extract(columns, len(rows), reasons)
+    
+    def extract_columns(self, columns, n_rows: int) -> Tuple[np.ndarray, np.ndarray, List[Optional[str]]]:
+        """
+        Validate one array-like of n_rows values per column (a dict of lists
+        or arrays, or a DataFrame); a missing column takes its default
+        """
+        return self._extract(columns, n_rows, {})
+    
+    def normalize(self, features, defaults: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """
+        One student's features as the model reads them: every schema column,
+        with missing, null and unreadable values at their defaults. For code
+        that formats or compares feature values, such as explanations;
+        defaults overrides the schema's for columns the caller left out or
+        sent as null
+        """
+        X, _, _ = self.extract_rows([features])
+        values = dict(zip(self.columns, X[0].tolist()))
+        
+        given = features if isinstance(features, dict) else {}
+        for name, default in (defaults or {}).items():
+            if given.get(name) is None:
+                values[name] = default
+        return values
+    
+    def _extract(self, columns, n_rows, reasons):
+        X = np.empty((n_rows, len(self.columns)), dtype=np.float64)
+        
+        # Columns are converted whole; only a column that fails is walked
+        # value by value, so bad values mask their own rows
+        for j, col in enumerate(self.columns):
+            values = columns.get(col)
+            if values is None:
+                X[:, j] = np.nan
+                continue
+            try:
+                X[:, j] = np.asarray(values, dtype=np.float64)
+                continue
+            except (TypeError, ValueError):
+                pass
+            for i, value in enumerate(values):
+                try:
+                    X[i, j] = np.nan if value is None else value
+                except (TypeError, ValueError) as e:
+                    X[i, j] = np.nan
+                    reasons.setdefault(i, []).append(f"{col}: {e}")
+        
+        missing = np.isnan(X)
+        if missing.any():
+            for i, j in zip(*np.nonzero(missing & self._required)):
+                reasons.setdefault(i, []).append(f"{self.columns[j]} is missing")
+            X = np.where(missing, self._default, X)
+        
+        # One array operation per check; messages are built only for failures
+        checks = (
+            (~np.isfinite(X) | (X < self._minimum) | (X > self._maximum), lambda j, value: (
+                f"{self.columns[j]} must be {self.features[j].describe_range()} (got {value:g})"
+            )),
+            (self._counts & (X != np.floor(X)), lambda j, value: (
+                f"{self.columns[j]} must be a whole number (got {value:g})"
+            ))
+        )
+        for failed, message in checks:
+            for i, j in zip(*np.nonzero(failed)):
+                reasons.setdefault(i, []).append(message(j, X[i, j]))
+        
+        for parts, total, parts_name, total_name in self._rules:
+            sums = X[:, parts].sum(axis=1)
+            for i in np.flatnonzero(sums > X[:, total]):
+                reasons.setdefault(i, []).append(
+                    f"{parts_name} ({sums[i]:g}) exceeds {total_name} ({X[i, total]:g})"
+                )
+        
+        invalid = np.zeros(n_rows, dtype=bool)
+        row_reasons = [None] * n_rows
+        for i, messages in reasons.items():
+            invalid[i] = True
+            row_reasons[i] = '; '.join(messages)
+        return X, invalid, row_reasons
+
+
+# Model input columns, in order (must match the Node.js feature extractor).
+# Days marked late or excused count towards days_tracked but neither
+# days_present nor days_absent, and incidents can be neutral, so those
+# parts may add up to less than their total but never more.
+FEATURES = (
+    Feature('attendance_rate', FLOAT, 0, 1),
+    Feature('avg_marks_percentage', FLOAT, 0, 100),
+    Feature('behavior_score', FLOAT, 0, 100),
+    Feature('days_tracked', COUNT),
+    Feature('exams_completed', COUNT),
+    Feature('days_present', COUNT),
+    Feature('days_absent', COUNT),
+    Feature('total_incidents', COUNT),
+    Feature('positive_incidents', COUNT),
+    Feature('negative_incidents', COUNT)
+)
+SUM_RULES = (
+    (('days_present', 'days_absent'), 'days_tracked'),
+    (('positive_incidents', 'negative_incidents'), 'total_incidents')
+)
+LABEL_COLUMN = 'dropped_out'
+
+FEATURE_SCHEMA = FeatureSchema(FEATURES, SUM_RULES)
+FEATURE_COLUMNS = FEATURE_SCHEMA.columns
+
+# Not a model input: how much data backs a student's features (0 is too
+# little to score, 1-3 set the confidence). Columnar requests send it as a
+# column, checked like the features.
+DATA_TIER_SCHEMA = FeatureSchema((Feature('data_tier', COUNT, 0, 3),))
+
+# Values the rule-based explanations assume for features a request left
+# out: none of them triggers a recommendation
+NO_ISSUE_DEFAULTS = {
+    'attendance_rate': 1.0,
+    'avg_marks_percentage': 100.0,
+    'behavior_score': 100.0,
+    'exams_completed': 10
+}
+
+# Training rows also need a 0/1 outcome
+TRAINING_SCHEMA = FeatureSchema(FEATURES + (Feature(LABEL_COLUMN, COUNT, 0, 1, default=None),), SUM_RULES)
+
+
+def validate_training_frame(df):
+    """
+    The rows of a training DataFrame that pass TRAINING_SCHEMA, with feature
+    and label columns replaced by their validated values (counts and the
+    label as integers)
+    
+    Returns:
+        (DataFrame of valid rows, {position in df: reason} for every dropped row)
+    """
+    X, invalid, reasons = TRAINING_SCHEMA.extract_columns(df, len(df))
+    valid = ~invalid
+    
+    clean = df.loc[valid].copy()
+    for j, feature in enumerate(TRAINING_SCHEMA.features):
+        values = X[valid, j]
+        clean[feature.name] = values.astype(np.int64) if feature.dtype == COUNT else values
+    
+    return clean, {int(i): reasons[i] for i in np.flatnonzero(invalid)}
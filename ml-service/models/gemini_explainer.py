@@ -1,16 +1,30 @@
 import google.generativeai as genai
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 import json
 
+from models.feature_schema import FEATURE_SCHEMA, NO_ISSUE_DEFAULTS
+
+# Rough prompt sizing for batched explanations (~4 characters per token)
+CHARS_PER_TOKEN = 4
+RESPONSE_TOKENS_PER_STUDENT = 250
+
+# Prompts show a missing behavior score as no issues; other features as 0
+PROMPT_DEFAULTS = {'behavior_score': 100.0}
+
 class GeminiExplainer:
     """
     Uses Google Gemini to generate explainable AI recommendations
     for dropout risk predictions.
     """
     
-    def __init__(self, api_key: str):
+    # Passed to every generate_content call; set from the timeout argument
+    request_options = None
+    
+    def __init__(self, api_key: str, timeout: Optional[float] = None):
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel('gemini-2.5-flash')
+        # Per-call timeout in seconds; a failed or timed-out call gets the fallback
+        self.request_options = {'timeout': timeout} if timeout else None
     
     def generate_explanation(self, student_data: Dict, risk_result: Dict) -> Dict:
         """
@@ -26,7 +40,7 @@ class GeminiExplainer:
         prompt = self._build_prompt(student_data, risk_result)
         
         try:
-            response = self.model.generate_content(prompt)
+            response = self.model.generate_content(prompt, request_options=self.request_options)
             explanation_text = response.text
             
             # Parse structured response
@@ -44,40 +58,180 @@ class GeminiExplainer:
             # Fallback to rule-based explanation
             return self._fallback_explanation(student_data, risk_result, str(e))
     
+    def generate_explanations_batch(self, items: List[Tuple[Dict, Dict]], token_budget: int = 8000) -> List[Dict]:
+        """
+        Generate explanations for many students with as few Gemini calls as possible.
+        
+        Students are packed into one structured prompt per group, with groups
+        sized so that prompt plus expected response stays within token_budget.
+        
+        Args:
+            items: List of (student_data, risk_result) pairs, as for generate_explanation
+            token_budget: Approximate token limit per Gemini call
+        
+        Returns:
+            List of explanation dicts aligned with items. Students whose prompt
+            section can't be built, or who are missing from or unparseable in
+            the response, get the rule-based fallback.
+        """
+        results = [None] * len(items)
+        
+        # A student whose prompt section can't be built gets the fallback
+        # on its own instead of failing the whole batch
+        blocks = {}
+        for i, (student_data, risk_result) in enumerate(items):
+            try:
+                blocks[i] = self._build_student_block(student_data, risk_result)
+            except Exception as e:
+                results[i] = self._fallback_explanation(student_data, risk_result, f"Could not build prompt: {e}")
+        
+        for group in self._group_by_token_budget(blocks, token_budget):
+            prompt = self._build_batch_prompt([blocks[i] for i in group])
+            
+            try:
+                response = self.model.generate_content(prompt, request_options=self.request_options)
+                parsed = self._parse_batch_response(response.text, len(group))
+                error = 'Student missing from batched Gemini response'
+            except Exception as e:
+                parsed = {}
+                error = str(e)
+            
+            for position, index in enumerate(group):
+                entry = parsed.get(position)
+                if entry is None:
+                    student_data, risk_result = items[index]
+                    results[index] = self._fallback_explanation(student_data, risk_result, error)
+                    continue
+                
+                results[index] = {
+                    'success': True,
+                    'explanation': entry['explanation'],
+                    'recommendations': entry.get('recommendations', []),
+                    'priority_actions': entry.get('priority_actions', [])
+                }
+        
+        return results
+    
+    def _group_by_token_budget(self, blocks: Dict[int, str], token_budget: int) -> List[List[int]]:
+        """Split {item index: student block} into consecutive groups of indices that fit the token budget"""
+        header_tokens = len(self._build_batch_prompt([])) // CHARS_PER_TOKEN
+        
+        groups = []
+        current = []
+        used = header_tokens
+        for i, block in blocks.items():
+            cost = len(block) // CHARS_PER_TOKEN + RESPONSE_TOKENS_PER_STUDENT
+            if current and used + cost > token_budget:
+                groups.append(current)
+                current = []
+                used = header_tokens
+            current.append(i)
+            used += cost
+        
+        if current:
+            groups.append(current)
+        return groups
+    
+    def _build_student_block(self, student_data: Dict, risk_result: Dict) -> str:
+        """Compact per-student section of a batched prompt, numbered by _build_batch_prompt"""
+        features = FEATURE_SCHEMA.normalize(student_data.get('features'), PROMPT_DEFAULTS)
+        top_features, is_local = self._top_factors(student_data, 3)
+        top_features_text = ", ".join(
+            f"{feat.replace('_', ' ').title()} ({value:+.1%} to risk)" if is_local
+            else f"{feat.replace('_', ' ').title()} ({value:.2%})"
+            for feat, value in top_features
+        )
+        
+        return f"""- Attendance Rate: {features['attendance_rate'] * 100:.1f}%
+- Average Marks: {features['avg_marks_percentage']:.1f}%
+- Behavior Score: {features['behavior_score']:.1f}/100
+- Days Tracked: {features['days_tracked']:.0f}
+- Exams Completed: {features['exams_completed']:.0f}
+- Risk Score: {risk_result.get('risk_score', 0) * 100:.1f}% probability of dropout
+- Risk Level: {risk_result.get('risk_level', 'unknown').upper()}
+- Top Risk Factors: {top_features_text}
+"""
+    
+    def _build_batch_prompt(self, blocks: List[str]) -> str:
+        """Build one structured prompt covering the students' blocks, numbered from 0"""
+        student_blocks = "\n".join(f"STUDENT {i}:\n{block}" for i, block in enumerate(blocks))
+        
+        return f"""You are an educational counselor analyzing student dropout risk using a Machine Learning model (Random Forest Classifier).
+
+{student_blocks}
+For EACH student above, provide:
+1. A brief explanation (2-3 sentences) of why the ML model predicts that risk level, referencing the top risk factors
+2. 3-5 specific, actionable recommendations for teachers/counselors
+3. Top 2 priority actions to take immediately
+
+Format your response as a JSON array with exactly one object per student, using the student number as "index":
+[
+  {{
+    "index": 0,
+    "explanation": "Brief explanation here",
+    "recommendations": ["Recommendation 1", "Recommendation 2", ...],
+    "priority_actions": ["Priority 1", "Priority 2"]
+  }},
+  ...
+]
+"""
+    
+    def _parse_batch_response(self, response_text: str, n_students: int) -> Dict[int, Dict]:
+        """
+        Parse a batched Gemini response into {student index: entry}.
+        Entries that are malformed or out of range are dropped.
+        """
+        parsed = self._parse_gemini_response(response_text)
+        if not isinstance(parsed, list):
+            return {}
+        
+        entries = {}
+        for entry in parsed:
+            if not isinstance(entry, dict) or not isinstance(entry.get('explanation'), str):
+                continue
+            index = entry.get('index')
+            if isinstance(index, int) and 0 <= index < n_students:
+                entries[index] = entry
+        
+        return entries
+    
     def _build_prompt(self, student_data: Dict, risk_result: Dict) -> str:
         """Build structured prompt for Gemini with ML feature importance"""
-        features = student_data.get('features', {})
+        features = FEATURE_SCHEMA.normalize(student_data.get('features'), PROMPT_DEFAULTS)
         risk_score = risk_result.get('risk_score', 0)
         risk_level = risk_result.get('risk_level', 'unknown')
-        feature_importance = student_data.get('feature_importance', {})
         
-        # Get top 3 most important features
-        top_features = sorted(
-            feature_importance.items(), 
-            key=lambda x: x[1], 
-            reverse=True
-        )[:3]
+        # Get top 3 risk factors, preferring this student's own contributions
+        top_features, is_local = self._top_factors(student_data, 3)
         
-        top_features_text = "\n".join([
-            f"- {feat.replace('_', ' ').title()}: {imp:.2%} importance"
-            for feat, imp in top_features
-        ])
+        if is_local:
+            factors_heading = "TOP RISK FACTORS (this student's ML feature contributions):"
+            top_features_text = "\n".join([
+                f"- {feat.replace('_', ' ').title()}: {value:+.1%} to dropout risk"
+                for feat, value in top_features
+            ])
+        else:
+            factors_heading = "TOP RISK FACTORS (by ML feature importance):"
+            top_features_text = "\n".join([
+                f"- {feat.replace('_', ' ').title()}: {value:.2%} importance"
+                for feat, value in top_features
+            ])
         
         prompt = f"""You are an educational counselor analyzing student dropout risk using a Machine Learning model.
 
 STUDENT PROFILE:
-- Attendance Rate: {features.get('attendance_rate', 0) * 100:.1f}%
-- Average Marks: {features.get('avg_marks_percentage', 0):.1f}%
-- Behavior Score: {features.get('behavior_score', 100):.1f}/100
-- Days Tracked: {features.get('days_tracked', 0)}
-- Exams Completed: {features.get('exams_completed', 0)}
+- Attendance Rate: {features['attendance_rate'] * 100:.1f}%
+- Average Marks: {features['avg_marks_percentage']:.1f}%
+- Behavior Score: {features['behavior_score']:.1f}/100
+- Days Tracked: {features['days_tracked']:.0f}
+- Exams Completed: {features['exams_completed']:.0f}
 
 ML MODEL PREDICTION:
 - Risk Score: {risk_score * 100:.1f}% probability of dropout
 - Risk Level: {risk_level.upper()}
 - Model Type: Random Forest Classifier
 
-TOP RISK FACTORS (by ML feature importance):
+{factors_heading}
 {top_features_text}
 
 Please provide:
@@ -94,6 +248,21 @@ Format your response as JSON:
 """
         return prompt
     
+    def _top_factors(self, student_data: Dict, n: int) -> Tuple[List[Tuple[str, float]], bool]:
+        """
+        Top n (feature, value) pairs, ranked by the student's own feature
+        contributions when present, else by global feature importance.
+        The flag is True when the ranking is per-student.
+        """
+        feature_contributions = student_data.get('feature_contributions')
+        ranking = feature_contributions or student_data.get('feature_importance', {})
+        top_features = sorted(
+            ranking.items(), 
+            key=lambda x: x[1], 
+            reverse=True
+        )[:n]
+        return top_features, bool(feature_contributions)
+    
     def _parse_gemini_response(self, response_text: str) -> Dict:
         """Attempt to parse JSON from Gemini response"""
         try:
@@ -116,17 +285,12 @@ Format your response as JSON:
     
     def _fallback_explanation(self, student_data: Dict, risk_result: Dict, error: str) -> Dict:
         """Generate rule-based explanation if Gemini fails"""
-        features = student_data.get('features', {})
+        features = FEATURE_SCHEMA.normalize(student_data.get('features'), NO_ISSUE_DEFAULTS)
         risk_level = risk_result.get('risk_level', 'unknown')
-        feature_importance = student_data.get('feature_importance', {})
+        top_features, _ = self._top_factors(student_data, 2)
         
         # Identify top risk factors from ML model
-        if feature_importance:
-            top_features = sorted(
-                feature_importance.items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:2]
+        if top_features:
             top_factors = [f[0].replace('_', ' ').title() for f in top_features]
             explanation = f"ML model predicts {risk_level} risk. Key factors: {', '.join(top_factors)}."
         else:
@@ -135,13 +299,13 @@ Format your response as JSON:
         recommendations = []
         
         # Generate recommendations based on features
-        if features.get('attendance_rate', 1) < 0.75:
+        if features['attendance_rate'] < 0.75:
             recommendations.append("Monitor and improve attendance through parent engagement")
-        if features.get('avg_marks_percentage', 100) < 50:
+        if features['avg_marks_percentage'] < 50:
             recommendations.append("Provide intensive academic support and tutoring")
-        if features.get('behavior_score', 100) < 60:
+        if features['behavior_score'] < 60:
             recommendations.append("Implement behavior intervention and counseling")
-        if features.get('exams_completed', 10) < 3:
+        if features['exams_completed'] < 3:
             recommendations.append("Ensure regular exam participation")
         
         if not recommendations:
@@ -0,0 +1,138 @@
+"""
+Prometheus metrics for the ML service
+Under gunicorn every worker writes its samples to per-process files in
+PROMETHEUS_MULTIPROC_DIR (set by gunicorn.conf.py) and /metrics sums them,
+so a scrape sees the whole service whichever worker answers it
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest
+)
+
+# Sub-millisecond model calls up to multi-second Gemini round trips
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+BATCH_SIZE_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = Histogram(
+    'ml_request_duration_seconds',
+    'Request latency by endpoint',
+    ['endpoint'],
+    buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter(
+    'ml_requests_total',
+    'Requests by endpoint and HTTP status',
+    ['endpoint', 'status']
+)
+STAGE_LATENCY = Histogram(
+    'ml_stage_duration_seconds',
+    'Latency of one processing stage (parse_json, feature_extraction, '
+    'predict_proba, explanation_gemini, explanation_fallback, ...)',
+    ['stage'],
+    buckets=LATENCY_BUCKETS
+)
+BATCH_SIZE = Histogram(
+    'ml_batch_size',
+    'Students per batch request',
+    ['endpoint'],
+    buckets=BATCH_SIZE_BUCKETS
+)
+EXPLANATIONS = Counter(
+    'ml_explanations_total',
+    'Explanations by source: gemini, gemini_fallback (Gemini failed), '
+    'deadline_fallback (Gemini missed the /predict deadline), '
+    'fallback (Gemini not configured) or cache',
+    ['source']
+)
+CACHE_LOOKUPS = Counter(
+    'ml_cache_lookups_total',
+    'Cache lookups by cache and result',
+    ['cache', 'result']
+)
+STARTUP_SECONDS = Gauge(
+    'ml_startup_phase_seconds',
+    'Duration of each startup phase: imports, model_load, gemini_init, warm_up',
+    ['phase'],
+    multiprocess_mode='max'
+)
+MODEL_INFO = Gauge(
+    'ml_model_info',
+    'Model version currently served (1) by at least one live worker',
+    ['model_version'],
+    multiprocess_mode='livemax'
+)
+
+
+@contextmanager
+def time_stage(stage: str):
+    """Record the wrapped block's duration under ml_stage_duration_seconds"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def time_startup_phase(phase: str, timings: dict):
+    """
+    Record the wrapped startup phase's duration in timings and
+    ml_startup_phase_seconds. A failed metric write is logged, never raised:
+    it must not abort startup or mask the phase's own error
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = time.perf_counter() - start
+        try:
+            STARTUP_SECONDS.labels(phase).set(timings[phase])
+        except Exception as e:
+            logger.warning(f"Could not record startup phase {phase}: {e}")
+
+
+def record_cache_lookups(cache: str, hits: int, misses: int):
+    """Count hits and misses of one cache lookup (or one batched lookup)"""
+    if hits:
+        CACHE_LOOKUPS.labels(cache, 'hit').inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(cache, 'miss').inc(misses)
+
+
+def set_model_version(version, previous=None):
+    """Mark version as served by this worker, and previous as no longer served"""
+    if previous is not None and previous != version:
+        MODEL_INFO.labels(previous).set(0)
+    if version is not None:
+        MODEL_INFO.labels(version).set(1)
+
+
+def render_metrics():
+    """
+    (body, content_type) in Prometheus text format, aggregated over all
+    workers when running multi-process
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
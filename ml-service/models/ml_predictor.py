@@ -3,13 +3,215 @@ ML Predictor using trained Random Forest model
 Loads model from disk and provides predictions with feature importance
 """
 
-import joblib
 import numpy as np
 import json
 import os
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import roc_auc_score, classification_report, accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
+import time
+from datetime import datetime, timedelta, timezone
+from models.feature_schema import FEATURE_COLUMNS, FEATURE_SCHEMA, validate_training_frame
+from models.metrics import time_stage
+from models.model_registry import (
+    METRIC_KEYS,
+    is_artifact,
+    load_fitted_model,
+    load_forest_arrays,
+    metadata_path_for,
+    new_model_version,
+    normalize_metadata,
+    publish_model,
+    read_metadata
+)
+
+# sklearn, pandas and joblib are imported inside the functions that use
+# them (training, evaluation, the sklearn engine's predict_proba, saving), so
+# importing this module to serve with the compiled engine pays for none of
+# them. Only NumPy is needed to load and score a compiled forest.
+
+# Random Forest settings shared by every training path. generate_and_train.py
+# --tune searches for better ones and records the winner in the metadata.
+DEFAULT_HYPERPARAMETERS = {
+    'n_estimators': 100,
+    'max_depth': 10,
+    'min_samples_split': 10,
+    'min_samples_leaf': 5,
+    'max_features': 'sqrt'
+}
+
+
+def build_model(hyperparameters=None):
+    """Unfitted RandomForestClassifier; fits on all cores"""
+    from sklearn.ensemble import RandomForestClassifier
+    
+    return RandomForestClassifier(
+        **(hyperparameters or DEFAULT_HYPERPARAMETERS),
+        random_state=42,
+        class_weight='balanced',  # Handle class imbalance
+        n_jobs=-1
+    )
+
+
+class CompiledForest:
+    """
+    Array-based evaluator for a fitted RandomForestClassifier
+    Flattens every tree into contiguous NumPy arrays and walks all trees
+    at once, skipping sklearn's per-call validation overhead
+    """
+    
+    def __init__(self, model):
+        """Compile the trees of a fitted forest into flat node arrays"""
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        positive_class = list(model.classes_).index(1)
+        
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        self.roots = offsets[:-1].astype(np.intp)
+        self.max_depth = max(tree.max_depth for tree in trees)
+        
+        self.n_features = model.n_features_in_
+        
+        features, thresholds, left, right, node_values = [], [], [], [], []
+        for tree, offset in zip(trees, offsets):
+            node_ids = np.arange(tree.node_count, dtype=np.intp) + offset
+            is_leaf = tree.children_left == -1
+            
+            # Leaves point back to themselves so a fixed-depth walk stays put
+            left.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            right.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            
+            # Dropout fraction at every node (not just leaves), which also
+            # drives path contributions. Normalize per node: older sklearn
+            # stores weighted counts here
+            value = tree.value[:, 0, :]
+            node_values.append(value[:, positive_class] / value.sum(axis=1))
+        
+        self.feature = np.ascontiguousarray(np.concatenate(features), dtype=np.intp)
+        self.threshold = np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64)
+        self.children_left = np.ascontiguousarray(np.concatenate(left), dtype=np.intp)
+        self.children_right = np.ascontiguousarray(np.concatenate(right), dtype=np.intp)
+        self.node_value = np.ascontiguousarray(np.concatenate(node_values), dtype=np.float64)
+        
+        # Interleaved (right, left) children so one gather picks the next
+        # node: children[2 * node + went_left]
+        self._interleave_children()
+    
+    def to_arrays(self):
+        """
+        Compact arrays for a registry artifact (see from_arrays)
+        
+        Thresholds are stored as float32, rounded down: rows are compared as
+        float32, and for a float32 x, x <= t exactly when x <= the largest
+        float32 not above t, so every split still goes the same way.
+        """
+        threshold = self.threshold.astype(np.float32)
+        rounded_up = threshold.astype(np.float64) > self.threshold
+        threshold[rounded_up] = np.nextafter(threshold[rounded_up], np.float32(-np.inf))
+        
+        return {
+            'roots': self.roots.astype(np.int32),
+            'feature': self.feature.astype(np.min_scalar_type(max(self.n_features - 1, 0))),
+            'threshold': threshold,
+            'children_left': self.children_left.astype(np.int32),
+            'children_right': self.children_right.astype(np.int32),
+            'node_value': self.node_value,
+            'max_depth': np.int32(self.max_depth),
+            'n_features': np.int32(self.n_features)
+        }
+    
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild a CompiledForest from to_arrays() output without sklearn"""
+        forest = cls.__new__(cls)
+        forest.roots = arrays['roots'].astype(np.intp)
+        forest.max_depth = int(arrays['max_depth'])
+        forest.n_features = int(arrays['n_features'])
+        forest.feature = np.ascontiguousarray(arrays['feature'], dtype=np.intp)
+        forest.threshold = np.ascontiguousarray(arrays['threshold'], dtype=np.float64)
+        forest.children_left = np.ascontiguousarray(arrays['children_left'], dtype=np.intp)
+        forest.children_right = np.ascontiguousarray(arrays['children_right'], dtype=np.intp)
+        forest.node_value = np.ascontiguousarray(arrays['node_value'], dtype=np.float64)
+        forest._interleave_children()
+        return forest
+    
+    def _interleave_children(self):
+        self.children = np.ascontiguousarray(
+            np.stack([self.children_right, self.children_left], axis=1).ravel()
+        )
+    
+    def predict_proba(self, X):
+        """
+        Probability of the positive class (dropout) for each row of X
+        
+        Args:
+            X: 2D array of shape (n_rows, n_features) in training column order
+        
+        Returns:
+            1D array of dropout probabilities, same as predict_proba(X)[:, 1]
+        """
+        X, row_offsets = self._prepare(X)
+        nodes = np.broadcast_to(self.roots, (X.shape[0] // self.n_features, len(self.roots)))
+        
+        for _ in range(self.max_depth):
+            nodes = self._step(X, row_offsets, nodes)
+        
+        return self.node_value[nodes].mean(axis=1)
+    
+    def predict_contributions(self, X):
+        """
+        Per-row feature contributions from each tree's decision path
+        
+        Every split a row passes through moves the dropout fraction from the
+        parent node to the child; that change is credited to the split
+        feature and averaged over trees. For each row,
+        bias + contributions.sum() equals the predicted probability.
+        
+        Args:
+            X: 2D array of shape (n_rows, n_features) in training column order
+        
+        Returns:
+            Tuple (probabilities, bias, contributions) where contributions
+            has shape (n_rows, n_features)
+        """
+        X, row_offsets = self._prepare(X)
+        n_rows, n_trees = X.shape[0] // self.n_features, len(self.roots)
+        nodes = np.broadcast_to(self.roots, (n_rows, n_trees))
+        
+        # Flat (row, feature) slots so each depth level is one bincount
+        # instead of a Python loop over rows or trees
+        contributions = np.zeros(n_rows * self.n_features, dtype=np.float64)
+        
+        for _ in range(self.max_depth):
+            children = self._step(X, row_offsets, nodes)
+            # Leaves point to themselves, so finished paths add zero
+            delta = self.node_value[children] - self.node_value[nodes]
+            contributions += np.bincount(
+                (row_offsets + self.feature[nodes]).ravel(),
+                weights=delta.ravel(),
+                minlength=contributions.size
+            )
+            nodes = children
+        
+        bias = self.node_value[self.roots].mean()
+        return (
+            self.node_value[nodes].mean(axis=1),
+            bias,
+            contributions.reshape(n_rows, self.n_features) / n_trees
+        )
+    
+    def _prepare(self, X):
+        """
+        Flatten X row-major and return it with each row's start offset
+        sklearn compares features as float32 against float64 thresholds
+        """
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        row_offsets = (np.arange(X.shape[0]) * self.n_features)[:, None]
+        return X.ravel(), row_offsets
+    
+    def _step(self, X, row_offsets, nodes):
+        """Advance every (row, tree) node one level down its tree"""
+        went_left = X.take(row_offsets + self.feature.take(nodes)) <= self.threshold.take(nodes)
+        return self.children.take(2 * nodes + went_left)
+
 
 class MLPredictor:
     """
@@ -17,37 +219,59 @@ class MLPredictor:
     Provides predictions and feature importance
     """
     
-    def __init__(self, model_path='models/dropout_model.pkl'):
-        """Load trained model from disk"""
+    def __init__(self, model_path='models/dropout_model.pkl', engine='sklearn',
+                 metadata_path=None):
+        """
+        Load trained model from disk
+        
+        Args:
+            model_path: A registry version directory, or a pickled model file
+            engine: 'sklearn' to score with the model's own predict_proba,
+                    'compiled' to score with the array-based CompiledForest
+            metadata_path: Path to the model's metadata JSON (defaults to
+                           model_metadata.json in or next to model_path)
+        """
+        if engine not in ('sklearn', 'compiled'):
+            raise ValueError(f"Unknown inference engine: {engine}")
+        
         if not os.path.exists(model_path):
             raise FileNotFoundError(
                 f"Model file not found: {model_path}\n"
                 "Please run 'python generate_and_train.py' first"
             )
         
-        self.model = joblib.load(model_path)
+        self.model_path = model_path
+        self.engine = engine
+        self.metadata = read_metadata(metadata_path or metadata_path_for(model_path))
+        self._feature_importance = None
         
-        # Load metadata if available
-        metadata_path = 'models/model_metadata.json'
-        if os.path.exists(metadata_path):
-            with open(metadata_path, 'r') as f:
-                self.metadata = json.load(f)
-        else:
-            self.metadata = {}
+        # The compiled engine reads only forest.npz from an artifact; the
+        # sklearn checkpoint is unpickled when something needs the model
+        self._model = None
+        self._importances = None
+        self._path_forest = None
+        if engine == 'sklearn' or not is_artifact(model_path):
+            self._model = load_fitted_model(model_path, self.metadata)
+        if engine == 'compiled':
+            self._path_forest = self._get_path_forest()
+        self.compiled_forest = self._path_forest
+        
+        # Identifies this model in caches; falls back to the file's mtime
+        # when metadata predates versioning
+        self.model_version = self.metadata.get(
+            'model_version',
+            f"mtime-{int(os.path.getmtime(model_path))}"
+        )
         
         # Define feature columns (must match training data)
-        self.feature_columns = [
-            'attendance_rate',
-            'avg_marks_percentage',
-            'behavior_score',
-            'days_tracked',
-            'exams_completed',
-            'days_present',
-            'days_absent',
-            'total_incidents',
-            'positive_incidents',
-            'negative_incidents'
-        ]
+        self.feature_columns = list(FEATURE_COLUMNS)
+    
+    @property
+    def model(self):
+        """The fitted sklearn forest, unpickled on first use for compiled artifacts"""
+        if self._model is None:
+            self._model = load_fitted_model(self.model_path, self.metadata)
+        return self._model
     
     def predict(self, features):
         """
@@ -57,22 +281,20 @@ class MLPredictor:
             features: Dict with student features
         
         Returns:
-            Dict with risk_score, risk_level, and feature_importance
-        """
-        import pandas as pd
+            Dict with risk_score, risk_level, feature_importance (global) and
+            feature_contributions (this student's decision paths)
         
-        # Extract features in correct order
-        feature_values = []
-        for col in self.feature_columns:
-            value = features.get(col, 0)
-            feature_values.append(value)
-        
-        # Convert to pandas DataFrame with proper column names to avoid sklearn warning
-        X = pd.DataFrame([feature_values], columns=self.feature_columns)
+        Raises:
+            ValueError: The features fail FEATURE_SCHEMA validation
+        """
+        X, invalid, errors = FEATURE_SCHEMA.extract_rows([features])
+        if invalid[0]:
+            raise ValueError(errors[0])
         
-        # Get prediction probability
-        proba = self.model.predict_proba(X)[0]
-        risk_score = proba[1]  # Probability of dropout (class 1)
+        # Get prediction probability of dropout (class 1)
+        with time_stage('predict_proba'):
+            risk_scores, contributions = self._score(X, with_contributions=True)
+        risk_score = risk_scores[0]
         
         # Classify risk level
         risk_level = self._classify_risk(risk_score)
@@ -84,9 +306,191 @@ class MLPredictor:
             'risk_score': round(float(risk_score), 3),
             'risk_level': risk_level,
             'feature_importance': feature_importance,
+            'feature_contributions': self._contributions_dict(contributions[0]),
             'model_type': 'RandomForestClassifier'
         }
     
+    def predict_many(self, features_list, include_contributions=False, top_n=3):
+        """
+        Predict dropout risk for many students with a single model call
+        
+        Args:
+            features_list: List of dicts with student features
+            include_contributions: Also return per-student feature_contributions
+                                   and top_factors (top_n risk-increasing features)
+            top_n: Number of top factors per student
+        
+        Returns:
+            List aligned with features_list. Each entry has the same shape as
+            predict() (without contributions unless requested), or
+            {'error': reason} if that row failed FEATURE_SCHEMA validation.
+        """
+        n_rows = len(features_list)
+        with time_stage('feature_extraction'):
+            X, invalid, errors = FEATURE_SCHEMA.extract_rows(features_list)
+        valid = ~invalid
+        
+        risk_scores = np.zeros(n_rows, dtype=np.float64)
+        contributions = np.zeros(X.shape, dtype=np.float64)
+        if valid.any():
+            with time_stage('predict_proba'):
+                risk_scores[valid], valid_contributions = self._score(
+                    X[valid],
+                    with_contributions=include_contributions
+                )
+            if include_contributions:
+                contributions[valid] = valid_contributions
+        
+        risk_levels = self._classify_risk_many(risk_scores)
+        feature_importance = self._get_feature_importance()
+        
+        if include_contributions:
+            # Rank features per row in one argsort; largest risk increase first
+            top_indices = np.argsort(-contributions, axis=1, kind='stable')[:, :top_n]
+        
+        results = []
+        for i in range(n_rows):
+            if not valid[i]:
+                results.append({'error': errors[i]})
+                continue
+            result = {
+                'risk_score': round(float(risk_scores[i]), 3),
+                'risk_level': risk_levels[i],
+                'feature_importance': feature_importance,
+                'model_type': 'RandomForestClassifier'
+            }
+            if include_contributions:
+                result['feature_contributions'] = self._contributions_dict(contributions[i])
+                result['top_factors'] = [
+                    {
+                        'feature': self.feature_columns[j],
+                        'contribution': round(float(contributions[i, j]), 4)
+                    }
+                    for j in top_indices[i]
+                ]
+            results.append(result)
+        
+        return results
+    
+    def predict_columns(self, columns, n_rows, include_contributions=False, top_n=3):
+        """
+        predict_many for a columnar batch: one array-like of values per
+        feature column, without a dict per student
+        
+        Args:
+            columns: Mapping of feature name to n_rows values; a missing
+                     column takes its schema default, like a missing key in
+                     predict_many
+            n_rows: Number of students
+            include_contributions: Also return contributions and top_factors
+            top_n: Number of top factors per student
+        
+        Returns:
+            Dict of per-row arrays: 'risk_score' (NaN where the row could not
+            be scored), 'risk_level' and 'error' (None where it could), plus
+            'contributions' (n_rows x n_features) and 'top_factors' if requested
+        """
+        with time_stage('feature_extraction'):
+            X, invalid, errors = FEATURE_SCHEMA.extract_columns(columns, n_rows)
+        valid = ~invalid
+        
+        risk_scores = np.full(n_rows, np.nan)
+        contributions = np.zeros(X.shape, dtype=np.float64)
+        if valid.any():
+            with time_stage('predict_proba'):
+                risk_scores[valid], valid_contributions = self._score(
+                    X[valid],
+                    with_contributions=include_contributions
+                )
+            if include_contributions:
+                contributions[valid] = valid_contributions
+        
+        risk_levels = self._classify_risk_many(risk_scores)
+        result = {
+            'risk_score': np.round(risk_scores, 3),
+            'risk_level': [level if ok else None for level, ok in zip(risk_levels, valid)],
+            'error': errors
+        }
+        if include_contributions:
+            top_indices = np.argsort(-contributions, axis=1, kind='stable')[:, :top_n]
+            result['contributions'] = contributions
+            result['top_factors'] = [
+                [
+                    {
+                        'feature': self.feature_columns[j],
+                        'contribution': round(float(contributions[i, j]), 4)
+                    }
+                    for j in top_indices[i]
+                ] if valid[i] else None
+                for i in range(n_rows)
+            ]
+        return result
+    
+    def risk_scores(self, features_list):
+        """
+        Dropout probabilities for many students, NaN for rows that can't be
+        scored. Not timed as request stages; used for shadow comparisons.
+        """
+        X, invalid, _ = FEATURE_SCHEMA.extract_rows(features_list)
+        valid = ~invalid
+        scores = np.full(len(features_list), np.nan)
+        if valid.any():
+            scores[valid] = self._predict_proba(X[valid])
+        return scores
+    
+    def get_feature_contributions(self, X):
+        """
+        Per-student feature contributions for a 2D feature array
+        
+        Returns:
+            Tuple (bias, contributions) where contributions has shape
+            (n_rows, n_features); bias + row sum is the dropout probability
+        """
+        _, bias, contributions = self._get_path_forest().predict_contributions(X)
+        return bias, contributions
+    
+    def _score(self, X, with_contributions=False):
+        """
+        Dropout probabilities and, if requested, path contributions
+        The path walk that yields the contributions also ends at each tree's
+        leaf, so its probabilities are used for every engine rather than
+        scoring the rows a second time (they match sklearn's to ~1e-15).
+        """
+        if not with_contributions:
+            return self._predict_proba(X), None
+        
+        proba, _, contributions = self._get_path_forest().predict_contributions(X)
+        return proba, contributions
+    
+    def _get_path_forest(self):
+        """CompiledForest used for path contributions, compiled on first use"""
+        if self._path_forest is None:
+            if is_artifact(self.model_path):
+                arrays = load_forest_arrays(self.model_path, self.metadata)
+                self._importances = arrays['feature_importances']
+                self._path_forest = CompiledForest.from_arrays(arrays)
+            else:
+                self._path_forest = CompiledForest(self.model)
+        return self._path_forest
+    
+    def _contributions_dict(self, contributions):
+        """Map one row of contributions to {feature: rounded contribution}"""
+        return {
+            feature: round(float(value), 4)
+            for feature, value in zip(self.feature_columns, contributions)
+        }
+    
+    def _predict_proba(self, X):
+        """Dropout probability for each row of a 2D feature array"""
+        if self.compiled_forest is not None:
+            return self.compiled_forest.predict_proba(X)
+        
+        import pandas as pd
+        
+        # Convert to pandas DataFrame with proper column names to avoid sklearn warning
+        X = pd.DataFrame(X, columns=self.feature_columns)
+        return self.model.predict_proba(X)[:, 1]
+    
     def _classify_risk(self, risk_score):
         """Classify risk score into categorical level"""
         if risk_score < 0.3:
@@ -98,19 +502,59 @@ class MLPredictor:
         else:
             return 'critical'
     
+    def _classify_risk_many(self, risk_scores):
+        """Vectorized _classify_risk over an array of risk scores"""
+        levels = np.array(['low', 'medium', 'high', 'critical'])
+        return levels[np.digitize(risk_scores, [0.3, 0.6, 0.8])].tolist()
+    
     def _get_feature_importance(self):
         """
         Get feature importance from the trained model
         Returns dict mapping feature names to importance scores
         """
-        importances = self.model.feature_importances_
+        # sklearn recomputes feature_importances_ over every tree on each
+        # access, so compute the rounded dict once per loaded model
+        if self._feature_importance is None:
+            importances = self._importances if self._importances is not None else self.model.feature_importances_
+            
+            # Create dict of feature: importance
+            feature_importance = {}
+            for feature, importance in zip(self.feature_columns, importances):
+                feature_importance[feature] = round(float(importance), 4)
+            self._feature_importance = feature_importance
+        
+        return dict(self._feature_importance)
+    
+    def warm_up(self, n_rows=64):
+        """
+        Run throwaway predictions so the first real request doesn't pay for
+        building the path forest and feature importance cache
         
-        # Create dict of feature: importance
-        feature_importance = {}
-        for feature, importance in zip(self.feature_columns, importances):
-            feature_importance[feature] = round(float(importance), 4)
+        Returns:
+            Seconds spent warming up
+        """
+        start = time.perf_counter()
         
-        return feature_importance
+        # Random rows that pass FEATURE_SCHEMA, so every one is scored
+        rng = np.random.default_rng(0)
+        days_present, days_absent, positive, negative = rng.integers(0, 50, (4, n_rows))
+        columns = {
+            'attendance_rate': rng.uniform(0, 1, n_rows),
+            'avg_marks_percentage': rng.uniform(0, 100, n_rows),
+            'behavior_score': rng.uniform(0, 100, n_rows),
+            'days_tracked': days_present + days_absent,
+            'exams_completed': rng.integers(0, 10, n_rows),
+            'days_present': days_present,
+            'days_absent': days_absent,
+            'total_incidents': positive + negative,
+            'positive_incidents': positive,
+            'negative_incidents': negative
+        }
+        rows = [{name: columns[name][i].item() for name in self.feature_columns} for i in range(n_rows)]
+        self.predict(rows[0])
+        self.predict_many(rows, include_contributions=True)
+        
+        return time.perf_counter() - start
     
     def get_top_features(self, n=5):
         """Get top N most important features"""
@@ -123,32 +567,28 @@ class MLPredictor:
         return sorted_features[:n]
 
 
-def train_new_model(df, model_path='models/dropout_model.pkl'):
+def train_new_model(df, model_path='models/dropout_model.pkl', registry_dir=None,
+                    hyperparameters=None, shadow=False):
     """
     Train a new Random Forest model on provided data
     Used by the /retrain endpoint
     
     Args:
-        df: pandas DataFrame with training data
+        df: pandas DataFrame with training data; rows failing TRAINING_SCHEMA
+            validation are left out
         model_path: Path to save the trained model
+        registry_dir: If set, also publish the model as a new registry version
+                      so every running worker switches to it
+        hyperparameters: Random Forest settings (default DEFAULT_HYPERPARAMETERS)
+        shadow: Publish as the registry's shadow candidate instead of CURRENT
     
     Returns:
-        Dict with training metrics
+        Dict with training metrics and model_version
     """
-    feature_columns = [
-        'attendance_rate',
-        'avg_marks_percentage',
-        'behavior_score',
-        'days_tracked',
-        'exams_completed',
-        'days_present',
-        'days_absent',
-        'total_incidents',
-        'positive_incidents',
-        'negative_incidents'
-    ]
-    
-    X = df[feature_columns]
+    from sklearn.model_selection import train_test_split
+    
+    df, rejected = validate_training_frame(df)
+    X = df[FEATURE_COLUMNS]
     y = df['dropped_out']
     
     # Split data
@@ -157,75 +597,238 @@ def train_new_model(df, model_path='models/dropout_model.pkl'):
     )
     
     # Train model
-    model = RandomForestClassifier(
-        n_estimators=100,
-        max_depth=10,
-        min_samples_split=10,
-        min_samples_leaf=5,
-        random_state=42,
-        class_weight='balanced'
+    hyperparameters = hyperparameters or DEFAULT_HYPERPARAMETERS
+    model = build_model(hyperparameters)
+    model.fit(X_train, y_train)
+    
+    # Every tree saw the whole dataset
+    window = data_window(df)
+    metadata = dict(
+        _evaluate(model, X_test, y_test),
+        training_mode='full',
+        data_source='retrain_request',
+        hyperparameters=hyperparameters,
+        total_samples=len(df),
+        rejected_samples=len(rejected),
+        training_samples=len(X_train),
+        test_samples=len(X_test),
+        dropout_rate=float(y.mean()),
+        tree_windows=[window] * len(model.estimators_)
+    )
+    
+    return retrain_result(save_trained_model(model, metadata, model_path, registry_dir, shadow))
+
+
+def update_model_incrementally(df, base_model_path, model_path='models/dropout_model.pkl',
+                               registry_dir=None, n_new_trees=20, max_trees=100,
+                               max_tree_age_days=180, shadow=False):
+    """
+    Grow the current forest with trees fitted on recent data instead of
+    refitting all of them
+    
+    New trees are added with warm_start on df only. Trees whose data window
+    ended more than max_tree_age_days ago are retired, then the oldest
+    trees are dropped until at most max_trees remain.
+    
+    Args:
+        df: Recent training data (new outcomes plus current active students);
+            rows failing TRAINING_SCHEMA validation are left out
+        base_model_path: Model to grow (registry version directory or model
+                         file); its metadata gives the existing trees' windows
+        model_path: Path to save the updated model
+        registry_dir: If set, also publish the model as a new registry version
+        n_new_trees: Trees fitted on df
+        max_trees: Forest size cap after the update
+        max_tree_age_days: Retire trees whose data is older than this
+        shadow: Publish as the registry's shadow candidate instead of CURRENT
+    
+    Returns:
+        Dict with the same metrics as train_new_model (evaluated on a
+        held-out split of df) plus trees_added, trees_retired and n_estimators
+    """
+    from sklearn.model_selection import train_test_split
+    from sklearn.utils.class_weight import compute_class_weight
+    
+    df, rejected = validate_training_frame(df)
+    y = df['dropped_out']
+    if y.nunique() < 2:
+        raise ValueError("Incremental update needs both dropout outcomes in the new data")
+    
+    base_metadata = read_metadata(metadata_path_for(base_model_path))
+    model = load_fitted_model(base_model_path, base_metadata)
+    
+    # Models trained before windows were recorded: treat every tree as
+    # having seen data up to the model's training date
+    tree_windows = base_metadata.get('tree_windows')
+    if not tree_windows or len(tree_windows) != len(model.estimators_):
+        trained_at = base_metadata.get('training_date', datetime.now(timezone.utc).isoformat())
+        tree_windows = [{'start': trained_at, 'end': trained_at, 'samples': None}] * len(model.estimators_)
+    
+    X_train, X_test, y_train, y_test = train_test_split(
+        df[FEATURE_COLUMNS], y, test_size=0.2, random_state=42, stratify=y
     )
     
+    # warm_start fits only the trees beyond the existing ones, on X_train.
+    # 'balanced' class weights are resolved on the new data up front, as
+    # sklearn asks for with warm_start.
+    n_existing = len(model.estimators_)
+    class_weight = model.class_weight
+    if class_weight == 'balanced':
+        weights = compute_class_weight('balanced', classes=model.classes_, y=y_train)
+        model.set_params(class_weight=dict(zip(model.classes_.tolist(), weights)))
+    model.set_params(warm_start=True, n_estimators=n_existing + n_new_trees, n_jobs=-1)
     model.fit(X_train, y_train)
+    model.set_params(class_weight=class_weight)
+    tree_windows = list(tree_windows) + [data_window(df)] * n_new_trees
     
-    # Evaluate
-    y_pred = model.predict(X_test)
-    y_pred_proba = model.predict_proba(X_test)[:, 1]
+    # Retire stale trees first, then the oldest beyond max_trees; the trees
+    # just fitted are never retired
+    cutoff = datetime.now(timezone.utc) - timedelta(days=max_tree_age_days)
+    keep = [i for i in range(n_existing) if parse_window_time(tree_windows[i]['end']) >= cutoff]
+    keep = keep[max(0, len(keep) - max(0, max_trees - n_new_trees)):]
+    keep += list(range(n_existing, n_existing + n_new_trees))
     
-    # Calculate metrics
-    accuracy = accuracy_score(y_test, y_pred)
-    precision = precision_score(y_test, y_pred, zero_division=0)
-    recall = recall_score(y_test, y_pred, zero_division=0)
-    f1 = f1_score(y_test, y_pred, zero_division=0)
-    roc_auc = roc_auc_score(y_test, y_pred_proba)
+    trees_retired = len(model.estimators_) - len(keep)
+    model.estimators_ = [model.estimators_[i] for i in keep]
+    tree_windows = [tree_windows[i] for i in keep]
+    model.set_params(warm_start=False, n_estimators=len(model.estimators_))
     
-    # Confusion matrix
-    tn, fp, fn, tp = confusion_matrix(y_test, y_pred).ravel()
+    metadata = dict(
+        _evaluate(model, X_test, y_test),
+        training_mode='incremental',
+        data_source='retrain_request',
+        base_model_version=base_metadata.get('model_version'),
+        hyperparameters=base_metadata.get('hyperparameters'),
+        trees_added=n_new_trees,
+        trees_retired=trees_retired,
+        training_samples=len(X_train),
+        test_samples=len(X_test),
+        total_samples=len(df),
+        rejected_samples=len(rejected),
+        dropout_rate=float(y.mean()),
+        tree_windows=tree_windows
+    )
     
-    # Feature importance
-    feature_importance = dict(zip(feature_columns, model.feature_importances_))
+    result = retrain_result(save_trained_model(model, metadata, model_path, registry_dir, shadow))
+    result.update(
+        trees_added=n_new_trees,
+        trees_retired=trees_retired,
+        n_estimators=len(model.estimators_)
+    )
+    return result
+
+
+def data_window(df, date_column='dropout_date'):
+    """
+    Span of the data a tree was fitted on: the range of df's dropout dates,
+    ending now since active students' rows are current. Both ends are UTC.
+    """
+    import pandas as pd
     
-    # Save model
-    joblib.dump(model, model_path)
+    now = datetime.now(timezone.utc).isoformat()
+    start = now
+    if date_column in df:
+        dates = pd.to_datetime(df[date_column], errors='coerce', utc=True).dropna()
+        if len(dates):
+            start = dates.min().to_pydatetime().isoformat()
+    return {'start': start, 'end': now, 'samples': len(df)}
+
+
+def parse_window_time(value):
+    """
+    Timezone-aware datetime for a tree window bound or training date.
+    Metadata written before timestamps carried an offset used local time.
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.astimezone()
+    return parsed.astimezone(timezone.utc)
+
+
+def _evaluate(model, X_test, y_test):
+    """Held-out metrics stored in metadata and returned to /retrain callers"""
+    from sklearn.metrics import (
+        accuracy_score,
+        confusion_matrix,
+        f1_score,
+        precision_score,
+        recall_score,
+        roc_auc_score
+    )
     
-    # Save metadata
-    metadata = {
-        'feature_columns': feature_columns,
-        'n_estimators': model.n_estimators,
-        'training_samples': len(X_train),
-        'test_samples': len(X_test),
-        'dropout_rate': float(y.mean()),
-        'accuracy': float(accuracy),
-        'precision': float(precision),
-        'recall': float(recall),
-        'f1_score': float(f1),
-        'roc_auc': float(roc_auc),
-        'confusion_matrix': {
-            'tn': int(tn),
-            'fp': int(fp),
-            'fn': int(fn),
-            'tp': int(tp)
-        },
-        'feature_importance': {k: float(v) for k, v in feature_importance.items()}
-    }
+    y_pred = model.predict(X_test)
+    y_pred_proba = model.predict_proba(X_test)[:, 1]
     
-    with open('models/model_metadata.json', 'w') as f:
-        json.dump(metadata, f, indent=2)
+    # Confusion matrix
+    tn, fp, fn, tp = confusion_matrix(y_test, y_pred, labels=[0, 1]).ravel()
     
     return {
-        'accuracy': float(accuracy),
-        'precision': float(precision),
-        'recall': float(recall),
-        'f1_score': float(f1),
-        'roc_auc': float(roc_auc),
+        'accuracy': float(accuracy_score(y_test, y_pred)),
+        'precision': float(precision_score(y_test, y_pred, zero_division=0)),
+        'recall': float(recall_score(y_test, y_pred, zero_division=0)),
+        'f1_score': float(f1_score(y_test, y_pred, zero_division=0)),
+        'roc_auc': float(roc_auc_score(y_test, y_pred_proba)),
         'confusion_matrix': {
             'tn': int(tn),
             'fp': int(fp),
             'fn': int(fn),
             'tp': int(tp)
         },
-        'feature_importance': {k: float(v) for k, v in feature_importance.items()},
-        'training_samples': len(X_train),
-        'test_samples': len(X_test),
-        'dropout_rate': float(y.mean())
+        'feature_importance': {
+            k: float(v) for k, v in zip(FEATURE_COLUMNS, model.feature_importances_)
+        }
     }
+
+
+def save_trained_model(model, metadata, model_path, registry_dir, shadow=False):
+    """
+    Save model and metadata, and publish them to the registry if requested
+    Every training path (generate_and_train.py, /retrain, incremental
+    updates) saves through here, so they all write the same metadata schema.
+    
+    Args:
+        model: Fitted forest
+        metadata: Training metadata (metrics, samples, windows, ...)
+        model_path: Where to pickle the model for services without a registry
+        registry_dir: If set, also publish the model as a new registry version
+        shadow: Publish it as the shadow candidate rather than CURRENT. The
+                model_path copy is then left alone, since it is what a
+                service without a registry serves.
+    
+    Returns:
+        The metadata as saved, including model_version
+    """
+    # Trees are fitted in parallel, but serving scores one request per
+    # thread; parallel predict_proba only adds overhead there
+    import joblib
+    
+    model.set_params(n_jobs=None)
+    
+    metadata = normalize_metadata(dict(
+        metadata,
+        model_version=new_model_version(),
+        training_date=datetime.now(timezone.utc).isoformat(),
+        feature_columns=FEATURE_COLUMNS,
+        n_estimators=len(model.estimators_)
+    ))
+    
+    if registry_dir:
+        metadata = publish_model(model, metadata, registry_dir, shadow=shadow)
+    if registry_dir and shadow:
+        return metadata
+    
+    joblib.dump(model, model_path)
+    # Metadata sits next to the model (models/model_metadata.json by default)
+    with open(metadata_path_for(model_path), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    
+    return metadata
+
+
+def retrain_result(metadata):
+    """The /retrain response fields of saved metadata (without the per-tree windows)"""
+    result = {'model_version': metadata['model_version']}
+    for key in METRIC_KEYS + ('confusion_matrix', 'feature_importance', 'training_samples',
+                              'test_samples', 'dropout_rate'):
+        result[key] = metadata[key]
+    return result
@@ -0,0 +1,477 @@
+"""
+Versioned model registry on disk
+Each trained model is published to models/registry/<version>/ and a CURRENT
+pointer file names the version every worker should serve. Both the version
+directory and the pointer are written atomically, so a reader never sees a
+half-written model. A model can instead be published as the SHADOW
+candidate, scored alongside CURRENT on live traffic until it is promoted.
+Every version CURRENT has named is appended to CURRENT_HISTORY, so a
+rollback only ever returns to a version that was actually served.
+
+A version directory holds:
+    forest.npz           - the trees as compressed flat arrays, all serving needs
+    model.joblib         - the uncompressed sklearn forest, for the sklearn
+                           engine and incremental retraining
+    model_metadata.json  - metadata in the schema below, with each file's
+                           SHA-256 and a content hash over both
+Versions published before this format hold dropout_model.pkl instead.
+
+Run `python -m models.model_registry --help` to list, verify, promote or roll
+back versions.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+REGISTRY_DIR = 'models/registry'
+CURRENT_POINTER = 'CURRENT'
+SHADOW_POINTER = 'SHADOW'
+CURRENT_HISTORY = 'CURRENT_HISTORY'
+FOREST_FILENAME = 'forest.npz'
+CHECKPOINT_FILENAME = 'model.joblib'
+METADATA_FILENAME = 'model_metadata.json'
+# model.joblib is left uncompressed: it loads as fast as a plain pickle,
+# where zlib cost the sklearn engine about half again. Older versions
+# written compressed still load.
+CHECKPOINT_COMPRESS = 0
+# Single pickled model, as written before the compact format (and still
+# written to models/dropout_model.pkl as the no-registry fallback)
+MODEL_FILENAME = 'dropout_model.pkl'
+
+ARTIFACT_FORMAT = 'compact-forest'
+ARTIFACT_FORMAT_VERSION = 1
+
+# Metadata schema shared by every training path:
+#   schema_version, model_version, training_date, training_mode, data_source,
+#   feature_columns, hyperparameters, n_estimators, training_samples,
+#   test_samples, total_samples, dropout_rate, accuracy, precision, recall,
+#   f1_score, roc_auc, confusion_matrix {tn, fp, fn, tp},
+#   feature_importance {feature: importance}, tree_windows, artifact,
+#   and optionally tuning, base_model_version, trees_added, trees_retired,
+#   rejected_samples (rows left out for failing the feature schema)
+METADATA_SCHEMA_VERSION = 2
+METRIC_KEYS = ('accuracy', 'precision', 'recall', 'f1_score', 'roc_auc')
+_CONFUSION_MATRIX_KEYS = {
+    'true_negatives': 'tn',
+    'false_positives': 'fp',
+    'false_negatives': 'fn',
+    'true_positives': 'tp'
+}
+
+
+def new_model_version() -> str:
+    """Timestamped version name, unique to the microsecond"""
+    return f'v{datetime.now().strftime("%Y%m%d_%H%M%S_%f")}'
+
+
+def publish_model(model, metadata: Dict, registry_dir: str = REGISTRY_DIR, shadow: bool = False) -> Dict:
+    """
+    Write a model and its metadata as a new registry version and make it current
+    
+    Args:
+        model: Fitted RandomForestClassifier
+        metadata: Metadata dict; its 'model_version' is used if present and unused
+        registry_dir: Registry root directory
+        shadow: Make it the SHADOW candidate instead; CURRENT is unchanged
+    
+    Returns:
+        The metadata as written, with the published model_version and the
+        artifact's file hashes
+    """
+    os.makedirs(registry_dir, exist_ok=True)
+    
+    version = metadata.get('model_version') or new_model_version()
+    if os.path.exists(os.path.join(registry_dir, version)):
+        version = new_model_version()
+    metadata = dict(metadata, model_version=version)
+    
+    # Build the version in a temp dir on the same filesystem, then rename it
+    # into place in one step
+    staging_dir = tempfile.mkdtemp(prefix=f'.staging-{version}-', dir=registry_dir)
+    try:
+        metadata = write_artifact(model, metadata, staging_dir)
+        os.rename(staging_dir, os.path.join(registry_dir, version))
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    
+    if shadow:
+        set_shadow_version(version, registry_dir)
+    else:
+        set_current_version(version, registry_dir)
+    return metadata
+
+
+def write_artifact(model, metadata: Dict, directory: str, compress: int = CHECKPOINT_COMPRESS) -> Dict:
+    """
+    Write forest.npz, model.joblib and model_metadata.json to directory
+    
+    Args:
+        compress: joblib compression level for model.joblib
+    
+    Returns:
+        The metadata as written (normalized, with the 'artifact' section)
+    """
+    # Imported here: only publishers need them, and the app imports this
+    # module at boot
+    import joblib
+    from models.ml_predictor import CompiledForest
+    
+    arrays = CompiledForest(model).to_arrays()
+    arrays['feature_importances'] = np.asarray(model.feature_importances_, dtype=np.float64)
+    np.savez_compressed(os.path.join(directory, FOREST_FILENAME), **arrays)
+    joblib.dump(model, os.path.join(directory, CHECKPOINT_FILENAME), compress=compress)
+    
+    files = {}
+    for name in (FOREST_FILENAME, CHECKPOINT_FILENAME):
+        path = os.path.join(directory, name)
+        files[name] = {'sha256': _file_sha256(path), 'bytes': os.path.getsize(path)}
+    
+    metadata = dict(
+        normalize_metadata(metadata),
+        artifact={
+            'format': ARTIFACT_FORMAT,
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'files': files,
+            'content_hash': _content_hash(files)
+        }
+    )
+    with open(os.path.join(directory, METADATA_FILENAME), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def normalize_metadata(metadata: Dict) -> Dict:
+    """
+    Copy of metadata in the current schema
+    Older generate_and_train.py runs nested the metrics under 'metrics',
+    spelled out the confusion matrix keys and stored feature importance as
+    a list of {feature, importance} records.
+    """
+    metadata = dict(metadata)
+    
+    metrics = metadata.pop('metrics', None)
+    if isinstance(metrics, dict):
+        for key in METRIC_KEYS:
+            metadata.setdefault(key, metrics.get(key))
+    
+    confusion = metadata.get('confusion_matrix')
+    if isinstance(confusion, dict):
+        metadata['confusion_matrix'] = {
+            _CONFUSION_MATRIX_KEYS.get(key, key): value for key, value in confusion.items()
+        }
+    
+    importance = metadata.get('feature_importance')
+    if isinstance(importance, list):
+        metadata['feature_importance'] = {
+            record['feature']: float(record['importance']) for record in importance
+        }
+    
+    metadata.setdefault('data_source', 'unknown')
+    metadata.setdefault('training_mode', 'full')
+    metadata['schema_version'] = METADATA_SCHEMA_VERSION
+    return metadata
+
+
+def read_metadata(path: str) -> Dict:
+    """Metadata JSON at path in the current schema; {} if there is none"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return normalize_metadata(json.load(f))
+
+
+def metadata_path_for(model_path: str) -> str:
+    """Metadata file belonging to a version directory or a model file"""
+    if os.path.isdir(model_path):
+        return os.path.join(model_path, METADATA_FILENAME)
+    return os.path.join(os.path.dirname(model_path), METADATA_FILENAME)
+
+
+def is_artifact(path: str) -> bool:
+    """True for a version directory in the compact format"""
+    return os.path.isfile(os.path.join(path, FOREST_FILENAME))
+
+
+def read_artifact_file(directory: str, name: str, metadata: Optional[Dict] = None) -> bytes:
+    """
+    Contents of one artifact file, checked against the SHA-256 recorded in
+    the metadata. Raises ValueError on a mismatch.
+    """
+    expected = _recorded_sha256(directory, name, metadata)
+    with open(os.path.join(directory, name), 'rb') as f:
+        data = f.read()
+    if hashlib.sha256(data).hexdigest() != expected:
+        raise ValueError(f"Checksum mismatch for {os.path.join(directory, name)}; the artifact is corrupt")
+    return data
+
+
+def verify_artifact_file(directory: str, name: str, metadata: Optional[Dict] = None) -> str:
+    """
+    Check one artifact file against the SHA-256 recorded in the metadata,
+    hashing it in chunks rather than holding it in memory, and return its
+    path. Raises ValueError on a mismatch.
+    """
+    expected = _recorded_sha256(directory, name, metadata)
+    path = os.path.join(directory, name)
+    if _file_sha256(path) != expected:
+        raise ValueError(f"Checksum mismatch for {path}; the artifact is corrupt")
+    return path
+
+
+def _recorded_sha256(directory: str, name: str, metadata: Optional[Dict]) -> str:
+    if metadata is None:
+        metadata = read_metadata(os.path.join(directory, METADATA_FILENAME))
+    expected = metadata.get('artifact', {}).get('files', {}).get(name, {}).get('sha256')
+    if expected is None:
+        raise ValueError(f"No checksum recorded for {name} in {directory}")
+    return expected
+
+
+def _file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_forest_arrays(directory: str, metadata: Optional[Dict] = None) -> Dict[str, np.ndarray]:
+    """The verified arrays of a version's forest.npz"""
+    data = read_artifact_file(directory, FOREST_FILENAME, metadata)
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        return {name: npz[name] for name in npz.files}
+
+
+def load_fitted_model(model_path: str, metadata: Optional[Dict] = None):
+    """
+    The sklearn forest of a version directory (verified checkpoint, or the
+    pickle of an older version) or of a model file
+    """
+    import joblib
+    
+    if os.path.isdir(model_path):
+        if is_artifact(model_path):
+            # Loaded from the file once verified; sklearn copies each tree's
+            # node arrays on unpickling, so memory-mapping would gain nothing
+            return joblib.load(verify_artifact_file(model_path, CHECKPOINT_FILENAME, metadata))
+        model_path = os.path.join(model_path, MODEL_FILENAME)
+    return joblib.load(model_path)
+
+
+def verify_version(version: str, registry_dir: str = REGISTRY_DIR) -> Dict:
+    """
+    Check every file of a version against its metadata
+    
+    Returns:
+        The version's metadata. Raises ValueError if a file is corrupt and
+        FileNotFoundError if the version or one of its files is missing.
+    """
+    version_dir = os.path.join(registry_dir, version)
+    if not os.path.isdir(version_dir):
+        raise FileNotFoundError(f"Model version not found in registry: {version}")
+    
+    metadata = read_metadata(os.path.join(version_dir, METADATA_FILENAME))
+    if not is_artifact(version_dir):
+        # Older pickle-only version: nothing recorded to check against
+        if not os.path.exists(os.path.join(version_dir, MODEL_FILENAME)):
+            raise FileNotFoundError(f"No model file in {version_dir}")
+        return metadata
+    
+    files = metadata.get('artifact', {}).get('files', {})
+    for name in files:
+        verify_artifact_file(version_dir, name, metadata)
+    if metadata['artifact'].get('content_hash') != _content_hash(files):
+        raise ValueError(f"Content hash mismatch for {version}")
+    return metadata
+
+
+def list_versions(registry_dir: str = REGISTRY_DIR) -> List[str]:
+    """Published versions, oldest first"""
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(registry_dir)
+        if not name.startswith('.') and os.path.exists(os.path.join(registry_dir, name, METADATA_FILENAME))
+    )
+
+
+def rollback(to_version: Optional[str] = None, registry_dir: str = REGISTRY_DIR) -> str:
+    """
+    Point CURRENT back at an earlier version without retraining
+    
+    Args:
+        to_version: Version to serve (default: the newest version older than
+                    the current one that was itself current; shadow
+                    candidates that were never promoted are skipped). It is
+                    verified first.
+        registry_dir: Registry root directory
+    
+    Returns:
+        The version now current. Workers switch on their next model poll.
+    """
+    if to_version is None:
+        current = read_current_version(registry_dir)
+        served = read_current_history(registry_dir)
+        older = [v for v in served if current is None or v < current]
+        if not older:
+            raise ValueError(f"No previously served version older than {current} to roll back to")
+        to_version = older[-1]
+    
+    verify_version(to_version, registry_dir)
+    set_current_version(to_version, registry_dir)
+    return to_version
+
+
+def _content_hash(files: Dict[str, Dict]) -> str:
+    """One hash over the artifact's file hashes, identifying the model's content"""
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        digest.update(f"{name}:{files[name]['sha256']}\n".encode())
+    return digest.hexdigest()
+
+
+def set_current_version(version: str, registry_dir: str = REGISTRY_DIR):
+    """Atomically point CURRENT at an existing version and record it in CURRENT_HISTORY"""
+    _write_pointer(CURRENT_POINTER, version, registry_dir)
+    
+    # A registry from before the history was kept starts it with what
+    # read_current_history assumed about it
+    history_path = os.path.join(registry_dir, CURRENT_HISTORY)
+    served = [] if os.path.exists(history_path) else read_current_history(registry_dir)
+    # One small append per call, so concurrent publishers don't interleave lines
+    with open(history_path, 'a') as f:
+        f.write(''.join(f"{v}\n" for v in served if v != version) + f"{version}\n")
+
+
+def read_current_history(registry_dir: str = REGISTRY_DIR) -> List[str]:
+    """
+    Versions that have been CURRENT and are still published, oldest first.
+    Without a history (a registry from before it was kept), every version
+    but the shadow candidate, since each was published as current
+    """
+    try:
+        with open(os.path.join(registry_dir, CURRENT_HISTORY), 'r') as f:
+            served = {line.strip() for line in f if line.strip()}
+    except FileNotFoundError:
+        shadow = read_shadow_version(registry_dir)
+        return [v for v in list_versions(registry_dir) if v != shadow]
+    return [v for v in list_versions(registry_dir) if v in served]
+
+
+def read_current_version(registry_dir: str = REGISTRY_DIR) -> Optional[str]:
+    """Version named by CURRENT, or None if nothing has been published"""
+    return _read_pointer(CURRENT_POINTER, registry_dir)
+
+
+def set_shadow_version(version: Optional[str], registry_dir: str = REGISTRY_DIR):
+    """Atomically point SHADOW at an existing version, or clear it with None"""
+    if version is None:
+        try:
+            os.remove(os.path.join(registry_dir, SHADOW_POINTER))
+        except FileNotFoundError:
+            pass
+        return
+    _write_pointer(SHADOW_POINTER, version, registry_dir)
+
+
+def read_shadow_version(registry_dir: str = REGISTRY_DIR) -> Optional[str]:
+    """Version named by SHADOW, or None if there is no candidate"""
+    return _read_pointer(SHADOW_POINTER, registry_dir)
+
+
+def promote_shadow(registry_dir: str = REGISTRY_DIR) -> str:
+    """
+    Make the SHADOW candidate CURRENT (after verifying it) and clear SHADOW
+    
+    Returns:
+        The promoted version. Workers switch on their next model poll.
+    """
+    version = read_shadow_version(registry_dir)
+    if version is None:
+        raise ValueError("No shadow model to promote")
+    
+    verify_version(version, registry_dir)
+    set_current_version(version, registry_dir)
+    set_shadow_version(None, registry_dir)
+    return version
+
+
+def _write_pointer(pointer: str, version: str, registry_dir: str):
+    if not os.path.isdir(os.path.join(registry_dir, version)):
+        raise FileNotFoundError(f"Model version not found in registry: {version}")
+    
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{pointer.lower()}-', dir=registry_dir)
+    with os.fdopen(fd, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(registry_dir, pointer))
+
+
+def _read_pointer(pointer: str, registry_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(registry_dir, pointer), 'r') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_paths(version: str, registry_dir: str = REGISTRY_DIR):
+    """
+    (model_path, metadata_path) for a registry version; model_path is the
+    version directory, which MLPredictor and load_fitted_model accept
+    """
+    version_dir = os.path.join(registry_dir, version)
+    return version_dir, os.path.join(version_dir, METADATA_FILENAME)
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description='Inspect the model registry or roll back to an earlier version')
+    parser.add_argument('--registry-dir', default=os.getenv('MODEL_REGISTRY_DIR', REGISTRY_DIR))
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='list versions, marking the current (*) and shadow (s) ones')
+    verify_parser = commands.add_parser('verify', help='check a version\'s files against its hashes')
+    verify_parser.add_argument('version', nargs='?', help='default: the current version')
+    rollback_parser = commands.add_parser('rollback', help='serve an earlier version')
+    rollback_parser.add_argument('version', nargs='?', help='default: the last served version before the current one')
+    shadow_parser = commands.add_parser('shadow', help='score a version in shadow next to the current one')
+    shadow_parser.add_argument('version', nargs='?', help='omit to stop shadow scoring')
+    commands.add_parser('promote', help='make the shadow version current')
+    args = parser.parse_args(argv)
+    
+    current = read_current_version(args.registry_dir)
+    if args.command == 'list':
+        shadow = read_shadow_version(args.registry_dir)
+        for version in list_versions(args.registry_dir):
+            metadata = read_metadata(os.path.join(args.registry_dir, version, METADATA_FILENAME))
+            content_hash = metadata.get('artifact', {}).get('content_hash', '(pickle)')
+            marker = '*' if version == current else ('s' if version == shadow else ' ')
+            print(f"{marker} {version}  {metadata.get('training_mode', '?'):<11} "
+                  f"roc_auc={metadata.get('roc_auc')}  {content_hash[:12]}")
+    elif args.command == 'verify':
+        version = args.version or current
+        verify_version(version, args.registry_dir)
+        print(f"{version}: OK")
+    elif args.command == 'shadow':
+        if args.version:
+            verify_version(args.version, args.registry_dir)
+        set_shadow_version(args.version, args.registry_dir)
+        print(f"SHADOW -> {args.version or '(none)'}")
+    elif args.command == 'promote':
+        version = promote_shadow(args.registry_dir)
+        print(f"CURRENT -> {version} (was {current})")
+    else:
+        version = rollback(args.version, args.registry_dir)
+        print(f"CURRENT -> {version} (was {current})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Persistent cache for model predictions
+The dashboard asks for the same students with unchanged features on every
+load, so predictions are keyed on the model version plus the exact feature
+vector and shared by every gunicorn worker through one SQLite file
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Keys per SQL statement; stays under SQLite's bound-parameter limit
+_SQL_CHUNK = 500
+
+
+def canonical_feature_vector(features: Dict, feature_columns: Sequence[str]) -> Optional[Tuple[float, ...]]:
+    """
+    The feature values the model actually sees, in column order, or None if
+    a value can't be converted (that row is scored without caching)
+    """
+    try:
+        # + 0.0 folds -0.0 into 0.0 so both hash the same
+        return tuple(float(features.get(col, 0)) + 0.0 for col in feature_columns)
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+class PredictionCache:
+    """
+    LRU cache of prediction dicts backed by SQLite
+    Entries from other model versions are never returned and are dropped
+    by invalidate() when the served model changes
+    """
+    
+    def __init__(self, path: str, max_entries: int = 100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._puts_since_evict = 0
+    
+    @staticmethod
+    def make_key(model_version: str, vector: Tuple[float, ...]) -> str:
+        """Hash of the model version and a canonical feature vector"""
+        # repr() round-trips floats exactly, so equal vectors share a key
+        payload = f"{model_version}|{','.join(map(repr, vector))}"
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+    
+    def get_many(self, keys: List[str], require_contributions: bool = False) -> Dict[str, Dict]:
+        """
+        Cached predictions for the keys that have one
+        
+        Args:
+            keys: Cache keys from make_key
+            require_contributions: Treat entries stored without
+                                   feature_contributions as misses
+        
+        Returns:
+            Dict mapping key -> prediction dict, for hits only
+        """
+        found = {}
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(keys), _SQL_CHUNK):
+                chunk = keys[start:start + _SQL_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                query = f'SELECT key, value FROM predictions WHERE key IN ({placeholders})'
+                if require_contributions:
+                    query += ' AND has_contributions = 1'
+                rows = conn.execute(query, chunk).fetchall()
+                
+                if rows:
+                    hit_keys = [key for key, _ in rows]
+                    conn.execute(
+                        f'UPDATE predictions SET last_access = ? '
+                        f'WHERE key IN ({",".join("?" * len(hit_keys))})',
+                        [now] + hit_keys
+                    )
+                for key, value in rows:
+                    found[key] = json.loads(value)
+            conn.commit()
+            
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        
+        return found
+    
+    def put_many(self, model_version: str, entries: Dict[str, Dict]):
+        """Store predictions by key; evicts least recently used entries in amortized passes"""
+        if not entries:
+            return
+        
+        now = time.time()
+        rows = [
+            (key, model_version, int('feature_contributions' in prediction), json.dumps(prediction), now)
+            for key, prediction in entries.items()
+        ]
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                'INSERT OR REPLACE INTO predictions (key, model_version, has_contributions, value, last_access) '
+                'VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+            
+            # Trimming scans the LRU index, so only do it once enough new
+            # entries have accumulated; the table may overshoot by ~10%
+            self._puts_since_evict += len(rows)
+            if self._puts_since_evict >= max(1, self.max_entries // 10):
+                conn.execute(
+                    'DELETE FROM predictions WHERE key IN ('
+                    '  SELECT key FROM predictions ORDER BY last_access DESC LIMIT -1 OFFSET ?'
+                    ')',
+                    (self.max_entries,)
+                )
+                self._puts_since_evict = 0
+            conn.commit()
+    
+    def invalidate(self, keep_version: Optional[str] = None):
+        """Drop every entry not produced by keep_version (all entries if None)"""
+        with self._lock:
+            conn = self._connection()
+            if keep_version is None:
+                conn.execute('DELETE FROM predictions')
+            else:
+                conn.execute('DELETE FROM predictions WHERE model_version != ?', (keep_version,))
+            conn.commit()
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process and current entry count"""
+        with self._lock:
+            entries = self._connection().execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': entries
+        }
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Per-process connection; reopened after fork so workers never share one"""
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS predictions ('
+                '  key TEXT PRIMARY KEY,'
+                '  model_version TEXT NOT NULL,'
+                '  has_contributions INTEGER NOT NULL,'
+                '  value TEXT NOT NULL,'
+                '  last_access REAL NOT NULL'
+                ')'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_predictions_last_access ON predictions (last_access)'
+            )
+            self._conn.commit()
+            self._pid = os.getpid()
+            self._puts_since_evict = 0
+        return self._conn
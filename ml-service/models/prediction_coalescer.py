@@ -0,0 +1,107 @@
+"""
+Micro-batching for concurrent single-row predictions
+Requests that arrive on one worker (gunicorn threads > 1) while a model call
+is already running are collected and scored together in one predict_many
+call once it finishes, or after window_seconds at most. Every model call
+has a fixed overhead (sklearn's predict_proba walks every tree once per call
+whatever the batch size), so one call for N rows costs far less than N
+calls for one row each. A request that finds the model idle is scored at
+once.
+"""
+
+import threading
+from typing import Dict
+
+from models.metrics import BATCH_SIZE
+
+
+class _Batch:
+    """Rows collected for one predictor, and their results once scored"""
+    
+    def __init__(self):
+        self.rows = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class PredictionCoalescer:
+    """
+    Collects single predictions from concurrent request threads into batches
+    The first thread to arrive leads the batch. If no batch is being scored
+    it scores at once; otherwise it waits until the running batches finish,
+    max_batch rows have joined or window_seconds pass, whichever is first.
+    It then scores every row with one predict_many call and hands each
+    waiting thread its own result. No background thread is involved, so
+    nothing has to be restarted after a fork.
+    """
+    
+    def __init__(self, window_seconds: float = 0.002, max_batch: int = 32):
+        """
+        Args:
+            window_seconds: Longest the first request of a batch waits for
+                            others to join while another batch is scored
+            max_batch: Rows at which a batch is scored without waiting out
+                       the window
+        """
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self.batches_scored = 0
+        self.rows_scored = 0
+        self._lock = threading.Lock()
+        self._open = {}
+        self._scoring = 0
+    
+    def predict(self, predictor, features: Dict, include_contributions: bool = False) -> Dict:
+        """
+        predictor.predict_many([features], include_contributions)[0], scored
+        together with whatever other rows arrive within the window
+        """
+        key = (id(predictor), include_contributions)
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._open[key] = _Batch()
+            index = len(batch.rows)
+            batch.rows.append(features)
+            # Scored at once when full, or when no model call is running:
+            # then nobody is queued behind one and waiting would only add
+            # latency. Later arrivals start a new batch.
+            if len(batch.rows) >= self.max_batch or not self._scoring:
+                self._close(key, batch)
+        
+        if not leader:
+            batch.done.wait()
+        else:
+            batch.full.wait(self.window_seconds)
+            with self._lock:
+                if not batch.full.is_set():
+                    self._close(key, batch)
+                self.batches_scored += 1
+                self.rows_scored += len(batch.rows)
+            
+            BATCH_SIZE.labels('coalesced').observe(len(batch.rows))
+            try:
+                batch.results = predictor.predict_many(batch.rows, include_contributions=include_contributions)
+            except Exception as e:
+                batch.error = e
+            finally:
+                with self._lock:
+                    self._scoring -= 1
+                    # The model is free: batches queued behind this one go now
+                    if not self._scoring:
+                        for open_key, open_batch in list(self._open.items()):
+                            self._close(open_key, open_batch)
+                batch.done.set()
+        
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index]
+    
+    def _close(self, key, batch: _Batch):
+        """Stop batch taking rows and count it as scoring; call with the lock held"""
+        del self._open[key]
+        self._scoring += 1
+        batch.full.set()
@@ -0,0 +1,143 @@
+"""
+Background retraining jobs
+Jobs run on a worker thread so /retrain returns immediately. Job status is
+kept in small JSON files so any gunicorn worker can answer a status request,
+not just the one that started the job. Each worker has its own executor, so
+fits take an exclusive lock on a file in the jobs directory and run one at a
+time across all workers. A job whose worker died before it finished is
+reported as failed.
+"""
+
+import fcntl
+import json
+import os
+import re
+import tempfile
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+JOBS_DIR = 'models/jobs'
+
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+_FIT_LOCK_NAME = '.fit.lock'
+
+_UNFINISHED = ('queued', 'running')
+
+
+class RetrainJobRunner:
+    """Runs training callables in the background and tracks their status"""
+    
+    def __init__(self, jobs_dir: str = JOBS_DIR, max_workers: int = 1):
+        self.jobs_dir = jobs_dir
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+    
+    def submit(self, fn: Callable, *args, **kwargs) -> str:
+        """
+        Queue fn(*args, **kwargs) and return its job ID.
+        fn's return value is stored as the job's result and must be JSON-serializable.
+        """
+        job_id = uuid.uuid4().hex
+        self._write(job_id, {
+            'job_id': job_id,
+            'status': 'queued',
+            'created_at': datetime.now().isoformat(),
+            'pid': os.getpid()
+        })
+        self._get_executor().submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+    
+    def get(self, job_id: str) -> Optional[Dict]:
+        """
+        Job status dict, or None if the job ID is unknown.
+        An unfinished job whose worker process has exited is marked failed.
+        """
+        if not _JOB_ID_PATTERN.match(job_id or ''):
+            return None
+        try:
+            with open(self._path(job_id), 'r') as f:
+                status = json.load(f)
+        except FileNotFoundError:
+            return None
+        
+        if status['status'] in _UNFINISHED and not _process_alive(status.get('pid')):
+            status.update(
+                status='failed',
+                error=f"Worker process {status.get('pid')} exited before the job finished",
+                finished_at=datetime.now().isoformat()
+            )
+            self._write(job_id, status)
+        return status
+    
+    @contextmanager
+    def fit_lock(self):
+        """
+        Hold the jobs directory's fit lock, waiting for any fit running in
+        another worker. The OS releases it if the holder dies.
+        """
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        with open(os.path.join(self.jobs_dir, _FIT_LOCK_NAME), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def _run(self, job_id: str, fn: Callable, args, kwargs):
+        """Execute one job, recording running/succeeded/failed transitions"""
+        status = self.get(job_id)
+        try:
+            # Stays queued while another worker's fit holds the lock
+            with self.fit_lock():
+                status.update(status='running', started_at=datetime.now().isoformat())
+                self._write(job_id, status)
+                result = fn(*args, **kwargs)
+            status.update(status='succeeded', result=result)
+        except Exception as e:
+            status.update(status='failed', error=str(e), traceback=traceback.format_exc())
+        
+        status['finished_at'] = datetime.now().isoformat()
+        self._write(job_id, status)
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Per-process executor; threads do not survive a fork"""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='retrain'
+                )
+                self._pid = os.getpid()
+            return self._executor
+    
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f'{job_id}.json')
+    
+    def _write(self, job_id: str, status: Dict):
+        """Atomically replace a job's status file"""
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f'.{job_id}-', dir=self.jobs_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(status, f, indent=2)
+        os.replace(tmp_path, self._path(job_id))
+
+
+def _process_alive(pid: Optional[int]) -> bool:
+    """Whether a process with this pid exists (jobs written without one count as alive)"""
+    if pid is None:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
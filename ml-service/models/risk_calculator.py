@@ -1,5 +1,86 @@
 import numpy as np
-from typing import Dict, Tuple
+import json
+from bisect import bisect_right
+from typing import Dict, Optional, Tuple
+
+from config import Config
+
+# Breakpoint tables for the rule-based score. Each dimension maps a value to
+# risks[i], where i is the number of breakpoints the value is >= to.
+DEFAULT_RISK_TABLES = {
+    # Feature weights (must sum to 1.0)
+    'weights': {
+        'attendance': 0.40,
+        'academic': 0.40,
+        'behavior': 0.20
+    },
+    # 90%+ = low risk, <75% = high risk
+    'attendance': {
+        'breakpoints': [0.60, 0.75, 0.80, 0.90],
+        'risks': [0.95, 0.7, 0.5, 0.3, 0.1]
+    },
+    # 75%+ = low risk, <40% = high risk
+    'academic': {
+        'breakpoints': [40, 50, 60, 75],
+        'risks': [0.95, 0.7, 0.5, 0.3, 0.1]
+    },
+    # Higher behavior score = better behavior = lower risk
+    'behavior': {
+        'breakpoints': [40, 60, 80],
+        'risks': [0.9, 0.6, 0.3, 0.1]
+    },
+    'risk_levels': {
+        'breakpoints': [0.3, 0.6, 0.8],
+        'levels': ['low', 'medium', 'high', 'critical']
+    }
+}
+
+
+def load_risk_tables(path: str) -> Dict:
+    """
+    Load risk tables from a JSON file.
+    Sections missing from the file keep their DEFAULT_RISK_TABLES values.
+    Raises ValueError naming the file and the problem if a table is invalid.
+    """
+    with open(path, 'r') as f:
+        overrides = json.load(f)
+    
+    tables = dict(DEFAULT_RISK_TABLES)
+    tables.update(overrides)
+    try:
+        validate_risk_tables(tables)
+    except ValueError as e:
+        raise ValueError(f"Invalid risk tables in {path}: {e}") from None
+    return tables
+
+
+def validate_risk_tables(tables: Dict):
+    """
+    Check that every table can be looked up: breakpoints in ascending order
+    with one more risk (or level) than breakpoints, and a weight for each
+    dimension, the weights summing to 1. Raises ValueError on the first
+    problem.
+    """
+    weights = tables.get('weights')
+    if not isinstance(weights, dict) or set(weights) != {'attendance', 'academic', 'behavior'}:
+        raise ValueError("weights must give exactly attendance, academic and behavior")
+    if abs(sum(weights.values()) - 1.0) > 1e-6:
+        raise ValueError(f"weights must sum to 1.0 (got {sum(weights.values()):g})")
+    
+    for name, outputs in (('attendance', 'risks'), ('academic', 'risks'),
+                          ('behavior', 'risks'), ('risk_levels', 'levels')):
+        table = tables.get(name)
+        if not isinstance(table, dict) or 'breakpoints' not in table or outputs not in table:
+            raise ValueError(f"{name} needs 'breakpoints' and '{outputs}'")
+        breakpoints = table['breakpoints']
+        if any(low >= high for low, high in zip(breakpoints, breakpoints[1:])):
+            raise ValueError(f"{name} breakpoints must be in ascending order (got {breakpoints})")
+        if len(table[outputs]) != len(breakpoints) + 1:
+            raise ValueError(
+                f"{name} needs one more {outputs[:-1]} than breakpoints "
+                f"({len(table[outputs])} {outputs} for {len(breakpoints)} breakpoints)"
+            )
+
 
 class RiskCalculator:
     """
@@ -7,13 +88,19 @@ class RiskCalculator:
     Uses weighted scoring across attendance, academic, and behavior dimensions.
     """
     
-    def __init__(self):
-        # Feature weights (must sum to 1.0)
-        self.weights = {
-            'attendance': 0.40,
-            'academic': 0.40,
-            'behavior': 0.20
-        }
+    def __init__(self, tables: Optional[Dict] = None):
+        """
+        Args:
+            tables: Breakpoint tables in the DEFAULT_RISK_TABLES layout
+                    (default: loaded from Config.RISK_TABLES_PATH when set,
+                    else DEFAULT_RISK_TABLES). Raises ValueError if invalid.
+        """
+        if tables is None:
+            tables = load_risk_tables(Config.RISK_TABLES_PATH) if Config.RISK_TABLES_PATH else DEFAULT_RISK_TABLES
+        validate_risk_tables(tables)
+        self.tables = tables
+        self.weights = self.tables['weights']
+        self._score_table, self._level_table = self._combined_tables()
     
     def calculate_risk(self, features: Dict) -> Dict:
         """
@@ -43,11 +130,7 @@ class RiskCalculator:
         behavior_risk = self._calculate_behavior_risk(behavior_score)
         
         # Weighted composite risk score
-        risk_score = (
-            self.weights['attendance'] * attendance_risk +
-            self.weights['academic'] * academic_risk +
-            self.weights['behavior'] * behavior_risk
-        )
+        risk_score = self._combine(attendance_risk, academic_risk, behavior_risk)
         
         # Classify risk level
         risk_level = self._classify_risk(risk_score)
@@ -67,62 +150,84 @@ class RiskCalculator:
             'weights': self.weights
         }
     
+    def calculate_risk_batch(self, features) -> Dict[str, np.ndarray]:
+        """
+        Vectorized calculate_risk over whole columns.
+        
+        Args:
+            features: DataFrame or dict of equal-length column arrays with the
+                      same keys as calculate_risk. Missing columns use the same
+                      defaults as the scalar path.
+        
+        Returns:
+            Dict of arrays: risk_score, risk_level, confidence,
+            attendance_risk, academic_risk, behavior_risk. Row i matches
+            calculate_risk on row i exactly.
+        """
+        columns = {
+            name: features[name]
+            for name in ('attendance_rate', 'avg_marks_percentage', 'behavior_score', 'data_tier')
+            if name in features
+        }
+        n_rows = len(next(iter(columns.values()))) if columns else 0
+        
+        def column(name, default):
+            if name not in columns:
+                return np.full(n_rows, default, dtype=np.float64)
+            return np.asarray(columns[name], dtype=np.float64)
+        
+        attendance_idx = self._lookup_index(self.tables['attendance'], column('attendance_rate', 0))
+        academic_idx = self._lookup_index(self.tables['academic'], column('avg_marks_percentage', 0))
+        behavior_idx = self._lookup_index(self.tables['behavior'], column('behavior_score', 100))
+        
+        # Every row falls in one of a few (attendance, academic, behavior)
+        # buckets, so score each bucket once with the scalar formula and
+        # gather. This keeps results bit-identical to calculate_risk.
+        risk_score = self._score_table[attendance_idx, academic_idx, behavior_idx]
+        risk_level = self._level_table[attendance_idx, academic_idx, behavior_idx]
+        
+        return {
+            'risk_score': risk_score,
+            'risk_level': risk_level,
+            'confidence': self._calculate_confidence_batch(column('data_tier', 0)),
+            'attendance_risk': self._rounded_risks('attendance')[attendance_idx],
+            'academic_risk': self._rounded_risks('academic')[academic_idx],
+            'behavior_risk': self._rounded_risks('behavior')[behavior_idx]
+        }
+    
     def _calculate_attendance_risk(self, attendance_rate: float) -> float:
         """
         Convert attendance rate to risk score.
         90%+ = low risk, <75% = high risk
         """
-        if attendance_rate >= 0.90:
-            return 0.1
-        elif attendance_rate >= 0.80:
-            return 0.3
-        elif attendance_rate >= 0.75:
-            return 0.5
-        elif attendance_rate >= 0.60:
-            return 0.7
-        else:
-            return 0.95
+        return self._lookup(self.tables['attendance'], attendance_rate)
     
     def _calculate_academic_risk(self, avg_marks: float) -> float:
         """
         Convert average marks percentage to risk score.
         75%+ = low risk, <40% = high risk
         """
-        if avg_marks >= 75:
-            return 0.1
-        elif avg_marks >= 60:
-            return 0.3
-        elif avg_marks >= 50:
-            return 0.5
-        elif avg_marks >= 40:
-            return 0.7
-        else:
-            return 0.95
+        return self._lookup(self.tables['academic'], avg_marks)
     
     def _calculate_behavior_risk(self, behavior_score: float) -> float:
         """
         Convert behavior score to risk score.
         Higher behavior score = better behavior = lower risk
         """
-        if behavior_score >= 80:
-            return 0.1
-        elif behavior_score >= 60:
-            return 0.3
-        elif behavior_score >= 40:
-            return 0.6
-        else:
-            return 0.9
+        return self._lookup(self.tables['behavior'], behavior_score)
+    
+    def _combine(self, attendance_risk: float, academic_risk: float, behavior_risk: float) -> float:
+        """Weighted composite of the component risk scores"""
+        return (
+            self.weights['attendance'] * attendance_risk +
+            self.weights['academic'] * academic_risk +
+            self.weights['behavior'] * behavior_risk
+        )
     
     def _classify_risk(self, risk_score: float) -> str:
         """Classify risk score into categorical level"""
-        if risk_score < 0.3:
-            return 'low'
-        elif risk_score < 0.6:
-            return 'medium'
-        elif risk_score < 0.8:
-            return 'high'
-        else:
-            return 'critical'
+        table = self.tables['risk_levels']
+        return table['levels'][self._bucket(table['breakpoints'], risk_score)]
     
     def _calculate_confidence(self, data_tier: int) -> str:
         """Map data tier to confidence level"""
@@ -133,3 +238,48 @@ class RiskCalculator:
             3: 'high'
         }
         return confidence_map.get(data_tier, 'insufficient')
+    
+    def _calculate_confidence_batch(self, data_tiers: np.ndarray) -> np.ndarray:
+        """Vectorized _calculate_confidence; unknown tiers are 'insufficient'"""
+        levels = np.array(['insufficient', 'low', 'medium', 'high'])
+        known = np.isin(data_tiers, [0, 1, 2, 3])
+        return levels[np.where(known, data_tiers, 0).astype(np.intp)]
+    
+    def _lookup(self, table: Dict, value: float) -> float:
+        """Risk for a single value from a breakpoint table"""
+        return table['risks'][self._bucket(table['breakpoints'], value)]
+    
+    @staticmethod
+    def _bucket(breakpoints, value) -> int:
+        """Number of breakpoints value is >= to (NaN falls in the first bucket)"""
+        if value != value:
+            return 0
+        return bisect_right(breakpoints, value)
+    
+    @staticmethod
+    def _lookup_index(table: Dict, values: np.ndarray) -> np.ndarray:
+        """Vectorized _bucket over an array of values"""
+        index = np.searchsorted(np.asarray(table['breakpoints'], dtype=np.float64), values, side='right')
+        return np.where(np.isnan(values), 0, index)
+    
+    def _rounded_risks(self, dimension: str) -> np.ndarray:
+        """Component risks for a dimension, rounded as calculate_risk does"""
+        return np.array([round(risk, 3) for risk in self.tables[dimension]['risks']])
+    
+    def _combined_tables(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Rounded risk score and risk level for every component bucket combination"""
+        attendance = self.tables['attendance']['risks']
+        academic = self.tables['academic']['risks']
+        behavior = self.tables['behavior']['risks']
+        shape = (len(attendance), len(academic), len(behavior))
+        
+        score_table = np.empty(shape, dtype=np.float64)
+        level_table = np.empty(shape, dtype=object)
+        for i, attendance_risk in enumerate(attendance):
+            for j, academic_risk in enumerate(academic):
+                for k, behavior_risk in enumerate(behavior):
+                    risk_score = self._combine(attendance_risk, academic_risk, behavior_risk)
+                    score_table[i, j, k] = round(risk_score, 3)
+                    level_table[i, j, k] = self._classify_risk(risk_score)
+        
+        return score_table, level_table.astype(str)
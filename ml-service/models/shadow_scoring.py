@@ -0,0 +1,387 @@
+"""
+Shadow scoring of a candidate model on live traffic
+/predict and /batch-predict hand their inputs to a per-worker queue once
+the response has been sent. A background thread scores each batch with the
+served model and the candidate, and the comparison (risk level agreement,
+score deltas, per-version latency) is summed into a SQLite file shared by
+every gunicorn worker
+"""
+
+import bisect
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from models.metrics import LATENCY_BUCKETS
+
+SHADOW_REPORT_PATH = 'models/shadow_report.db'
+RISK_LEVELS = ('low', 'medium', 'high', 'critical')
+
+logger = logging.getLogger(__name__)
+
+
+def _empty_stats() -> Dict:
+    return {
+        'rows': 0,
+        'batches': 0,
+        'dropped_batches': 0,
+        'errors': 0,
+        'agree': 0,
+        'sum_delta': 0.0,
+        'sum_abs_delta': 0.0,
+        'max_abs_delta': 0.0,
+        'transitions': {},
+        'latency': {
+            role: {'seconds': 0.0, 'rows': 0, 'buckets': [0] * (len(LATENCY_BUCKETS) + 1)}
+            for role in ('primary', 'shadow')
+        }
+    }
+
+
+def _merge(total: Dict, part: Dict) -> Dict:
+    """Add part's counts into total"""
+    for key in ('rows', 'batches', 'dropped_batches', 'errors', 'agree', 'sum_delta', 'sum_abs_delta'):
+        total[key] += part[key]
+    total['max_abs_delta'] = max(total['max_abs_delta'], part['max_abs_delta'])
+    for transition, count in part['transitions'].items():
+        total['transitions'][transition] = total['transitions'].get(transition, 0) + count
+    for role, latency in part['latency'].items():
+        merged = total['latency'][role]
+        merged['seconds'] += latency['seconds']
+        merged['rows'] += latency['rows']
+        merged['buckets'] = [a + b for a, b in zip(merged['buckets'], latency['buckets'])]
+    return total
+
+
+def _percentile_seconds(buckets: Sequence[int], q: float) -> Optional[float]:
+    """Upper bound of the latency bucket holding the q-th quantile"""
+    total = sum(buckets)
+    if not total:
+        return None
+    cumulative = np.cumsum(buckets)
+    index = int(np.searchsorted(cumulative, q * total))
+    return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else float('inf')
+
+
+class ShadowScorer:
+    """
+    Compares a candidate model with the served one off the request path
+    submit() never blocks: when the queue is full the batch is dropped and
+    counted. Scoring waits until the worker has handled no request for
+    idle_seconds (see request_started), so it only uses time the worker
+    would spend idle; under sustained load the queue fills and batches are
+    dropped instead of slowing responses down.
+    """
+    
+    def __init__(self, load_predictor: Callable[[str], object], path: str = SHADOW_REPORT_PATH,
+                 queue_size: int = 100, flush_seconds: float = 5.0, max_rows: int = 1000,
+                 idle_seconds: float = 0.01):
+        """
+        Args:
+            load_predictor: Returns an MLPredictor for a registry version
+            path: SQLite file holding the summed comparison
+            queue_size: Batches waiting to be scored, per worker
+            flush_seconds: How often each worker adds its counts to the file
+            max_rows: Most rows scored in one model call; queued batches are
+                      scored together up to this many
+            idle_seconds: How long the worker must have been without a
+                          request before a scoring call starts
+        """
+        self.load_predictor = load_predictor
+        self.path = path
+        self.queue_size = queue_size
+        self.flush_seconds = flush_seconds
+        self.max_rows = max_rows
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._idle = threading.Condition()
+        self._active_requests = 0
+        self._last_request_end = 0.0
+        self._pending = {}
+        self._candidate = None
+        self._queue = None
+        self._thread_pid = None
+        self._conn = None
+        self._pid = None
+    
+    def submit(self, features_list: List[Dict], primary, shadow_version: str) -> bool:
+        """
+        Queue one batch of feature dicts for comparison
+        
+        Args:
+            features_list: The rows the primary model answered
+            primary: The MLPredictor that answered them
+            shadow_version: Registry version of the candidate
+        
+        Returns:
+            False if the queue was full and the batch was dropped
+        """
+        try:
+            self._get_queue().put_nowait((features_list, primary, shadow_version))
+            return True
+        except queue.Full:
+            with self._lock:
+                self._stats(primary.model_version, shadow_version)['dropped_batches'] += 1
+            return False
+    
+    def request_started(self):
+        with self._idle:
+            self._active_requests += 1
+    
+    def request_finished(self):
+        with self._idle:
+            self._active_requests -= 1
+            self._last_request_end = time.monotonic()
+            if not self._active_requests:
+                self._idle.notify_all()
+    
+    def report(self) -> List[Dict]:
+        """Comparison per (primary, shadow) version pair, most recent first"""
+        self.flush()
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT primary_version, shadow_version, stats, first_seen, last_seen '
+                'FROM shadow_stats ORDER BY last_seen DESC'
+            ).fetchall()
+        return [
+            self._summarize(primary_version, shadow_version, json.loads(stats), first_seen, last_seen)
+            for primary_version, shadow_version, stats, first_seen, last_seen in rows
+        ]
+    
+    def reset(self):
+        """Forget every comparison (this worker's unflushed counts included)"""
+        with self._lock:
+            self._pending = {}
+            conn = self._connection()
+            conn.execute('DELETE FROM shadow_stats')
+            conn.commit()
+    
+    def flush(self):
+        """Add this worker's counts to the shared file"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            
+            now = time.time()
+            conn = self._connection()
+            # One write transaction, so concurrent flushes from other
+            # workers can't interleave their read-modify-write
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for (primary_version, shadow_version), stats in pending.items():
+                    row = conn.execute(
+                        'SELECT stats FROM shadow_stats WHERE primary_version = ? AND shadow_version = ?',
+                        (primary_version, shadow_version)
+                    ).fetchone()
+                    if row is not None:
+                        stats = _merge(json.loads(row[0]), stats)
+                    conn.execute(
+                        'INSERT INTO shadow_stats (primary_version, shadow_version, stats, first_seen, last_seen) '
+                        'VALUES (?, ?, ?, ?, ?) '
+                        'ON CONFLICT (primary_version, shadow_version) '
+                        'DO UPDATE SET stats = excluded.stats, last_seen = excluded.last_seen',
+                        (primary_version, shadow_version, json.dumps(stats), now, now)
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    def score(self, features_list: List[Dict], primary, shadow_version: str, batches: int = 1):
+        """Score queued rows with both models and add them to the counts (runs on the shadow thread)"""
+        candidate = self._get_candidate(shadow_version)
+        
+        start = time.perf_counter()
+        primary_scores = primary.risk_scores(features_list)
+        primary_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        shadow_scores = candidate.risk_scores(features_list)
+        shadow_seconds = time.perf_counter() - start
+        
+        valid = ~(np.isnan(primary_scores) | np.isnan(shadow_scores))
+        deltas = shadow_scores[valid] - primary_scores[valid]
+        primary_levels = primary._classify_risk_many(primary_scores[valid])
+        shadow_levels = candidate._classify_risk_many(shadow_scores[valid])
+        
+        with self._lock:
+            stats = self._stats(primary.model_version, shadow_version)
+            stats['rows'] += int(valid.sum())
+            stats['batches'] += batches
+            stats['errors'] += int((~valid).sum())
+            stats['sum_delta'] += float(deltas.sum())
+            stats['sum_abs_delta'] += float(np.abs(deltas).sum())
+            if len(deltas):
+                stats['max_abs_delta'] = max(stats['max_abs_delta'], float(np.abs(deltas).max()))
+            for primary_level, shadow_level in zip(primary_levels, shadow_levels):
+                stats['agree'] += primary_level == shadow_level
+                transition = f'{primary_level}->{shadow_level}'
+                stats['transitions'][transition] = stats['transitions'].get(transition, 0) + 1
+            for role, seconds in (('primary', primary_seconds), ('shadow', shadow_seconds)):
+                latency = stats['latency'][role]
+                latency['seconds'] += seconds
+                latency['rows'] += len(features_list)
+                latency['buckets'][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    
+    def _run(self, work: queue.Queue):
+        """Shadow thread: score queued batches, flushing every flush_seconds"""
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = work.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                item = None
+            
+            if item is not None:
+                while not self._wait_until_idle(self.flush_seconds):
+                    self._flush_quietly()
+                    last_flush = time.monotonic()
+                for rows, primary, shadow_version, batches in self._coalesce(work, item):
+                    try:
+                        self.score(rows, primary, shadow_version, batches)
+                    except Exception as e:
+                        logger.warning(f"Shadow scoring failed: {e}")
+            
+            if time.monotonic() - last_flush >= self.flush_seconds:
+                self._flush_quietly()
+                last_flush = time.monotonic()
+    
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning(f"Shadow report flush failed: {e}")
+    
+    def _wait_until_idle(self, timeout: float) -> bool:
+        """Block until no request has run for idle_seconds; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    return False
+                if self._active_requests:
+                    self._idle.wait(deadline - now)
+                    continue
+                quiet = self._last_request_end + self.idle_seconds - now
+                if quiet <= 0:
+                    return True
+                self._idle.wait(min(quiet, deadline - now))
+    
+    def _coalesce(self, work: queue.Queue, item) -> List:
+        """
+        item plus whatever else is queued, merged per (primary, shadow) pair
+        into (rows, primary, shadow_version, batches) of at most max_rows.
+        A model call costs about the same for one row as for hundreds, so
+        scoring the backlog together keeps the thread's CPU share small.
+        """
+        groups = {}
+        rows = 0
+        while True:
+            features_list, primary, shadow_version = item
+            key = (id(primary), shadow_version)
+            if key not in groups:
+                groups[key] = [[], primary, shadow_version, 0]
+            groups[key][0].extend(features_list)
+            groups[key][3] += 1
+            rows += len(features_list)
+            if rows >= self.max_rows:
+                break
+            try:
+                item = work.get_nowait()
+            except queue.Empty:
+                break
+        return list(groups.values())
+    
+    def _get_candidate(self, shadow_version: str):
+        """The candidate's predictor, loaded on the shadow thread and kept until the version changes"""
+        if self._candidate is None or self._candidate[0] != shadow_version:
+            self._candidate = (shadow_version, self.load_predictor(shadow_version))
+        return self._candidate[1]
+    
+    def _get_queue(self) -> queue.Queue:
+        """Per-process queue and thread; threads do not survive a fork"""
+        with self._lock:
+            if self._queue is None or self._thread_pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.queue_size)
+                self._pending = {}
+                self._candidate = None
+                threading.Thread(target=self._run, args=(self._queue,), name='shadow-scoring', daemon=True).start()
+                self._thread_pid = os.getpid()
+            return self._queue
+    
+    def _stats(self, primary_version: str, shadow_version: str) -> Dict:
+        """This worker's unflushed counts for a version pair (call with the lock held)"""
+        key = (primary_version, shadow_version)
+        if key not in self._pending:
+            self._pending[key] = _empty_stats()
+        return self._pending[key]
+    
+    @staticmethod
+    def _summarize(primary_version: str, shadow_version: str, stats: Dict,
+                   first_seen: float, last_seen: float) -> Dict:
+        rows = stats['rows']
+        transitions = {}
+        for transition, count in stats['transitions'].items():
+            primary_level, shadow_level = transition.split('->')
+            transitions.setdefault(primary_level, {})[shadow_level] = count
+        
+        latency = {}
+        for role, values in stats['latency'].items():
+            p50, p99 = (_percentile_seconds(values['buckets'], q) for q in (0.5, 0.99))
+            latency[role] = {
+                'mean_us_per_row': round(values['seconds'] / values['rows'] * 1e6, 2) if values['rows'] else None,
+                'p50_ms_per_batch': p50 * 1000 if p50 is not None else None,
+                'p99_ms_per_batch': p99 * 1000 if p99 is not None else None
+            }
+        
+        return {
+            'primary_version': primary_version,
+            'shadow_version': shadow_version,
+            'rows': rows,
+            'batches': stats['batches'],
+            'dropped_batches': stats['dropped_batches'],
+            'unscorable_rows': stats['errors'],
+            'risk_level_agreement': round(stats['agree'] / rows, 4) if rows else None,
+            'mean_score_delta': round(stats['sum_delta'] / rows, 5) if rows else None,
+            'mean_abs_score_delta': round(stats['sum_abs_delta'] / rows, 5) if rows else None,
+            'max_abs_score_delta': round(stats['max_abs_delta'], 5),
+            'risk_level_transitions': {
+                level: transitions[level] for level in RISK_LEVELS if level in transitions
+            },
+            'latency': latency,
+            'first_seen': first_seen,
+            'last_seen': last_seen
+        }
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Per-process connection; reopened after fork so workers never share one"""
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            
+            # Autocommit mode, so flush() can open its own BEGIN IMMEDIATE
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False,
+                                         isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS shadow_stats ('
+                '  primary_version TEXT NOT NULL,'
+                '  shadow_version TEXT NOT NULL,'
+                '  stats TEXT NOT NULL,'
+                '  first_seen REAL NOT NULL,'
+                '  last_seen REAL NOT NULL,'
+                '  PRIMARY KEY (primary_version, shadow_version)'
+                ')'
+            )
+            self._pid = os.getpid()
+        return self._conn
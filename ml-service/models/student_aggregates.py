@@ -0,0 +1,329 @@
+"""
+Running per-student feature aggregates fed by raw events
+The backend posts attendance marks, exam results and behavior incidents as
+they happen. Each event updates one fixed-width row of counters per student,
+so a prediction reads a student's current features with one primary-key
+lookup instead of re-aggregating their whole history. Counters and features
+follow the rules of the Node.js feature extractor.
+
+State lives in one SQLite file shared by every gunicorn worker. Besides the
+counters, the last version of each event is kept by key (student and date,
+exam or incident), so a re-sent or corrected event replaces its earlier
+version instead of being counted twice.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Keys per SQL statement; stays under SQLite's bound-parameter limit
+_SQL_CHUNK = 500
+
+ATTENDANCE = 'attendance'
+EXAM = 'exam'
+INCIDENT = 'incident'
+
+# Only these exam results count, as in the Node.js extractor
+COUNTED_EXAM_STATUSES = ('submitted', 'verified')
+
+# Counters per student, in storage order
+COUNTER_COLUMNS = (
+    'days_tracked', 'days_present', 'days_absent',
+    'exams_completed', 'marks_obtained', 'marks_possible',
+    'total_incidents', 'positive_incidents', 'negative_incidents'
+)
+_COUNTER = {name: i for i, name in enumerate(COUNTER_COLUMNS)}
+
+# Event type -> (table, key field, stored value fields)
+_EVENT_TABLES = {
+    ATTENDANCE: ('attendance_events', 'date', ('status',)),
+    EXAM: ('exam_events', 'exam_id', ('marks_obtained', 'total_marks')),
+    INCIDENT: ('incident_events', 'incident_id', ('behavior_type',))
+}
+
+
+def _contribution(event_type: str, values) -> Dict[int, float]:
+    """What one stored event adds to its student's counters"""
+    if values is None:
+        return {}
+    if event_type == ATTENDANCE:
+        status, = values
+        return {
+            _COUNTER['days_tracked']: 1,
+            _COUNTER['days_present']: int(status == 'present'),
+            _COUNTER['days_absent']: int(status == 'absent')
+        }
+    if event_type == EXAM:
+        marks_obtained, total_marks = values
+        return {
+            _COUNTER['exams_completed']: 1,
+            _COUNTER['marks_obtained']: marks_obtained,
+            _COUNTER['marks_possible']: total_marks
+        }
+    behavior_type, = values
+    return {
+        _COUNTER['total_incidents']: 1,
+        _COUNTER['positive_incidents']: int(behavior_type == 'positive'),
+        _COUNTER['negative_incidents']: int(behavior_type == 'negative')
+    }
+
+
+def _number(event: Dict, field: str):
+    """event[field] as a float, or None if absent"""
+    value = event.get(field)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{field} must be a number")
+    return float(value)
+
+
+def parse_event(event) -> Tuple[str, str, str, tuple]:
+    """
+    Validate one event
+    
+    Returns:
+        (event type, student_id, key, stored values or None if the event
+        retracts an earlier one or does not count)
+    
+    Raises:
+        ValueError: The event is malformed
+    """
+    if not isinstance(event, dict):
+        raise ValueError("event must be an object")
+    event_type = event.get('type')
+    if event_type not in _EVENT_TABLES:
+        raise ValueError(f"type must be one of {', '.join(_EVENT_TABLES)}")
+    _, key_field, _ = _EVENT_TABLES[event_type]
+    for field in ('student_id', key_field):
+        if event.get(field) in (None, ''):
+            raise ValueError(f"{field} is required")
+    student_id, key = str(event['student_id']), str(event[key_field])
+    deleted = bool(event.get('deleted'))
+    
+    if event_type == ATTENDANCE:
+        # An unmarked day (null status) isn't tracked
+        status = event.get('status')
+        if status is not None and not isinstance(status, str):
+            raise ValueError("status must be a string or null")
+        values = None if deleted or status is None else (status.lower(),)
+    elif event_type == EXAM:
+        status = event.get('status', 'submitted')
+        marks_obtained, total_marks = _number(event, 'marks_obtained'), _number(event, 'total_marks')
+        if marks_obtained is not None and marks_obtained < 0:
+            raise ValueError("marks_obtained must not be negative")
+        counted = (
+            status in COUNTED_EXAM_STATUSES
+            and marks_obtained is not None
+            and total_marks is not None and total_marks > 0
+        )
+        values = (marks_obtained, total_marks) if counted and not deleted else None
+    else:
+        behavior_type = event.get('behavior_type')
+        if not deleted and not isinstance(behavior_type, str):
+            raise ValueError("behavior_type is required")
+        values = None if deleted else (behavior_type.lower(),)
+    
+    return event_type, student_id, key, values
+
+
+class StudentAggregates:
+    """
+    Per-student counters maintained from attendance, exam and incident
+    events, read back as model features and a data tier
+    """
+    
+    def __init__(self, path: str, tier_minimums: Sequence[Tuple[int, int]] = ((3, 1), (8, 3), (15, 5))):
+        """
+        Args:
+            path: SQLite file shared by every worker
+            tier_minimums: (days tracked, exams completed) needed to reach
+                           data tiers 1, 2 and 3 (Config.TIER_0_MIN_*,
+                           TIER_1_MIN_* and TIER_2_MIN_*)
+        """
+        self.path = path
+        self.tier_minimums = tuple(tuple(minimums) for minimums in tier_minimums)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+    
+    def ingest(self, events: List) -> Dict:
+        """
+        Apply events in order. An event with the same key as an earlier one
+        (same student and date, exam or incident) replaces it; one with
+        "deleted": true retracts it.
+        
+        Returns:
+            {'applied': count, 'rejected': [{'index', 'reason'}, ...]}
+        """
+        parsed = []
+        rejected = []
+        for i, event in enumerate(events):
+            try:
+                parsed.append(parse_event(event))
+            except ValueError as e:
+                rejected.append({'index': i, 'reason': str(e)})
+        
+        with self._lock:
+            conn = self._connection()
+            # One write transaction, so concurrent batches from other
+            # workers can't interleave their read-modify-write
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                deltas = {}
+                for event_type, student_id, key, values in parsed:
+                    table, key_field, value_fields = _EVENT_TABLES[event_type]
+                    previous = conn.execute(
+                        f'SELECT {", ".join(value_fields)} FROM {table} WHERE student_id = ? AND {key_field} = ?',
+                        (student_id, key)
+                    ).fetchone()
+                    if values is None:
+                        conn.execute(f'DELETE FROM {table} WHERE student_id = ? AND {key_field} = ?', (student_id, key))
+                    else:
+                        conn.execute(
+                            f'INSERT OR REPLACE INTO {table} (student_id, {key_field}, {", ".join(value_fields)}) '
+                            f'VALUES (?, ?, {", ".join("?" * len(values))})',
+                            (student_id, key) + values
+                        )
+                    
+                    delta = deltas.setdefault(student_id, [0.0] * len(COUNTER_COLUMNS))
+                    for index, amount in _contribution(event_type, values).items():
+                        delta[index] += amount
+                    for index, amount in _contribution(event_type, previous).items():
+                        delta[index] -= amount
+                
+                now = time.time()
+                conn.executemany(
+                    f'INSERT INTO student_aggregates (student_id, {", ".join(COUNTER_COLUMNS)}, updated_at) '
+                    f'VALUES (?, {", ".join("?" * len(COUNTER_COLUMNS))}, ?) '
+                    f'ON CONFLICT (student_id) DO UPDATE SET '
+                    + ', '.join(f'{name} = {name} + excluded.{name}' for name in COUNTER_COLUMNS)
+                    + ', updated_at = excluded.updated_at',
+                    [(student_id, *delta, now) for student_id, delta in deltas.items()]
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        
+        return {'applied': len(parsed), 'rejected': rejected}
+    
+    def get_many(self, student_ids: Sequence) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """
+        Current features of many students as columns
+        
+        Returns:
+            (feature name -> array aligned with student_ids, mask of the
+            students with any recorded events). Students without events get
+            zero counts, which is data tier 0.
+        """
+        student_ids = [str(student_id) for student_id in student_ids]
+        counters = np.zeros((len(student_ids), len(COUNTER_COLUMNS)), dtype=np.float64)
+        found = np.zeros(len(student_ids), dtype=bool)
+        
+        positions = {}
+        for i, student_id in enumerate(student_ids):
+            positions.setdefault(student_id, []).append(i)
+        unique_ids = list(positions)
+        
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(unique_ids), _SQL_CHUNK):
+                chunk = unique_ids[start:start + _SQL_CHUNK]
+                rows = conn.execute(
+                    f'SELECT student_id, {", ".join(COUNTER_COLUMNS)} FROM student_aggregates '
+                    f'WHERE student_id IN ({",".join("?" * len(chunk))})',
+                    chunk
+                ).fetchall()
+                for student_id, *values in rows:
+                    counters[positions[student_id]] = values
+                    found[positions[student_id]] = True
+        
+        return self._features(counters), found
+    
+    def get_features(self, student_ids: Sequence) -> List[Dict]:
+        """get_many as one /predict-style features dict per student"""
+        columns, _ = self.get_many(student_ids)
+        names = list(columns)
+        return [dict(zip(names, row)) for row in zip(*(columns[name].tolist() for name in names))]
+    
+    def stats(self) -> Dict:
+        """Students with recorded events"""
+        with self._lock:
+            students = self._connection().execute('SELECT COUNT(*) FROM student_aggregates').fetchone()[0]
+        return {'students': students}
+    
+    def _features(self, counters: np.ndarray) -> Dict[str, np.ndarray]:
+        """Model features and data tier from counter rows, for every row at once"""
+        (days_tracked, days_present, _, exams_completed, marks_obtained, marks_possible,
+         total_incidents, _, negative_incidents) = counters.T
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            attendance_rate = np.where(days_tracked > 0, days_present / days_tracked, 0.0)
+            avg_marks_percentage = np.where(marks_possible > 0, marks_obtained / marks_possible * 100, 0.0)
+        # No incidents is a positive signal, not missing data
+        behavior_score = np.where(total_incidents > 0, np.maximum(0.0, 100 - negative_incidents * 10), 100.0)
+        
+        (tier1_days, tier1_exams), (tier2_days, tier2_exams), (tier3_days, tier3_exams) = self.tier_minimums
+        data_tier = np.select(
+            [
+                (days_tracked < tier1_days) | (exams_completed < tier1_exams),
+                (days_tracked >= tier3_days) & (exams_completed >= tier3_exams),
+                (days_tracked >= tier2_days) & (exams_completed >= tier2_exams)
+            ],
+            [0, 3, 2],
+            default=1
+        )
+        
+        # Counters are stored as REAL (marks need it); counts come back as integers
+        counts = np.rint(counters).astype(np.int64)
+        return {
+            'attendance_rate': attendance_rate,
+            'avg_marks_percentage': avg_marks_percentage,
+            'behavior_score': behavior_score,
+            'days_tracked': counts[:, _COUNTER['days_tracked']],
+            'exams_completed': counts[:, _COUNTER['exams_completed']],
+            'days_present': counts[:, _COUNTER['days_present']],
+            'days_absent': counts[:, _COUNTER['days_absent']],
+            'total_incidents': counts[:, _COUNTER['total_incidents']],
+            'positive_incidents': counts[:, _COUNTER['positive_incidents']],
+            'negative_incidents': counts[:, _COUNTER['negative_incidents']],
+            'total_marks_obtained': marks_obtained,
+            'total_marks_possible': marks_possible,
+            'data_tier': data_tier
+        }
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Per-process connection; reopened after fork so workers never share one"""
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            
+            # Autocommit mode, so ingest() can open its own BEGIN IMMEDIATE
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False,
+                                         isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS student_aggregates ('
+                '  student_id TEXT PRIMARY KEY,'
+                + ''.join(f'  {name} REAL NOT NULL DEFAULT 0,' for name in COUNTER_COLUMNS)
+                + '  updated_at REAL NOT NULL'
+                ') WITHOUT ROWID'
+            )
+            for table, key_field, value_fields in _EVENT_TABLES.values():
+                self._conn.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table} ('
+                    f'  student_id TEXT NOT NULL,'
+                    f'  {key_field} TEXT NOT NULL,'
+                    + ''.join(f'  {field},' for field in value_fields)
+                    + f'  PRIMARY KEY (student_id, {key_field})'
+                    ') WITHOUT ROWID'
+                )
+            self._pid = os.getpid()
+        return self._conn
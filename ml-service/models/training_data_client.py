@@ -0,0 +1,265 @@
+"""
+Client for the backend's training-data endpoint
+Pages through /api/dropout/training-data with a cursor over one pooled,
+gzip-enabled HTTP session. Each response is parsed as it streams in, and
+each page is appended to a list of compact columnar frames, so neither the
+whole JSON body nor one dict per student is ever held in memory
+"""
+
+import codecs
+import json
+import os
+from typing import Callable, Dict, Iterator, Optional
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from models.training_store import to_compact_frame
+
+TRAINING_DATA_PATH = '/api/dropout/training-data'
+RECORDS_KEY = 'training_data'
+
+_decoder = json.JSONDecoder()
+
+
+class StreamingObjectParser:
+    """
+    Incremental parser for one top-level JSON object whose RECORDS_KEY
+    array is too large to decode at once
+    Feed it text as it arrives; records of the array go to on_record one by
+    one, every other top-level key is decoded whole into .fields
+    """
+    
+    def __init__(self, on_record: Callable[[Dict], None], records_key: str = RECORDS_KEY):
+        self.on_record = on_record
+        self.records_key = records_key
+        self.fields = {}
+        self._buffer = ''
+        self._pos = 0
+        self._state = 'object_start'
+        self._key = None
+    
+    def feed(self, text: str):
+        """Parse as much of the buffered text as is complete"""
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        while self._step(final=False):
+            pass
+    
+    def close(self):
+        """Parse what is left; raises ValueError if the document is incomplete"""
+        while self._step(final=True):
+            pass
+        if self._state != 'done':
+            raise ValueError(f"Truncated training data response (stopped at {self._state})")
+    
+    def _skip_whitespace(self):
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\r\n':
+            self._pos += 1
+        return self._pos < len(self._buffer)
+    
+    def _expect(self, chars: str) -> Optional[str]:
+        """Consume one of chars if it is next; None if more input is needed"""
+        if not self._skip_whitespace():
+            return None
+        char = self._buffer[self._pos]
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {self._pos}, got {char!r}")
+        self._pos += 1
+        return char
+    
+    def _decode_value(self, final: bool):
+        """(value, True) for the next complete JSON value, or (None, False)"""
+        if not self._skip_whitespace():
+            return None, False
+        try:
+            value, end = _decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return None, False
+        # A number cut by the chunk boundary ("12" of "123", "0" of "0.5")
+        # decodes fine, so only trust it once a delimiter follows
+        if not final and isinstance(value, (int, float)):
+            rest = self._buffer[end:end + 64].lstrip()
+            if not rest or rest[0] not in ',]}':
+                return None, False
+        self._pos = end
+        return value, True
+    
+    def _step(self, final: bool) -> bool:
+        """Advance one token; False when more input is needed or parsing is done"""
+        state = self._state
+        if state == 'object_start':
+            if self._expect('{') is None:
+                return False
+            self._state = 'key_or_end'
+        elif state in ('key_or_end', 'key'):
+            if state == 'key_or_end':
+                if not self._skip_whitespace():
+                    return False
+                if self._buffer[self._pos] == '}':
+                    self._pos += 1
+                    self._state = 'done'
+                    return False
+            key, ok = self._decode_value(final)
+            if not ok:
+                return False
+            self._key = key
+            self._state = 'colon'
+        elif state == 'colon':
+            if self._expect(':') is None:
+                return False
+            self._state = 'value'
+        elif state == 'value':
+            if not self._skip_whitespace():
+                return False
+            if self._key == self.records_key and self._buffer[self._pos] == '[':
+                self._pos += 1
+                self._state = 'record_or_end'
+            else:
+                value, ok = self._decode_value(final)
+                if not ok:
+                    return False
+                self.fields[self._key] = value
+                self._state = 'after_value'
+        elif state in ('record_or_end', 'record'):
+            if state == 'record_or_end':
+                if not self._skip_whitespace():
+                    return False
+                if self._buffer[self._pos] == ']':
+                    self._pos += 1
+                    self._state = 'after_value'
+                    return True
+            record, ok = self._decode_value(final)
+            if not ok:
+                return False
+            self.on_record(record)
+            self._state = 'after_record'
+        elif state == 'after_record':
+            char = self._expect(',]')
+            if char is None:
+                return False
+            self._state = 'record' if char == ',' else 'after_value'
+        elif state == 'after_value':
+            char = self._expect(',}')
+            if char is None:
+                return False
+            self._state = 'key' if char == ',' else 'done'
+        else:
+            return False
+        return True
+
+
+class ColumnarBuffer:
+    """Accumulates records column by column, one compact frame per page"""
+    
+    def __init__(self):
+        self._columns = {}
+        self._rows = 0
+        self._frames = []
+    
+    def append(self, record: Dict):
+        for col in record.keys() - self._columns.keys():
+            self._columns[col] = [None] * self._rows
+        for col, values in self._columns.items():
+            values.append(record.get(col))
+        self._rows += 1
+    
+    def flush(self):
+        """Convert the buffered rows to a compact frame"""
+        if self._rows:
+            self._frames.append(to_compact_frame(pd.DataFrame(self._columns)))
+        self._columns = {}
+        self._rows = 0
+    
+    def to_frame(self) -> pd.DataFrame:
+        self.flush()
+        if not self._frames:
+            return pd.DataFrame()
+        return pd.concat(self._frames, ignore_index=True) if len(self._frames) > 1 else self._frames[0]
+
+
+class TrainingDataClient:
+    """Cursor-paginated, gzip-compressed fetch of training data over a pooled session"""
+    
+    def __init__(self, backend_url: str, token: Optional[str] = None, page_size: int = 5000,
+                 timeout=(5, 60), retries: int = 3, chunk_size: int = 64 * 1024):
+        """
+        Args:
+            backend_url: Backend base URL
+            token: Bearer token (default: BACKEND_API_TOKEN)
+            page_size: Students per request
+            timeout: (connect, read) seconds per request; read is the
+                     longest gap between two chunks, not the whole page
+            retries: Retries per page on connection errors and 502/503/504
+            chunk_size: Bytes read from the socket at a time
+        """
+        self.backend_url = backend_url.rstrip('/')
+        self.page_size = page_size
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=1,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=0.5,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=('GET',)
+            )
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip',
+            'Authorization': f"Bearer {token or os.getenv('BACKEND_API_TOKEN', 'YOUR_TOKEN_HERE')}"
+        })
+    
+    def iter_pages(self, buffer: ColumnarBuffer) -> Iterator[Dict]:
+        """
+        Fetch page after page into buffer until the backend returns no
+        next_cursor. Yields each page's top-level fields (counts, cursor).
+        """
+        cursor = None
+        while True:
+            params = {'limit': self.page_size}
+            if cursor is not None:
+                params['cursor'] = cursor
+            
+            with self.session.get(f'{self.backend_url}{TRAINING_DATA_PATH}', params=params,
+                                  timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                parser = StreamingObjectParser(buffer.append)
+                text = codecs.getincrementaldecoder(response.encoding or 'utf-8')()
+                # iter_content undoes the gzip Content-Encoding as it reads
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    parser.feed(text.decode(chunk))
+                parser.feed(text.decode(b'', final=True))
+                parser.close()
+            buffer.flush()
+            
+            fields = parser.fields
+            if not fields.get('success', True):
+                raise RuntimeError(f"Backend refused training data: {fields.get('error')}")
+            yield fields
+            
+            next_cursor = fields.get('next_cursor')
+            if next_cursor is None or next_cursor == cursor:
+                return
+            cursor = next_cursor
+    
+    def fetch(self) -> pd.DataFrame:
+        """All training data as one DataFrame in the training store's compact dtypes"""
+        buffer = ColumnarBuffer()
+        for _ in self.iter_pages(buffer):
+            pass
+        return buffer.to_frame()
+    
+    def close(self):
+        self.session.close()
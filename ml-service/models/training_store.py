@@ -0,0 +1,270 @@
+"""
+Columnar, append-only store for training data
+Each ingestion writes one partition directory under
+<root>/ingest_date=YYYY-MM-DD/ holding one .npy file per column in a compact
+dtype, so new outcomes are appended instead of rewriting the whole dataset
+and the loader memory-maps only the columns it needs
+"""
+
+import json
+import os
+import shutil
+import uuid
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from models.feature_schema import COUNT, FEATURE_SCHEMA, FLOAT, LABEL_COLUMN
+
+TRAINING_STORE_DIR = 'models/training_store'
+
+# Trees split on float32 thresholds, so float32 features lose nothing the
+# model could use. Counts are downcast to the smallest integer that fits.
+FLOAT_COLUMNS = FEATURE_SCHEMA.columns_of(FLOAT)
+COUNT_COLUMNS = FEATURE_SCHEMA.columns_of(COUNT)
+DATE_COLUMNS = ('dropout_date',)
+
+SCHEMA_FILENAME = '_schema.json'
+ROW_HASH_COLUMN = '_row_hash'
+# Per key column: each key's latest stored row hash, sorted by key
+LATEST_INDEX_FILENAME = '_latest_by_{key}.npz'
+
+
+def to_compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Copy of df with the store's column dtypes"""
+    compact = {}
+    for col in df.columns:
+        values = df[col]
+        if col in FLOAT_COLUMNS:
+            compact[col] = pd.to_numeric(values, errors='coerce').astype(np.float32)
+        elif col in COUNT_COLUMNS or col == LABEL_COLUMN:
+            numeric = pd.to_numeric(values, errors='coerce')
+            if numeric.isna().any():
+                compact[col] = numeric.astype(np.float32)
+            else:
+                compact[col] = pd.to_numeric(numeric.astype(np.int64), downcast='integer')
+        elif col in DATE_COLUMNS or pd.api.types.is_datetime64_any_dtype(values):
+            dates = pd.to_datetime(values, errors='coerce', utc=True).dt.tz_localize(None)
+            compact[col] = dates.astype('datetime64[ms]')
+        elif pd.api.types.is_bool_dtype(values):
+            compact[col] = values.astype(np.bool_)
+        elif pd.api.types.is_numeric_dtype(values):
+            compact[col] = values
+        else:
+            # Anything else (IDs, names, reasons) is kept as fixed-width text
+            compact[col] = values.map(lambda v: '' if v is None or v != v else str(v))
+    return pd.DataFrame(compact, index=df.index)
+
+
+class TrainingDataStore:
+    """
+    Partitioned training data on disk
+    Rows are never rewritten; a row identical to the latest stored row for
+    its key is skipped, and load(latest_by=...) keeps the newest row per key
+    """
+    
+    def __init__(self, root: str = TRAINING_STORE_DIR):
+        self.root = root
+    
+    def append(self, df: pd.DataFrame, ingest_date: Optional[date] = None, key: str = 'student_id') -> int:
+        """
+        Write the rows of df that change their key's data as a new partition
+        
+        Args:
+            df: Training rows (any subset of the known columns, plus extras)
+            ingest_date: Partition date (default: today)
+            key: Column naming whose row it is. A row identical to the
+                 latest stored row for its key is skipped; one that matches
+                 only an older row (a label going 1 -> 0 -> 1) is written, so
+                 load(latest_by=key) sees it. Rows of a df without the
+                 column are all written.
+        
+        Returns:
+            Number of rows written
+        """
+        if df.empty:
+            return 0
+        
+        compact = to_compact_frame(df.reset_index(drop=True))
+        row_hashes = pd.util.hash_pandas_object(compact, index=False).to_numpy(np.uint64)
+        
+        latest = None
+        if key in compact:
+            keys = compact[key].to_numpy().astype(str)
+            keep, latest = self._changed_rows(key, keys, row_hashes)
+            if not keep.any():
+                return 0
+            compact = compact[keep]
+            row_hashes = row_hashes[keep]
+        
+        ingest_date = ingest_date or date.today()
+        partition_dir = os.path.join(self.root, f'ingest_date={ingest_date.isoformat()}')
+        part_name = f"part-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(partition_dir, exist_ok=True)
+        
+        # Written under a dot-name and renamed, so readers never see half a part
+        tmp_dir = os.path.join(partition_dir, f'.{part_name}')
+        os.makedirs(tmp_dir)
+        try:
+            columns = {}
+            for col in compact.columns:
+                values = compact[col].to_numpy()
+                if values.dtype == object:
+                    values = values.astype(str)
+                np.save(os.path.join(tmp_dir, f'{col}.npy'), values, allow_pickle=False)
+                columns[col] = values.dtype.str
+            np.save(os.path.join(tmp_dir, f'{ROW_HASH_COLUMN}.npy'), row_hashes)
+            
+            with open(os.path.join(tmp_dir, SCHEMA_FILENAME), 'w') as f:
+                json.dump({
+                    'rows': int(len(compact)),
+                    'columns': columns,
+                    'ingested_at': datetime.now().isoformat()
+                }, f, indent=2)
+            os.rename(tmp_dir, os.path.join(partition_dir, part_name))
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        
+        if latest is not None:
+            self._write_latest_index(key, *latest)
+        return int(len(compact))
+    
+    def load(self, columns: Optional[Sequence[str]] = None, since: Optional[date] = None,
+             latest_by: Optional[str] = None) -> pd.DataFrame:
+        """
+        Read the store as one DataFrame, oldest partition first
+        
+        Args:
+            columns: Columns to read (default: all). Parts written without a
+                     column get NaN for it.
+            since: Only partitions ingested on or after this date
+            latest_by: Key column (e.g. student_id); keep only the most
+                       recently ingested row for each key
+        
+        Returns:
+            DataFrame in the store's compact dtypes
+        """
+        frames = []
+        for part_dir in self.parts(since):
+            with open(os.path.join(part_dir, SCHEMA_FILENAME), 'r') as f:
+                schema = json.load(f)
+            
+            wanted = list(schema['columns']) if columns is None else list(columns)
+            if latest_by and latest_by not in wanted:
+                wanted.append(latest_by)
+            frames.append(pd.DataFrame({
+                col: np.load(os.path.join(part_dir, f'{col}.npy'), mmap_mode='r')
+                for col in wanted if col in schema['columns']
+            }).reindex(columns=wanted))
+        
+        if not frames:
+            return pd.DataFrame(columns=list(columns or []))
+        
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0].copy()
+        if latest_by:
+            df = df.drop_duplicates(subset=latest_by, keep='last').reset_index(drop=True)
+            if columns is not None and latest_by not in columns:
+                df = df.drop(columns=latest_by)
+        return df
+    
+    def parts(self, since: Optional[date] = None) -> List[str]:
+        """Finished part directories in ingestion order"""
+        if not os.path.isdir(self.root):
+            return []
+        
+        part_dirs = []
+        for partition in sorted(os.listdir(self.root)):
+            if not partition.startswith('ingest_date='):
+                continue
+            if since is not None and partition.split('=', 1)[1] < since.isoformat():
+                continue
+            partition_dir = os.path.join(self.root, partition)
+            part_dirs.extend(
+                os.path.join(partition_dir, name)
+                for name in sorted(os.listdir(partition_dir))
+                if name.startswith('part-')
+            )
+        return part_dirs
+    
+    def stats(self) -> Dict:
+        """Partition, part and row counts and bytes on disk"""
+        rows = 0
+        size = 0
+        part_dirs = self.parts()
+        for part_dir in part_dirs:
+            with open(os.path.join(part_dir, SCHEMA_FILENAME), 'r') as f:
+                rows += json.load(f)['rows']
+            size += sum(entry.stat().st_size for entry in os.scandir(part_dir))
+        return {
+            'partitions': len({os.path.dirname(part_dir) for part_dir in part_dirs}),
+            'parts': len(part_dirs),
+            'rows': rows,
+            'bytes': size
+        }
+    
+    def _changed_rows(self, key: str, keys: np.ndarray, row_hashes: np.ndarray):
+        """
+        Mask of the rows that differ from the previous row for their key (the
+        one before it in this batch, else the latest stored one), and the
+        (keys, hashes) index with this batch's rows as the latest
+        """
+        stored_keys, stored_hashes = self._read_latest_index(key)
+        
+        # Sorted by key, stably, so each row follows the batch's previous row for its key
+        order = np.argsort(keys, kind='stable')
+        keys_sorted = keys[order]
+        hashes_sorted = row_hashes[order]
+        follows_same_key = np.zeros(len(keys), dtype=bool)
+        follows_same_key[1:] = keys_sorted[1:] == keys_sorted[:-1]
+        unchanged = np.zeros(len(keys), dtype=bool)
+        unchanged[1:] = follows_same_key[1:] & (hashes_sorted[1:] == hashes_sorted[:-1])
+        
+        if len(stored_keys):
+            pos = np.minimum(np.searchsorted(stored_keys, keys_sorted), len(stored_keys) - 1)
+            matches_stored = (stored_keys[pos] == keys_sorted) & (stored_hashes[pos] == hashes_sorted)
+            unchanged |= ~follows_same_key & matches_stored
+        
+        keep = np.empty(len(keys), dtype=bool)
+        keep[order] = ~unchanged
+        return keep, _merge_latest(stored_keys, stored_hashes, keys_sorted, hashes_sorted)
+    
+    def _read_latest_index(self, key: str):
+        """Sorted (keys, latest row hashes); rebuilt from the parts if missing"""
+        path = os.path.join(self.root, LATEST_INDEX_FILENAME.format(key=key))
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as index:
+                return index['keys'], index['hashes']
+        
+        # Stores written before the index: the last row per key wins
+        keys = np.empty(0, dtype=str)
+        hashes = np.empty(0, dtype=np.uint64)
+        for part_dir in self.parts():
+            key_path = os.path.join(part_dir, f'{key}.npy')
+            if os.path.exists(key_path):
+                part_keys = np.load(key_path).astype(str)
+                order = np.argsort(part_keys, kind='stable')
+                part_hashes = np.load(os.path.join(part_dir, f'{ROW_HASH_COLUMN}.npy'))
+                keys, hashes = _merge_latest(keys, hashes, part_keys[order], part_hashes[order])
+        return keys, hashes
+    
+    def _write_latest_index(self, key: str, keys: np.ndarray, hashes: np.ndarray):
+        """Replace the index in one step; a reader never sees half of it"""
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f'.{uuid.uuid4().hex}.npz')
+        np.savez(tmp_path, keys=keys, hashes=hashes)
+        os.replace(tmp_path, os.path.join(self.root, LATEST_INDEX_FILENAME.format(key=key)))
+
+
+def _merge_latest(keys: np.ndarray, hashes: np.ndarray, new_keys: np.ndarray, new_hashes: np.ndarray):
+    """
+    Sorted (keys, hashes) with new_keys' entries replacing older ones; within
+    new_keys (sorted stably), the last row per key wins
+    """
+    all_keys = np.concatenate([keys, new_keys])
+    all_hashes = np.concatenate([hashes, new_hashes])
+    # Reversed, np.unique's first occurrence is the newest entry per key
+    unique_keys, last = np.unique(all_keys[::-1], return_index=True)
+    return unique_keys, all_hashes[::-1][last]
@@ -33,6 +33,18 @@ def save_performance_to_database():
         
         logger.info(f"Loaded model metadata: {metadata['model_version']}")
         
+        # Metadata written before the shared schema nested the metrics
+        # under 'metrics' and spelled out the confusion matrix keys
+        metrics = metadata.get('metrics', metadata)
+        data_source = metadata.get('data_source', metadata.get('training_mode', 'unknown'))
+        cm = metadata['confusion_matrix']
+        confusion_matrix = {
+            'true_negatives': cm.get('tn', cm.get('true_negatives', 0)),
+            'false_positives': cm.get('fp', cm.get('false_positives', 0)),
+            'false_negatives': cm.get('fn', cm.get('false_negatives', 0)),
+            'true_positives': cm.get('tp', cm.get('true_positives', 0))
+        }
+        
         # Get backend URL and auth token from environment
         backend_url = os.getenv('BACKEND_URL', 'http://localhost:5000')
         auth_token = os.getenv('ADMIN_AUTH_TOKEN')
@@ -46,13 +58,13 @@ def save_performance_to_database():
             'modelVersion': metadata['model_version'],
             'trainingSamples': metadata['training_samples'],
             'testSamples': metadata['test_samples'],
-            'accuracy': metadata['metrics']['accuracy'],
-            'precision': metadata['metrics']['precision'],
-            'recall': metadata['metrics']['recall'],
-            'f1Score': metadata['metrics']['f1_score'],
-            'confusionMatrix': metadata['confusion_matrix'],
+            'accuracy': metrics['accuracy'],
+            'precision': metrics['precision'],
+            'recall': metrics['recall'],
+            'f1Score': metrics['f1_score'],
+            'confusionMatrix': confusion_matrix,
             'featureImportance': metadata['feature_importance'],
-            'notes': f"Automated training - {metadata['data_source']}"
+            'notes': f"Automated training - {data_source}"
         }
         
         # Send to backend API
@@ -74,15 +86,15 @@ def save_performance_to_database():
         
         if response.status_code == 200:
             logger.info("✅ Performance metrics saved to database successfully!")
-            logger.info(f"   Accuracy: {metadata['metrics']['accuracy']:.4f}")
-            logger.info(f"   F1-Score: {metadata['metrics']['f1_score']:.4f}")
+            logger.info(f"   Accuracy: {metrics['accuracy']:.4f}")
+            logger.info(f"   F1-Score: {metrics['f1_score']:.4f}")
             return True
         else:
             logger.error(f"❌ Failed to save metrics to database")
             logger.error(f"   Status: {response.status_code}")
             logger.error(f"   Response: {response.text}")
             return False
-            
+    
     except FileNotFoundError as e:
         logger.error(f"File not found: {e}")
         return False
@@ -0,0 +1,1414 @@
+"""
+In-process tests for the ML models package
+Run with pytest, or directly: python test_ml_models.py
+"""
+
+import gzip
+import json
+import multiprocessing
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import joblib
+import msgpack
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from generate_and_train import (
+    calculate_dropout_probability,
+    calculate_dropout_probability_batch,
+    generate_synthetic_data,
+    generate_synthetic_data_fast,
+    iter_synthetic_data
+)
+from config import Config
+from models.explanation_cache import ExplanationCache
+from models.explanation_jobs import ExplanationJobs
+from models.feature_schema import FEATURE_COLUMNS, FEATURE_SCHEMA, validate_training_frame
+from models.gemini_explainer import GeminiExplainer
+from models.ml_predictor import (
+    CompiledForest,
+    MLPredictor,
+    parse_window_time,
+    train_new_model,
+    update_model_incrementally
+)
+import models.metrics as metrics
+from models.metrics import record_cache_lookups, render_metrics, time_stage, time_startup_phase
+from models.prediction_cache import PredictionCache, canonical_feature_vector
+from models.prediction_coalescer import PredictionCoalescer
+from models.model_registry import (
+    FOREST_FILENAME,
+    normalize_metadata,
+    promote_shadow,
+    publish_model,
+    read_current_history,
+    read_current_version,
+    read_shadow_version,
+    rollback,
+    set_current_version,
+    verify_version,
+    version_paths
+)
+from models.retrain_jobs import RetrainJobRunner
+from models.shadow_scoring import ShadowScorer
+from models.student_aggregates import StudentAggregates
+from models.training_data_client import StreamingObjectParser, TrainingDataClient
+from models.training_store import TrainingDataStore
+from models.tuning import SEARCH_SPACE, successive_halving_search
+from models.risk_calculator import DEFAULT_RISK_TABLES, RiskCalculator, load_risk_tables
+
+_model_path = None
+
+
+def _get_model_path():
+    """Train a small forest once and save it to a temporary file"""
+    global _model_path
+    if _model_path is None:
+        df = generate_synthetic_data(n_samples=1000, random_state=7)
+        model = RandomForestClassifier(
+            n_estimators=25,
+            max_depth=10,
+            min_samples_split=10,
+            min_samples_leaf=5,
+            random_state=42,
+            class_weight='balanced'
+        )
+        model.fit(df[FEATURE_COLUMNS], df['dropped_out'])
+        
+        _model_path = os.path.join(tempfile.mkdtemp(), 'dropout_model.pkl')
+        joblib.dump(model, _model_path)
+    return _model_path
+
+
+def _sample_features(n_samples, random_state=11):
+    """Synthetic feature dicts with a valid data tier"""
+    df = generate_synthetic_data(n_samples=n_samples, random_state=random_state)
+    rows = df[FEATURE_COLUMNS].to_dict('records')
+    for row in rows:
+        row['data_tier'] = 2
+    return rows
+
+
+def _wait_for_job(runner, job_id, timeout=60):
+    """Poll a background job until it finishes"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = runner.get(job_id)
+        if status['status'] in ('succeeded', 'failed'):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish in {timeout}s")
+
+
+def _ks_statistic(a, b):
+    """Two-sample Kolmogorov-Smirnov statistic (max distance between ECDFs)"""
+    a, b = np.sort(a), np.sort(b)
+    grid = np.concatenate([a, b])
+    cdf_a = np.searchsorted(a, grid, side='right') / len(a)
+    cdf_b = np.searchsorted(b, grid, side='right') / len(b)
+    return np.abs(cdf_a - cdf_b).max()
+
+
+def test_compiled_forest_matches_sklearn():
+    """CompiledForest probabilities match sklearn's predict_proba"""
+    predictor = MLPredictor(_get_model_path())
+    features = _sample_features(500)
+    X = pd.DataFrame(features, columns=FEATURE_COLUMNS)
+    
+    expected = predictor.model.predict_proba(X)[:, 1]
+    actual = CompiledForest(predictor.model).predict_proba(X.to_numpy())
+    
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-12)
+
+
+def test_compiled_engine_predictions_match():
+    """predict and predict_many agree across engines"""
+    sklearn_predictor = MLPredictor(_get_model_path(), engine='sklearn')
+    compiled_predictor = MLPredictor(_get_model_path(), engine='compiled')
+    features = _sample_features(200)
+    
+    assert sklearn_predictor.predict_many(features) == compiled_predictor.predict_many(features)
+    for row in features[:20]:
+        assert sklearn_predictor.predict(row) == compiled_predictor.predict(row)
+
+
+def test_predict_many_matches_predict():
+    """Batch scoring returns the same results as one-at-a-time scoring"""
+    predictor = MLPredictor(_get_model_path())
+    features = _sample_features(50)
+    features.append({'attendance_rate': 'not a number'})
+    
+    results = predictor.predict_many(features, include_contributions=True)
+    
+    assert len(results) == len(features)
+    assert 'error' in results[-1]
+    for row, result in zip(features[:-1], results[:-1]):
+        top_factors = result.pop('top_factors')
+        assert result == predictor.predict(row)
+        assert [factor['feature'] for factor in top_factors] == sorted(
+            result['feature_contributions'],
+            key=lambda feature: -result['feature_contributions'][feature]
+        )[:3]
+
+
+def test_feature_schema_masks_invalid_rows_with_reasons():
+    """Rows and columns validate alike; bad rows are masked with reasons and answered with 400s"""
+    import app as service
+    
+    features = _sample_features(20)
+    valid_row = dict(features[0])
+    features[1]['days_absent'] = features[1]['days_tracked'] - features[1]['days_present'] + 1
+    features[2]['attendance_rate'] = 1.5
+    features[3]['exams_completed'] = 2.5
+    features[4]['behavior_score'] = 'good'
+    features[5] = 'not an object'
+    del features[6]['behavior_score']
+    features[7]['avg_marks_percentage'] = None
+    
+    X, invalid, reasons = FEATURE_SCHEMA.extract_rows(features)
+    
+    assert invalid.tolist() == [False] + [True] * 5 + [False] * 14
+    assert reasons[1] == (f"days_present + days_absent ({features[1]['days_tracked'] + 1}) "
+                          f"exceeds days_tracked ({features[1]['days_tracked']})")
+    assert reasons[2] == 'attendance_rate must be between 0 and 1 (got 1.5)'
+    assert reasons[3] == 'exams_completed must be a whole number (got 2.5)'
+    assert reasons[4].startswith('behavior_score: could not convert')
+    assert reasons[5] == 'features must be an object'
+    # Missing and null values take the column default
+    assert X[6, FEATURE_COLUMNS.index('behavior_score')] == 0
+    assert X[7, FEATURE_COLUMNS.index('avg_marks_percentage')] == 0
+    np.testing.assert_array_equal(X[0], [valid_row[col] for col in FEATURE_COLUMNS])
+    
+    rows = [row if isinstance(row, dict) else {} for row in features]
+    columns = {col: [row.get(col) for row in rows] for col in FEATURE_COLUMNS}
+    X_columns, invalid_columns, reasons_columns = FEATURE_SCHEMA.extract_columns(columns, len(rows))
+    valid = ~invalid
+    np.testing.assert_array_equal(X_columns[valid], X[valid])
+    assert reasons_columns[:5] == reasons[:5] and not invalid_columns[5]
+    
+    predictor = MLPredictor(_get_model_path())
+    results = predictor.predict_many(features)
+    assert [result.get('error') for result in results] == reasons
+    
+    # Training drops the same rows, plus rows without a 0/1 outcome
+    df = pd.DataFrame(rows)
+    df['dropped_out'] = [0, 1] * 10
+    df.loc[8, 'dropped_out'] = 2
+    clean, rejected = validate_training_frame(df)
+    assert sorted(rejected) == [1, 2, 3, 4, 8]
+    assert len(clean) == 15 and clean['exams_completed'].dtype == np.int64
+    
+    saved = {name: getattr(service, name) for name in ('ml_predictor', 'prediction_cache', '_last_model_check')}
+    try:
+        service.ml_predictor = predictor
+        service.prediction_cache = None
+        service._last_model_check = float('inf')
+        client = service.app.test_client()
+        
+        response = client.post('/predict', json={'features': dict(features[2], data_tier=2)})
+        assert response.status_code == 400
+        assert response.get_json()['message'] == reasons[2]
+        assert client.post('/predict', json={'features': [1, 2]}).status_code == 400
+        
+        response = client.post('/retrain', json={
+            'training_data': [dict(row, dropped_out=i % 2) for i, row in enumerate(rows[1:13])]
+        })
+        assert response.status_code == 400
+        assert response.get_json()['rejected_rows'] == 4
+    finally:
+        for name, value in saved.items():
+            setattr(service, name, value)
+
+
+def test_null_features_are_explained_with_schema_defaults():
+    """Explanations read features through the schema, so null, missing and unreadable values never crash them"""
+    import app as service
+    
+    features = _sample_features(3)
+    features[0]['avg_marks_percentage'] = None
+    del features[1]['exams_completed']
+    features[2]['attendance_rate'] = '0.9'
+    normalized = FEATURE_SCHEMA.normalize(features[0])
+    assert list(normalized) == FEATURE_COLUMNS and normalized['avg_marks_percentage'] == 0
+    
+    explainer = GeminiExplainer.__new__(GeminiExplainer)
+    explainer.model = _FakeGeminiModel()
+    explainer.request_options = None
+    items = [({'features': row}, {'risk_score': 0.7, 'risk_level': 'high'}) for row in features]
+    assert '- Average Marks: 0.0%' in explainer._build_prompt(*items[0])
+    assert '- Attendance Rate: 90.0%' in explainer._build_student_block(*items[2])
+    assert len(explainer.generate_explanations_batch(items)) == 3
+    fallback = explainer._fallback_explanation(*items[1], 'offline')
+    assert 'Ensure regular exam participation' not in fallback['recommendations']
+    
+    saved = {name: getattr(service, name) for name in (
+        'ml_predictor', 'prediction_cache', 'gemini_explainer', 'explanation_cache', '_last_model_check'
+    )}
+    try:
+        service.ml_predictor = MLPredictor(_get_model_path())
+        service.prediction_cache = None
+        service.explanation_cache = None
+        service._last_model_check = float('inf')
+        client = service.app.test_client()
+        
+        # Rule-based fallback without Gemini, then batched Gemini prompts
+        for explainer_or_none in (None, explainer):
+            service.gemini_explainer = explainer_or_none
+            response = client.post('/predict', json={'features': dict(features[0], data_tier=2)})
+            assert response.status_code == 200
+            assert response.get_json()['explanation']
+            response = client.post('/batch-predict', json={
+                'students': [{'student_id': str(i), 'features': row} for i, row in enumerate(features)],
+                'explain': True
+            })
+            assert response.status_code == 200
+            assert all(result['explanation'] for result in response.get_json()['predictions'])
+    finally:
+        for name, value in saved.items():
+            setattr(service, name, value)
+
+
+def test_explanations_raise_no_issue_for_omitted_features():
+    """Features a request leaves out are scored at the schema default but never explained as problems"""
+    import app as service
+    
+    features = _sample_features(1)[0]
+    del features['behavior_score']
+    del features['attendance_rate']
+    
+    explainer = GeminiExplainer.__new__(GeminiExplainer)
+    item = ({'features': features}, {'risk_score': 0.7, 'risk_level': 'high'})
+    prompt = explainer._build_prompt(*item)
+    assert '- Behavior Score: 100.0/100' in prompt and '- Attendance Rate: 0.0%' in prompt
+    for recommendations in (
+        explainer._fallback_explanation(*item, 'offline')['recommendations'],
+        service._generate_fallback_explanation(features, {'risk_level': 'high'})['recommendations']
+    ):
+        assert not [text for text in recommendations if 'attendance' in text or 'behavior' in text]
+    
+    saved = {name: getattr(service, name) for name in ('ml_predictor', 'prediction_cache', 'gemini_explainer', '_last_model_check')}
+    try:
+        service.ml_predictor = MLPredictor(_get_model_path())
+        service.prediction_cache = None
+        service.gemini_explainer = None
+        service._last_model_check = float('inf')
+        response = service.app.test_client().post('/predict', json={'features': dict(features, data_tier=2)})
+        assert response.status_code == 200
+        assert not [text for text in response.get_json()['recommendations'] if 'attendance' in text or 'behavior' in text]
+    finally:
+        for name, value in saved.items():
+            setattr(service, name, value)
+
+
+def test_feature_contributions_decompose_prediction():
+    """Path contributions plus bias add up to the forest's probability"""
+    predictor = MLPredictor(_get_model_path())
+    features = _sample_features(300)
+    X = pd.DataFrame(features, columns=FEATURE_COLUMNS)
+    
+    bias, contributions = predictor.get_feature_contributions(X.to_numpy())
+    
+    np.testing.assert_allclose(
+        bias + contributions.sum(axis=1),
+        predictor.model.predict_proba(X)[:, 1],
+        rtol=0,
+        atol=1e-9
+    )
+    # Unlike global importances, factors differ from student to student
+    assert len({tuple(np.argsort(-row)[:3]) for row in contributions}) > 1
+
+
+
+def test_risk_batch_matches_scalar():
+    """calculate_risk_batch matches calculate_risk row for row, including edges"""
+    calculator = RiskCalculator()
+    rng = np.random.default_rng(3)
+    n_rows = 2000
+    columns = {
+        'attendance_rate': rng.uniform(0, 1, n_rows),
+        'avg_marks_percentage': rng.uniform(0, 100, n_rows),
+        'behavior_score': rng.uniform(0, 100, n_rows),
+        'data_tier': rng.integers(-1, 5, n_rows)
+    }
+    # Exact breakpoint values and NaN take the same branch as the if/elif ladder
+    columns['attendance_rate'][:6] = [0.60, 0.75, 0.80, 0.90, 1.0, np.nan]
+    columns['avg_marks_percentage'][:6] = [40, 50, 60, 75, 100, np.nan]
+    columns['behavior_score'][:6] = [40, 60, 80, 0, 100, np.nan]
+    
+    batch = calculator.calculate_risk_batch(pd.DataFrame(columns))
+    
+    for i in range(n_rows):
+        expected = calculator.calculate_risk({name: values[i] for name, values in columns.items()})
+        assert batch['risk_score'][i] == expected['risk_score']
+        assert batch['risk_level'][i] == expected['risk_level']
+        assert batch['confidence'][i] == expected['confidence']
+        for component, score in expected['component_scores'].items():
+            assert batch[component][i] == score
+
+
+def test_risk_tables_validated_on_load():
+    """RiskCalculator() loads RISK_TABLES_PATH, and a table that can't be looked up fails the load"""
+    path = os.path.join(tempfile.mkdtemp(), 'risk_tables.json')
+    saved_path = Config.RISK_TABLES_PATH
+    try:
+        Config.RISK_TABLES_PATH = path
+        with open(path, 'w') as f:
+            json.dump({'behavior': {'breakpoints': [50], 'risks': [0.8, 0.2]}}, f)
+        calculator = RiskCalculator()
+        assert calculator.calculate_risk({'behavior_score': 49})['component_scores']['behavior_risk'] == 0.8
+        assert calculator.tables['attendance'] == DEFAULT_RISK_TABLES['attendance']
+        
+        for overrides, problem in (
+            ({'academic': {'breakpoints': [40, 75, 60], 'risks': [0.9, 0.5, 0.3, 0.1]}}, 'ascending order'),
+            ({'academic': {'breakpoints': [40, 60], 'risks': [0.9, 0.1]}}, 'one more risk than breakpoints'),
+            ({'risk_levels': {'breakpoints': [0.5], 'levels': ['low']}}, 'one more level than breakpoints'),
+            ({'weights': {'attendance': 0.5, 'academic': 0.5, 'behavior': 0.5}}, 'sum to 1.0')
+        ):
+            with open(path, 'w') as f:
+                json.dump(overrides, f)
+            try:
+                load_risk_tables(path)
+                raise AssertionError(f"Loaded invalid risk tables: {overrides}")
+            except ValueError as e:
+                assert path in str(e) and problem in str(e)
+    finally:
+        Config.RISK_TABLES_PATH = saved_path
+
+
+
+def test_dropout_probability_batch_matches_scalar():
+    """Vectorized dropout probability rules match the per-row function"""
+    df = generate_synthetic_data(n_samples=500, random_state=5)
+    args = [
+        df['attendance_rate'].to_numpy(),
+        df['avg_marks_percentage'].to_numpy(),
+        df['behavior_score'].to_numpy(),
+        df['days_tracked'].to_numpy(),
+        df['exams_completed'].to_numpy()
+    ]
+    
+    batch = calculate_dropout_probability_batch(*args)
+    
+    for i in range(len(df)):
+        assert batch[i] == calculate_dropout_probability(*(column[i] for column in args))
+
+
+def test_fast_generator_is_statistically_equivalent():
+    """Columnar generator matches the legacy generator's distributions"""
+    legacy = generate_synthetic_data(n_samples=20000, random_state=1)
+    fast = generate_synthetic_data_fast(n_samples=20000, random_state=1, chunk_size=3000)
+    
+    assert list(fast.columns) == list(legacy.columns)
+    assert len(fast) == len(legacy)
+    for column in legacy.columns:
+        tolerance = 0.05 * legacy[column].std() + 1e-3
+        assert abs(fast[column].mean() - legacy[column].mean()) < tolerance, column
+        assert abs(fast[column].std() - legacy[column].std()) < tolerance, column
+        assert _ks_statistic(fast[column], legacy[column]) < 0.03, column
+    
+    # Chunks are drawn from one seeded generator, so output is reproducible
+    chunks = list(iter_synthetic_data(n_samples=20000, chunk_size=3000, random_state=1))
+    assert [len(chunk) for chunk in chunks] == [3000] * 6 + [2000]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), fast)
+
+
+
+class _FakeGeminiModel:
+    """Answers batched prompts for every student except index 1"""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def generate_content(self, prompt, request_options=None):
+        self.calls += 1
+        n_students = prompt.count('STUDENT ')
+        entries = [
+            {'index': i, 'explanation': f'Explained {i}', 'recommendations': ['R'], 'priority_actions': ['P']}
+            for i in range(n_students) if i != 1
+        ]
+        
+        class Response:
+            text = '```json\n' + json.dumps(entries) + '\n```'
+        return Response()
+
+
+def test_batched_explanations_pack_and_fall_back():
+    """Batched explanations share Gemini calls and fall back per student"""
+    explainer = GeminiExplainer.__new__(GeminiExplainer)
+    explainer.model = _FakeGeminiModel()
+    items = [
+        (
+            {'features': row, 'feature_importance': {'attendance_rate': 0.3, 'behavior_score': 0.2}},
+            {'risk_score': 0.7, 'risk_level': 'high'}
+        )
+        for row in _sample_features(40)
+    ]
+    # A student whose prompt section can't be built falls back on their own
+    items[5][1]['risk_score'] = None
+    
+    results = explainer.generate_explanations_batch(items, token_budget=3000)
+    
+    assert 1 < explainer.model.calls < len(items)
+    assert len(results) == len(items)
+    assert results[0] == {
+        'success': True,
+        'explanation': 'Explained 0',
+        'recommendations': ['R'],
+        'priority_actions': ['P']
+    }
+    assert results[1]['fallback'] is True
+    assert results[5]['error'].startswith('Gemini API unavailable: Could not build prompt')
+    assert sum(1 for result in results if result.get('fallback')) == explainer.model.calls + 1
+
+
+
+def test_explanation_cache_lru_ttl_and_invalidation():
+    """Explanation cache buckets keys, evicts LRU, persists and invalidates by version"""
+    path = os.path.join(tempfile.mkdtemp(), 'explanations.db')
+    cache = ExplanationCache(path, max_entries=2)
+    features = _sample_features(1)[0]
+    importance = {'attendance_rate': 0.3, 'days_absent': 0.2}
+    
+    features['attendance_rate'] = 0.81
+    key = cache.make_key('v1', 'high', features, importance)
+    assert cache.make_key('v1', 'high', dict(features, attendance_rate=0.84), importance) == key
+    assert cache.make_key('v1', 'high', dict(features, attendance_rate=0.86), importance) != key
+    assert cache.make_key('v2', 'high', features, importance) != key
+    assert cache.make_key('v1', 'low', features, importance) != key
+    
+    assert cache.get(key) is None
+    cache.put(key, 'v1', {'explanation': 'cached'})
+    cache.put('other-1', 'v1', {'explanation': 'other'})
+    assert cache.get(key) == {'explanation': 'cached'}
+    cache.put('other-2', 'v2', {'explanation': 'newest'})
+    
+    # 'other-1' was least recently used; a fresh instance sees the same file
+    reopened = ExplanationCache(path, max_entries=2)
+    assert reopened.get('other-1') is None
+    assert reopened.get(key) == {'explanation': 'cached'}
+    
+    reopened.invalidate(keep_version='v2')
+    assert reopened.get(key) is None
+    assert reopened.get('other-2') == {'explanation': 'newest'}
+    
+    expired = ExplanationCache(path, ttl_seconds=-1)
+    assert expired.get('other-2') is None
+    assert cache.stats()['hits'] == 1
+
+
+def test_prediction_cache_keys_lru_and_invalidation():
+    """Prediction cache keys on exact feature vectors, evicts LRU and invalidates by version"""
+    path = os.path.join(tempfile.mkdtemp(), 'predictions.db')
+    cache = PredictionCache(path, max_entries=2)
+    features = _sample_features(3)
+    
+    vector = canonical_feature_vector(features[0], FEATURE_COLUMNS)
+    assert canonical_feature_vector(dict(reversed(list(features[0].items()))), FEATURE_COLUMNS) == vector
+    assert canonical_feature_vector(dict(features[0], attendance_rate='x'), FEATURE_COLUMNS) is None
+    assert canonical_feature_vector({}, FEATURE_COLUMNS) == canonical_feature_vector(
+        {col: -0.0 for col in FEATURE_COLUMNS}, FEATURE_COLUMNS
+    )
+    
+    keys = [cache.make_key('v1', canonical_feature_vector(row, FEATURE_COLUMNS)) for row in features]
+    assert cache.make_key('v2', vector) != keys[0]
+    
+    cache.put_many('v1', {keys[0]: {'risk_score': 0.1}, keys[1]: {'risk_score': 0.2, 'feature_contributions': {}}})
+    assert cache.get_many(keys) == {keys[0]: {'risk_score': 0.1}, keys[1]: {'risk_score': 0.2, 'feature_contributions': {}}}
+    assert list(cache.get_many(keys, require_contributions=True)) == [keys[1]]
+    
+    # keys[0] was read last, so keys[1] is evicted when keys[2] pushes past max_entries
+    time.sleep(0.01)
+    cache.get_many([keys[0]])
+    cache.put_many('v2', {keys[2]: {'risk_score': 0.3}})
+    reopened = PredictionCache(path)
+    assert set(reopened.get_many(keys)) == {keys[0], keys[2]}
+    
+    reopened.invalidate(keep_version='v2')
+    assert set(reopened.get_many(keys)) == {keys[2]}
+    assert cache.stats()['entries'] == 1
+
+
+def test_coalescer_batches_concurrent_predictions():
+    """Concurrent single predictions share one predict_many call and each gets its own row back"""
+    predictor = MLPredictor(_get_model_path())
+    features = _sample_features(16)
+    expected = predictor.predict_many(features, include_contributions=True)
+    
+    calls = []
+    scored = predictor.predict_many
+    
+    # Slow enough that every thread arrives while the first call is running
+    def predict_many(rows, include_contributions=False):
+        calls.append(len(rows))
+        time.sleep(0.05)
+        if any(row.get('attendance_rate') == 'fail' for row in rows):
+            raise ValueError('model call failed')
+        return scored(rows, include_contributions=include_contributions)
+    
+    predictor.predict_many = predict_many
+    coalescer = PredictionCoalescer(window_seconds=0.2, max_batch=8)
+    
+    def run(rows):
+        results = [None] * len(rows)
+        barrier = threading.Barrier(len(rows))
+        
+        def call(i):
+            barrier.wait()
+            try:
+                results[i] = coalescer.predict(predictor, rows[i], include_contributions=True)
+            except ValueError as e:
+                results[i] = e
+        
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(len(rows))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+    
+    assert run(features) == expected
+    assert sum(calls) == 16 and len(calls) <= 4 and max(calls) <= 8
+    
+    # A lone caller does not wait out the window
+    calls.clear()
+    start = time.monotonic()
+    assert coalescer.predict(predictor, features[0], include_contributions=True) == expected[0]
+    assert calls == [1] and time.monotonic() - start < 0.2
+    
+    # A failed model call fails every request in the batch
+    failing = [dict(row, attendance_rate='fail') for row in features[:3]]
+    results = run(failing)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert coalescer._scoring == 0 and not coalescer._open
+    
+    # A request queued behind a running call goes as soon as it finishes,
+    # not when the window ends
+    coalescer.window_seconds = 5
+    start = time.monotonic()
+    assert run(features[:2]) == expected[:2]
+    assert time.monotonic() - start < 1
+
+
+def test_metrics_render_prometheus_text():
+    """Stage timings and cache counters show up in the Prometheus exposition"""
+    with time_stage('unit_test_stage'):
+        MLPredictor(_get_model_path()).predict_many(_sample_features(5))
+    record_cache_lookups('unit_test_cache', hits=3, misses=1)
+    
+    body, content_type = render_metrics()
+    text = body.decode('utf-8')
+    assert content_type.startswith('text/plain')
+    assert 'ml_stage_duration_seconds_count{stage="unit_test_stage"} 1.0' in text
+    assert 'ml_stage_duration_seconds_bucket{le="+Inf",stage="feature_extraction"}' in text
+    assert 'ml_cache_lookups_total{cache="unit_test_cache",result="hit"} 3.0' in text
+
+
+def test_incremental_update_grows_and_retires_trees():
+    """Incremental updates add trees on new data, retire stale ones and record windows"""
+    workdir = tempfile.mkdtemp()
+    base_path = os.path.join(workdir, 'base', 'dropout_model.pkl')
+    os.makedirs(os.path.dirname(base_path))
+    train_new_model(generate_synthetic_data_fast(n_samples=1000, random_state=1), base_path)
+    
+    # Pretend the first 30 trees were fitted on year-old data
+    metadata_path = os.path.join(os.path.dirname(base_path), 'model_metadata.json')
+    with open(metadata_path, 'r') as f:
+        metadata = json.load(f)
+    assert len(metadata['tree_windows']) == 100
+    for window in metadata['tree_windows'][:30]:
+        window.update(start='2020-01-01T00:00:00', end='2020-06-01T00:00:00')
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f)
+    
+    new_data = generate_synthetic_data_fast(n_samples=400, random_state=2)
+    model_path = os.path.join(workdir, 'dropout_model.pkl')
+    result = update_model_incrementally(
+        new_data, base_path, model_path,
+        n_new_trees=10, max_trees=75, max_tree_age_days=180
+    )
+    
+    # 30 stale trees retired, then 5 more of the oldest to respect max_trees
+    assert result['trees_added'] == 10
+    assert result['trees_retired'] == 35
+    assert result['n_estimators'] == 75
+    assert 0.5 < result['roc_auc'] <= 1.0
+    
+    predictor = MLPredictor(model_path)
+    assert len(predictor.model.estimators_) == 75
+    assert predictor.metadata['training_mode'] == 'incremental'
+    assert len(predictor.metadata['tree_windows']) == 75
+    assert predictor.metadata['tree_windows'][-1]['samples'] == 400
+    # Legacy windows without an offset and new UTC ones compare as datetimes
+    window_ends = [parse_window_time(window['end']) for window in predictor.metadata['tree_windows']]
+    assert all(end.year > 2021 for end in window_ends)
+    assert predictor.metadata['tree_windows'][-1]['end'].endswith('+00:00')
+    assert datetime.fromisoformat(predictor.metadata['training_date']).utcoffset() == timedelta(0)
+    assert 'error' not in predictor.predict_many(_sample_features(5))[0]
+    
+    try:
+        update_model_incrementally(new_data[new_data['dropped_out'] == 0], model_path, model_path)
+        assert False, "one-class update should be rejected"
+    except ValueError:
+        pass
+
+
+def test_registry_publish_and_background_retrain():
+    """Retrain jobs publish registry versions atomically and record their status"""
+    registry_dir = tempfile.mkdtemp()
+    df = generate_synthetic_data(n_samples=300, random_state=3)
+    model_path = os.path.join(registry_dir, 'legacy.pkl')
+    
+    runner = RetrainJobRunner(os.path.join(registry_dir, 'jobs'))
+    job_ids = [
+        runner.submit(train_new_model, df, model_path, registry_dir=registry_dir)
+        for _ in range(2)
+    ]
+    statuses = [_wait_for_job(runner, job_id) for job_id in job_ids]
+    assert all(status['status'] == 'succeeded' for status in statuses)
+    versions = [status['result']['model_version'] for status in statuses]
+    assert versions[0] != versions[1]
+    assert read_current_version(registry_dir) == versions[1]
+    
+    model_file, metadata_file = version_paths(versions[0], registry_dir)
+    predictor = MLPredictor(model_file, metadata_path=metadata_file)
+    assert predictor.model_version == versions[0]
+    
+    set_current_version(versions[0], registry_dir)
+    assert read_current_version(registry_dir) == versions[0]
+    assert not [name for name in os.listdir(registry_dir) if name.startswith('.')]
+    
+    failed_id = runner.submit(train_new_model, df.drop(columns=['dropped_out']), model_path)
+    assert _wait_for_job(runner, failed_id)['status'] == 'failed'
+    assert runner.get('../../etc/passwd') is None
+
+
+def test_retrain_jobs_fit_one_at_a_time_and_fail_orphans():
+    """Runners sharing a jobs directory never fit concurrently; jobs of dead workers are reported failed"""
+    jobs_dir = tempfile.mkdtemp()
+    fitting = []
+    overlaps = []
+    
+    def fit(seconds):
+        fitting.append(1)
+        overlaps.append(len(fitting))
+        time.sleep(seconds)
+        fitting.pop()
+        return seconds
+    
+    # Separate runners stand in for separate workers: each has its own executor
+    runners = [RetrainJobRunner(jobs_dir) for _ in range(3)]
+    job_ids = [(runner, runner.submit(fit, 0.1)) for runner in runners]
+    statuses = [_wait_for_job(runner, job_id) for runner, job_id in job_ids]
+    assert all(status['status'] == 'succeeded' for status in statuses)
+    assert overlaps == [1, 1, 1]
+    
+    runner = runners[0]
+    with runner.fit_lock():
+        waiting_id = runner.submit(fit, 0)
+        time.sleep(0.2)
+        assert runner.get(waiting_id)['status'] == 'queued'
+    assert _wait_for_job(runner, waiting_id)['status'] == 'succeeded'
+    
+    exited = subprocess.Popen(['true'])
+    exited.wait()
+    orphan_id = runner.submit(fit, 0)
+    _wait_for_job(runner, orphan_id)
+    status = runner.get(orphan_id)
+    status.update(status='running', pid=exited.pid)
+    runner._write(orphan_id, status)
+    status = runner.get(orphan_id)
+    assert status['status'] == 'failed' and f'process {exited.pid} exited' in status['error']
+    assert RetrainJobRunner(jobs_dir).get(orphan_id)['status'] == 'failed'
+
+
+def test_compact_artifact_round_trip_integrity_and_rollback():
+    """Registry artifacts score like the sklearn model, reject corrupt files and roll back"""
+    registry_dir = tempfile.mkdtemp()
+    df = generate_synthetic_data(n_samples=400, random_state=5)
+    model_path = os.path.join(registry_dir, 'legacy.pkl')
+    first = train_new_model(df, model_path, registry_dir=registry_dir)['model_version']
+    second = train_new_model(df.sample(frac=0.9, random_state=1), model_path,
+                             registry_dir=registry_dir)['model_version']
+    
+    version_dir, _ = version_paths(second, registry_dir)
+    metadata = verify_version(second, registry_dir)
+    assert metadata['schema_version'] == 2
+    assert set(metadata['confusion_matrix']) == {'tn', 'fp', 'fn', 'tp'}
+    assert len(metadata['artifact']['content_hash']) == 64
+    
+    # float32 thresholds are rounded down, so rows sitting exactly on a
+    # threshold still go the same way as in sklearn
+    compiled = MLPredictor(version_dir, engine='compiled')
+    reference = MLPredictor(version_dir)
+    X = df[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+    thresholds = compiled.compiled_forest.threshold
+    features = compiled.compiled_forest.feature
+    split_nodes = np.flatnonzero(compiled.compiled_forest.children_left != np.arange(len(thresholds)))
+    X_edges = np.repeat(X[:1], len(split_nodes), axis=0)
+    X_edges[np.arange(len(split_nodes)), features[split_nodes]] = thresholds[split_nodes]
+    full_precision = CompiledForest(reference.model)
+    for rows in (X, X_edges):
+        assert np.array_equal(compiled.compiled_forest.predict_proba(rows), full_precision.predict_proba(rows))
+        expected = reference.model.predict_proba(pd.DataFrame(rows, columns=FEATURE_COLUMNS))[:, 1]
+        assert np.allclose(compiled.compiled_forest.predict_proba(rows), expected, rtol=0, atol=1e-12)
+    assert compiled._model is None
+    assert compiled._get_feature_importance() == reference._get_feature_importance()
+    
+    with open(os.path.join(version_dir, FOREST_FILENAME), 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+    try:
+        MLPredictor(version_dir, engine='compiled')
+        raise AssertionError("Corrupt artifact loaded")
+    except ValueError:
+        pass
+    
+    assert rollback(registry_dir=registry_dir) == first
+    assert read_current_version(registry_dir) == first
+    try:
+        rollback(second, registry_dir)
+        raise AssertionError("Rolled back to a corrupt version")
+    except ValueError:
+        assert read_current_version(registry_dir) == first
+    
+    legacy = normalize_metadata({
+        'metrics': {'accuracy': 0.9, 'roc_auc': 0.95},
+        'confusion_matrix': {'true_negatives': 5, 'true_positives': 3},
+        'feature_importance': [{'feature': 'attendance_rate', 'importance': 0.4}]
+    })
+    assert legacy['accuracy'] == 0.9 and 'metrics' not in legacy
+    assert legacy['confusion_matrix'] == {'tn': 5, 'tp': 3}
+    assert legacy['feature_importance'] == {'attendance_rate': 0.4}
+
+
+def test_rollback_skips_unpromoted_shadow_versions():
+    """Rollback returns to the last version actually served, never to a shadow-only candidate"""
+    registry_dir = tempfile.mkdtemp()
+    df = generate_synthetic_data(n_samples=200, random_state=6)
+    model = RandomForestClassifier(n_estimators=5, max_depth=4, random_state=0)
+    model.fit(df[FEATURE_COLUMNS], df['dropped_out'])
+    
+    a = publish_model(model, {}, registry_dir)['model_version']
+    b = publish_model(model, {}, registry_dir, shadow=True)['model_version']
+    c = publish_model(model, {}, registry_dir)['model_version']
+    assert read_current_history(registry_dir) == [a, c]
+    assert rollback(registry_dir=registry_dir) == a
+    
+    # A promoted candidate was served, so it becomes a rollback target
+    assert promote_shadow(registry_dir) == b
+    assert rollback(registry_dir=registry_dir) == a
+    set_current_version(c, registry_dir)
+    assert rollback(registry_dir=registry_dir) == b
+    assert read_current_history(registry_dir) == [a, b, c]
+
+
+def test_successive_halving_search_narrows_to_one_winner():
+    """Each rung keeps the best third on three times the rows; the winner comes from the space"""
+    df = generate_synthetic_data_fast(n_samples=3000, random_state=4)
+    baseline = {'n_estimators': 50, 'max_depth': 8, 'min_samples_split': 10,
+                'min_samples_leaf': 5, 'max_features': 'sqrt'}
+    search = successive_halving_search(
+        df[FEATURE_COLUMNS], df['dropped_out'],
+        budget_seconds=120, n_candidates=9, n_jobs=2, baseline=baseline
+    )
+    
+    rungs = [[entry for entry in search['trace'] if entry['rung'] == rung]
+             for rung in range(search['rungs_completed'])]
+    assert [len(entries) for entries in rungs] == [9, 3, 1]
+    assert rungs[0][0]['params'] == baseline
+    assert rungs[1][0]['rows'] == 3 * rungs[0][0]['rows']
+    assert all(value in SEARCH_SPACE[name] for name, value in search['best'].items())
+    assert search['objective'] == search['roc_auc'] - search['latency_weight'] * search['latency_us_per_row']
+    
+    try:
+        successive_halving_search(df[FEATURE_COLUMNS], df['dropped_out'], budget_seconds=0)
+        assert False, "a zero budget should finish no rung"
+    except TimeoutError:
+        pass
+    
+    # Fits still running at the deadline are stopped, not left to finish
+    started = time.monotonic()
+    try:
+        successive_halving_search(df[FEATURE_COLUMNS], df['dropped_out'], budget_seconds=0.5,
+                                  n_candidates=27, n_jobs=2)
+    except TimeoutError:
+        pass
+    assert time.monotonic() - started < 0.5 + 1.0
+    assert not multiprocessing.active_children()
+
+
+def test_training_store_appends_compact_partitions():
+    """Appends skip stored rows, use compact dtypes and load the newest row per student"""
+    store = TrainingDataStore(tempfile.mkdtemp())
+    df = generate_synthetic_data_fast(n_samples=500, random_state=5)
+    df['student_id'] = [f'student-{i}' for i in range(len(df))]
+    df['dropout_date'] = np.where(df['dropped_out'] == 1, '2026-01-05T10:00:00Z', None)
+    
+    assert store.append(df, date(2026, 1, 1)) == 500
+    assert store.append(df, date(2026, 1, 2)) == 0
+    updated = df.iloc[:10].assign(attendance_rate=0.1)
+    assert store.append(updated, date(2026, 1, 2)) == 10
+    assert store.stats()['partitions'] == 2
+    assert store.stats()['rows'] == 510
+    
+    loaded = store.load(FEATURE_COLUMNS + ['dropped_out'], latest_by='student_id')
+    assert list(loaded.columns) == FEATURE_COLUMNS + ['dropped_out']
+    assert len(loaded) == 500
+    assert loaded['attendance_rate'].dtype == np.float32
+    assert loaded['days_tracked'].dtype.itemsize < 8
+    assert (loaded['attendance_rate'].iloc[-10:] == np.float32(0.1)).all()
+    assert np.allclose(loaded['avg_marks_percentage'].iloc[:490], df['avg_marks_percentage'].iloc[10:], atol=1e-4)
+    
+    assert len(store.load(['attendance_rate'], since=date(2026, 1, 2))) == 10
+    dates = store.load(['dropout_date'])['dropout_date']
+    assert dates.notna().sum() == df['dropped_out'].sum() + updated['dropped_out'].sum()
+
+
+def test_training_store_keeps_reverted_rows():
+    """A row is deduplicated only against its key's latest row, so a label going 1 -> 0 -> 1 ends at 1"""
+    store = TrainingDataStore(tempfile.mkdtemp())
+    df = generate_synthetic_data_fast(n_samples=20, random_state=6).assign(dropped_out=0)
+    df['student_id'] = [f'student-{i}' for i in range(len(df))]
+    first = df.iloc[:1].assign(dropped_out=1)
+    
+    assert store.append(df) == 20
+    assert store.append(first) == 1
+    assert store.append(first.assign(dropped_out=0)) == 1
+    assert store.append(first) == 1
+    assert store.append(first) == 0
+    assert store.load(['dropped_out'], latest_by='student_id')['dropped_out'].iloc[-1] == 1
+    
+    # Repeats within one batch collapse; a store without the index rebuilds it
+    os.remove(os.path.join(store.root, '_latest_by_student_id.npz'))
+    assert store.append(pd.concat([first, first, df.iloc[1:3]])) == 0
+    assert store.append(df.iloc[1:3].assign(attendance_rate=0.1)) == 2
+
+
+class _MockTrainingDataHandler(BaseHTTPRequestHandler):
+    """Stands in for the backend's cursor-paginated /api/dropout/training-data"""
+    protocol_version = 'HTTP/1.1'
+    records = []
+    requests_seen = []
+    
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        limit = int(query['limit'][0])
+        cursor = query.get('cursor', [None])[0]
+        page = [r for r in self.records if cursor is None or r['student_id'] > cursor][:limit]
+        body = json.dumps({
+            'success': True,
+            'total_records': len(page),
+            'dropped_out_count': sum(r['dropped_out'] for r in page),
+            'active_count': sum(1 - r['dropped_out'] for r in page),
+            'training_data': page,
+            'next_cursor': page[-1]['student_id'] if len(page) == limit else None
+        }).encode('utf-8')
+        
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped:
+            body = gzip.compress(body)
+        self.requests_seen.append({'cursor': cursor, 'gzip': gzipped, 'port': self.client_address[1]})
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def test_training_data_client_pages_gzip_over_one_connection():
+    """Cursor pages arrive gzipped over one pooled connection and parse into one frame"""
+    df = generate_synthetic_data_fast(n_samples=200, random_state=6)
+    records = df.to_dict(orient='records')
+    for i, record in enumerate(records):
+        record.update(student_id=f'student-{i:04d}', dropout_reason=None)
+    _MockTrainingDataHandler.records = records
+    _MockTrainingDataHandler.requests_seen = []
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _MockTrainingDataHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # Tiny chunks so records, keys and numbers are cut at every boundary
+        client = TrainingDataClient(f'http://127.0.0.1:{server.server_port}', page_size=70, chunk_size=97)
+        fetched = client.fetch()
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+    
+    seen = _MockTrainingDataHandler.requests_seen
+    assert [request['cursor'] for request in seen] == [None, 'student-0069', 'student-0139']
+    assert all(request['gzip'] for request in seen)
+    assert len({request['port'] for request in seen}) == 1
+    
+    assert len(fetched) == 200
+    assert list(fetched['student_id']) == [record['student_id'] for record in records]
+    assert fetched['attendance_rate'].dtype == np.float32
+    assert np.allclose(fetched['avg_marks_percentage'], df['avg_marks_percentage'], atol=1e-4)
+    assert (fetched['dropped_out'].to_numpy() == df['dropped_out'].to_numpy()).all()
+    
+    parser = StreamingObjectParser(lambda record: None)
+    parser.feed('{"success": true, "training_data": [{"a": 1}')
+    try:
+        parser.close()
+        assert False, "a truncated response should be rejected"
+    except ValueError:
+        pass
+
+
+class _SlowExplainer:
+    """Stands in for GeminiExplainer; answers after delay seconds"""
+    
+    def __init__(self, delay):
+        self.delay = delay
+    
+    def generate_explanation(self, student_data, risk_result):
+        time.sleep(self.delay)
+        return {'success': True, 'explanation': 'Gemini says hi', 'recommendations': ['R'], 'priority_actions': ['P']}
+
+
+def test_predict_explanation_deadline_and_explanation_endpoint():
+    """A late explanation returns the fallback plus an ID that later serves Gemini's answer"""
+    import app as service
+    
+    saved = {name: getattr(service, name) for name in (
+        'ml_predictor', 'gemini_explainer', 'explanation_jobs', 'explanation_cache',
+        'prediction_cache', '_last_model_check'
+    )}
+    saved_deadline = Config.EXPLANATION_DEADLINE_SECONDS
+    try:
+        service.ml_predictor = MLPredictor(_get_model_path())
+        service._last_model_check = float('inf')  # no registry swaps mid-test
+        service.explanation_cache = None
+        service.prediction_cache = None
+        service.explanation_jobs = ExplanationJobs(os.path.join(tempfile.mkdtemp(), 'jobs.db'))
+        Config.EXPLANATION_DEADLINE_SECONDS = 0.2
+        client = service.app.test_client()
+        payload = {'student_id': 's1', 'features': _sample_features(1)[0]}
+        
+        service.gemini_explainer = _SlowExplainer(delay=0)
+        body = client.post('/predict', json=payload).get_json()
+        assert body['explanation'] == 'Gemini says hi'
+        assert 'explanation_id' not in body
+        
+        service.gemini_explainer = _SlowExplainer(delay=1.0)
+        start = time.monotonic()
+        body = client.post('/predict', json=payload).get_json()
+        assert time.monotonic() - start < 0.9
+        assert body['explanation'] != 'Gemini says hi'
+        assert body['explanation_status'] == 'pending'
+        assert body['prediction']['risk_level']
+        
+        response = client.get(body['explanation_url'])
+        assert response.status_code == 202
+        deadline = time.monotonic() + 10
+        while response.status_code == 202 and time.monotonic() < deadline:
+            time.sleep(0.05)
+            response = client.get(body['explanation_url'])
+        assert response.status_code == 200
+        assert response.get_json()['source'] == 'gemini'
+        assert response.get_json()['explanation'] == 'Gemini says hi'
+        
+        assert client.get('/explanations/unknown').status_code == 404
+    finally:
+        for name, value in saved.items():
+            setattr(service, name, value)
+        Config.EXPLANATION_DEADLINE_SECONDS = saved_deadline
+
+
+def test_liveness_answers_before_readiness():
+    """/health/live answers while startup is still running; /health/ready waits for the model"""
+    import app as service
+    
+    assert {'imports', 'model_load', 'gemini_init'} <= set(service.startup_timings)
+    
+    saved_pid = service._startup_pid
+    client = service.app.test_client()
+    try:
+        # Pretend this worker's startup thread is still loading the model
+        service._startup_pid = os.getpid()
+        service._startup_done.clear()
+        start = time.monotonic()
+        assert client.get('/health/live').status_code == 200
+        response = client.get('/health/ready')
+        assert time.monotonic() - start < 1.0
+        assert response.status_code == 503
+        assert response.get_json()['status'] == 'starting'
+    finally:
+        service._startup_done.set()
+        service._startup_pid = saved_pid
+    
+    response = client.get('/health/ready')
+    assert response.status_code == (200 if service.ml_predictor is not None else 503)
+    assert 'model_load' in response.get_json()['startup_seconds']
+
+
+def test_startup_phase_survives_metric_failure():
+    """A failing startup metric write is logged; the phase's timing is kept and later phases run"""
+    class BrokenGauge:
+        def labels(self, *labels):
+            raise ValueError('metrics directory is gone')
+    
+    saved_gauge = metrics.STARTUP_SECONDS
+    metrics.STARTUP_SECONDS = BrokenGauge()
+    timings = {}
+    try:
+        with time_startup_phase('imports', timings):
+            pass
+        with time_startup_phase('model_load', timings):
+            pass
+        assert set(timings) == {'imports', 'model_load'}
+        
+        # The phase's own error still propagates
+        try:
+            with time_startup_phase('warm_up', timings):
+                raise RuntimeError('model failed')
+            assert False, 'expected the phase error'
+        except RuntimeError as e:
+            assert str(e) == 'model failed'
+        assert 'warm_up' in timings
+    finally:
+        metrics.STARTUP_SECONDS = saved_gauge
+
+
+def test_batch_predict_columnar_formats_match_rows():
+    """Columnar JSON and MessagePack bodies score like the row format, negotiated by Content-Type/Accept"""
+    import app as service
+    from models.batch_payload import COLUMNAR_JSON_MIMETYPE, MSGPACK_MIMETYPE
+    
+    saved = {name: getattr(service, name) for name in (
+        'ml_predictor', 'gemini_explainer', 'prediction_cache', 'shadow_version', '_last_model_check'
+    )}
+    try:
+        service.ml_predictor = MLPredictor(_get_model_path())
+        service._last_model_check = float('inf')
+        service.gemini_explainer = None
+        service.prediction_cache = None
+        service.shadow_version = None
+        client = service.app.test_client()
+        
+        features = _sample_features(200)
+        features[3]['data_tier'] = 0
+        features[5]['attendance_rate'] = 'n/a'
+        student_ids = [f's{i}' for i in range(len(features))]
+        rows = client.post('/batch-predict', json={
+            'students': [{'student_id': sid, 'features': row} for sid, row in zip(student_ids, features)],
+            'include_factors': True
+        }).get_json()['predictions']
+        
+        columnar = {
+            'student_id': student_ids,
+            'features': {name: [row[name] for row in features] for name in features[0]},
+            'include_factors': True
+        }
+        response = client.post('/batch-predict', data=json.dumps(columnar), content_type=COLUMNAR_JSON_MIMETYPE)
+        assert response.status_code == 200 and response.mimetype == COLUMNAR_JSON_MIMETYPE
+        columns = json.loads(response.data)
+        assert columns['student_id'] == student_ids
+        assert columns['risk_score'] == [row.get('risk_score') for row in rows]
+        assert columns['risk_level'] == [row.get('risk_level') for row in rows]
+        assert columns['top_factors'] == [row.get('top_factors') for row in rows]
+        assert columns['error'][3] == 'Insufficient data' and columns['risk_score'][3] is None
+        assert columns['error'][5] == rows[5]['error'] and columns['risk_level'][5] is None
+        
+        packed = client.post('/batch-predict', data=msgpack.packb(columnar), content_type=MSGPACK_MIMETYPE)
+        assert packed.mimetype == MSGPACK_MIMETYPE
+        assert msgpack.unpackb(packed.data) == columns
+        
+        # Accept overrides the request's format, in both directions
+        as_rows = client.post('/batch-predict', data=msgpack.packb(columnar), content_type=MSGPACK_MIMETYPE,
+                              headers={'Accept': 'application/json'}).get_json()['predictions']
+        assert [row.get('risk_score') for row in as_rows] == [row.get('risk_score') for row in rows]
+        response = client.post('/batch-predict', json={
+            'students': [{'student_id': sid, 'features': row} for sid, row in zip(student_ids, features)]
+        }, headers={'Accept': MSGPACK_MIMETYPE, 'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert msgpack.unpackb(gzip.decompress(response.data))['risk_score'] == columns['risk_score']
+        
+        # data_tier is validated per row like the features
+        tiers = columnar['features']['data_tier']
+        tiers[10], tiers[11], tiers[12], tiers[13] = [2], 'high', 5, 2.0
+        response = client.post('/batch-predict', data=json.dumps(columnar), content_type=COLUMNAR_JSON_MIMETYPE)
+        assert response.status_code == 200
+        bad_tiers = json.loads(response.data)
+        assert [bad_tiers['risk_level'][i] for i in (10, 11, 12)] == [None] * 3
+        assert bad_tiers['error'][11].startswith('data_tier: could not convert')
+        assert bad_tiers['error'][12] == 'data_tier must be between 0 and 3 (got 5)'
+        assert bad_tiers['data_tier'][12] is None and bad_tiers['data_tier'][13] == 2
+        assert bad_tiers['risk_score'][13] == columns['risk_score'][13]
+        assert bad_tiers['risk_score'][14:] == columns['risk_score'][14:]
+        
+        columnar['features']['behavior_score'] = columnar['features']['behavior_score'][:-1]
+        response = client.post('/batch-predict', data=json.dumps(columnar), content_type=COLUMNAR_JSON_MIMETYPE)
+        assert response.status_code == 400 and 'differ in length' in response.get_json()['error']
+    finally:
+        for name, value in saved.items():
+            setattr(service, name, value)
+
+
+def test_batch_predict_stream_ndjson_in_order_across_chunks():
+    """/batch-predict/stream answers one NDJSON line per input line, in order, and reports bad lines in-band"""
+    import app as service
+    
+    saved = {name: getattr(service, name) for name in (
+        'ml_predictor', 'gemini_explainer', 'prediction_cache', 'shadow_version', '_last_model_check'
+    )}
+    saved_chunk_size = Config.STREAM_CHUNK_SIZE
+    try:
+        service.ml_predictor = MLPredictor(_get_model_path())
+        service._last_model_check = float('inf')
+        service.gemini_explainer = None
+        service.prediction_cache = None
+        service.shadow_version = None
+        Config.STREAM_CHUNK_SIZE = 7
+        client = service.app.test_client()
+        
+        features = _sample_features(40)
+        features[12]['attendance_rate'] = 'n/a'
+        students = [{'student_id': f's{i}', 'features': row} for i, row in enumerate(features)]
+        expected = client.post('/batch-predict', json={'students': students}).get_json()['predictions']
+        
+        lines = [json.dumps(student) for student in students]
+        lines[6] = '{"student_id": "s6", "features": '
+        lines[20] = '[1, 2, 3]'
+        lines.insert(30, '')
+        response = client.post('/batch-predict/stream', data='\n'.join(lines) + '\n',
+                               content_type='application/x-ndjson')
+        assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+        
+        body = response.get_data(as_text=True)
+        assert body.endswith('\n')
+        results = [json.loads(line) for line in body.splitlines()]
+        assert len(results) == len(students)
+        
+        assert results[6] == {'line': 7, 'error': results[6]['error']}
+        assert results[6]['error'].startswith('Invalid JSON')
+        assert results[20] == {'line': 21, 'error': 'Invalid JSON: Each line must be a JSON object'}
+        assert results[12]['student_id'] == 's12' and results[12]['error'] == expected[12]['error']
+        
+        for i, (result, reference) in enumerate(zip(results, expected)):
+            if i in (6, 20):
+                continue
+            assert result['student_id'] == f's{i}'
+            assert result.get('risk_score') == reference.get('risk_score')
+            assert result.get('risk_level') == reference.get('risk_level')
+    finally:
+        Config.STREAM_CHUNK_SIZE = saved_chunk_size
+        for name, value in saved.items():
+            setattr(service, name, value)
+
+
+def test_shadow_candidate_scored_after_response_and_promoted():
+    """A shadow candidate scores live requests off the request path and can be promoted in one call"""
+    import app as service
+    
+    saved = {name: getattr(service, name) for name in (
+        'ml_predictor', 'loaded_registry_version', 'shadow_version', 'shadow_scorer',
+        'gemini_explainer', 'prediction_cache', '_last_model_check'
+    )}
+    saved_registry = Config.MODEL_REGISTRY_DIR
+    registry_dir = tempfile.mkdtemp()
+    try:
+        df = generate_synthetic_data(n_samples=400, random_state=5)
+        model_path = os.path.join(registry_dir, 'legacy.pkl')
+        served = train_new_model(df, model_path, registry_dir=registry_dir)['model_version']
+        candidate = train_new_model(df.sample(frac=0.8, random_state=2), model_path,
+                                    registry_dir=registry_dir, shadow=True)['model_version']
+        assert read_current_version(registry_dir) == served
+        assert read_shadow_version(registry_dir) == candidate
+        
+        Config.MODEL_REGISTRY_DIR = registry_dir
+        service.gemini_explainer = None
+        service.prediction_cache = None
+        service.shadow_scorer = ShadowScorer(
+            service._load_shadow_predictor, os.path.join(registry_dir, 'shadow.db'), flush_seconds=0.1
+        )
+        service._refresh_model(force=True)
+        assert service.loaded_registry_version == served
+        assert service.shadow_version == candidate
+        
+        client = service.app.test_client()
+        features = _sample_features(20)
+        response = client.post('/predict', json={'student_id': 's1', 'features': features[0]})
+        assert response.status_code == 200
+        response.close()  # the shadow batch is queued only once the response is closed
+        response = client.post('/batch-predict', json={
+            'students': [{'student_id': f's{i}', 'features': row} for i, row in enumerate(features)]
+        })
+        assert response.status_code == 200
+        response.close()
+        
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            comparisons = client.get('/shadow').get_json()['comparisons']
+            if comparisons and comparisons[0]['batches'] == 2:
+                break
+            time.sleep(0.05)
+        comparison = comparisons[0]
+        assert (comparison['primary_version'], comparison['shadow_version']) == (served, candidate)
+        assert comparison['rows'] == 21 and comparison['dropped_batches'] == 0
+        assert 0 <= comparison['risk_level_agreement'] <= 1
+        assert sum(sum(row.values()) for row in comparison['risk_level_transitions'].values()) == 21
+        assert comparison['mean_abs_score_delta'] <= comparison['max_abs_score_delta']
+        assert comparison['latency']['shadow']['mean_us_per_row'] > 0
+        
+        body = client.post('/shadow/promote').get_json()
+        assert (body['previous_version'], body['current_version']) == (served, candidate)
+        assert body['comparisons'][0]['rows'] == 21
+        assert service.loaded_registry_version == candidate and service.shadow_version is None
+        assert read_shadow_version(registry_dir) is None
+        assert client.post('/shadow/promote').status_code == 400
+    finally:
+        for name, value in saved.items():
+            setattr(service, name, value)
+        Config.MODEL_REGISTRY_DIR = saved_registry
+
+
+def test_event_aggregates_serve_predictions_from_current_state():
+    """Ingested events keep running per-student features that /predict and /batch-predict score from"""
+    import app as service
+    
+    aggregates = StudentAggregates(os.path.join(tempfile.mkdtemp(), 'aggregates.db'))
+    events = [
+        {'type': 'attendance', 'student_id': 's1', 'date': f'2024-09-{day:02d}',
+         'status': 'absent' if day % 4 == 0 else 'present'}
+        for day in range(1, 17)
+    ]
+    events += [
+        {'type': 'attendance', 'student_id': 's1', 'date': '2024-09-17', 'status': 'late'},
+        # Re-marked day: replaces the first mark instead of adding a day
+        {'type': 'attendance', 'student_id': 's1', 'date': '2024-09-04', 'status': 'present'},
+        {'type': 'exam', 'student_id': 's1', 'exam_id': 'e1', 'marks_obtained': 30, 'total_marks': 50},
+        {'type': 'exam', 'student_id': 's1', 'exam_id': 'e2', 'marks_obtained': 45, 'total_marks': 50,
+         'status': 'verified'},
+        {'type': 'exam', 'student_id': 's1', 'exam_id': 'e3', 'marks_obtained': 10, 'total_marks': 50,
+         'status': 'draft'},
+        {'type': 'incident', 'student_id': 's1', 'incident_id': 'i1', 'behavior_type': 'negative'},
+        {'type': 'incident', 'student_id': 's1', 'incident_id': 'i2', 'behavior_type': 'positive'},
+        {'type': 'incident', 'student_id': 's1', 'incident_id': 'i2', 'deleted': True},
+        {'type': 'exam', 'student_id': 's1', 'exam_id': 'e4', 'marks_obtained': 'ten', 'total_marks': 50},
+        {'type': 'homework', 'student_id': 's1'}
+    ]
+    
+    saved = {name: getattr(service, name) for name in (
+        'ml_predictor', 'gemini_explainer', 'prediction_cache', 'student_aggregates', '_last_model_check'
+    )}
+    try:
+        service.ml_predictor = MLPredictor(_get_model_path())
+        service._last_model_check = float('inf')
+        service.gemini_explainer = None
+        service.prediction_cache = None
+        service.student_aggregates = aggregates
+        client = service.app.test_client()
+        
+        response = client.post('/events', json={'events': events}).get_json()
+        assert response['applied'] == len(events) - 2
+        assert [item['index'] for item in response['rejected']] == [len(events) - 2, len(events) - 1]
+        
+        features = client.get('/students/s1/features').get_json()['features']
+        assert features == {
+            'attendance_rate': 13 / 17,
+            'avg_marks_percentage': 75.0,
+            'behavior_score': 90.0,
+            'days_tracked': 17,
+            'exams_completed': 2,
+            'days_present': 13,
+            'days_absent': 3,
+            'total_incidents': 1,
+            'positive_incidents': 0,
+            'negative_incidents': 1,
+            'total_marks_obtained': 75.0,
+            'total_marks_possible': 100.0,
+            'data_tier': 1
+        }
+        assert client.get('/students/unknown/features').status_code == 404
+        
+        # Three verified exams and 15+ days reach tier 3
+        client.post('/events', json={'events': [
+            {'type': 'exam', 'student_id': 's1', 'exam_id': f'x{i}', 'marks_obtained': 20, 'total_marks': 50}
+            for i in range(3)
+        ]})
+        features = aggregates.get_features(['s1'])[0]
+        assert features['data_tier'] == 3 and features['exams_completed'] == 5
+        
+        from_events = client.post('/predict', json={'student_id': 's1'}).get_json()
+        explicit = client.post('/predict', json={'student_id': 's1', 'features': features}).get_json()
+        assert from_events['prediction'] == explicit['prediction']
+        assert from_events['prediction']['data_tier'] == 3
+        assert client.post('/predict', json={'student_id': 'unknown'}).status_code == 400
+        
+        rows = client.post('/batch-predict', json={'students': [
+            {'student_id': 's1'}, {'student_id': 's2', 'features': features}, {'student_id': 'unknown'}
+        ]}).get_json()['predictions']
+        assert rows[0]['risk_score'] == rows[1]['risk_score'] == from_events['prediction']['risk_score']
+        assert rows[2]['error'] == 'Insufficient data'
+    finally:
+        for name, value in saved.items():
+            setattr(service, name, value)
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("ML Models - In-Process Test Suite")
+    print("=" * 60)
+    
+    tests = {
+        "Compiled Forest Parity": test_compiled_forest_matches_sklearn,
+        "Compiled Engine Predictions": test_compiled_engine_predictions_match,
+        "Batch Prediction Parity": test_predict_many_matches_predict,
+        "Feature Schema Validation": test_feature_schema_masks_invalid_rows_with_reasons,
+        "Null Feature Explanations": test_null_features_are_explained_with_schema_defaults,
+        "Omitted Feature Explanations": test_explanations_raise_no_issue_for_omitted_features,
+        "Feature Contributions": test_feature_contributions_decompose_prediction,
+        "Rule-Based Batch Parity": test_risk_batch_matches_scalar,
+        "Risk Table Validation": test_risk_tables_validated_on_load,
+        "Dropout Probability Parity": test_dropout_probability_batch_matches_scalar,
+        "Columnar Generator Equivalence": test_fast_generator_is_statistically_equivalent,
+        "Batched Explanations": test_batched_explanations_pack_and_fall_back,
+        "Explanation Cache": test_explanation_cache_lru_ttl_and_invalidation,
+        "Prediction Cache": test_prediction_cache_keys_lru_and_invalidation,
+        "Prediction Coalescer": test_coalescer_batches_concurrent_predictions,
+        "Prometheus Metrics": test_metrics_render_prometheus_text,
+        "Incremental Retraining": test_incremental_update_grows_and_retires_trees,
+        "Model Registry And Retrain Jobs": test_registry_publish_and_background_retrain,
+        "Retrain Job Locking": test_retrain_jobs_fit_one_at_a_time_and_fail_orphans,
+        "Compact Model Artifacts": test_compact_artifact_round_trip_integrity_and_rollback,
+        "Rollback Skips Shadow Versions": test_rollback_skips_unpromoted_shadow_versions,
+        "Successive Halving Search": test_successive_halving_search_narrows_to_one_winner,
+        "Training Data Store": test_training_store_appends_compact_partitions,
+        "Training Data Store Reverts": test_training_store_keeps_reverted_rows,
+        "Training Data Client": test_training_data_client_pages_gzip_over_one_connection,
+        "Explanation Deadline": test_predict_explanation_deadline_and_explanation_endpoint,
+        "Liveness And Readiness": test_liveness_answers_before_readiness,
+        "Startup Metric Failure": test_startup_phase_survives_metric_failure,
+        "Columnar Batch Payloads": test_batch_predict_columnar_formats_match_rows,
+        "Streaming Batch Predictions": test_batch_predict_stream_ndjson_in_order_across_chunks,
+        "Shadow Scoring": test_shadow_candidate_scored_after_response_and_promoted,
+        "Event Aggregates": test_event_aggregates_serve_predictions_from_current_state
+    }
+    
+    failed = 0
+    for test_name, test in tests.items():
+        try:
+            test()
+            print(f"{test_name}: ✓ PASSED")
+        except AssertionError as e:
+            failed += 1
+            print(f"{test_name}: ✗ FAILED {e}")
+    
+    print("\n" + ("All tests passed!" if not failed else f"{failed} test(s) failed."))
@@ -175,6 +175,51 @@ def test_batch_prediction():
         print(f"Error: {e}")
         return False
 
+def test_batch_prediction_stream():
+    """Test streaming NDJSON batch prediction endpoint"""
+    print("\nTesting streaming batch prediction...")
+    
+    students = [
+        {
+            "student_id": f"stream-student-{i}",
+            "features": {
+                "attendance_rate": 0.60 + i * 0.03,
+                "avg_marks_percentage": 45 + i * 4,
+                "behavior_score": 50 + i * 4,
+                "data_tier": 2,
+                "days_tracked": 40,
+                "exams_completed": 3,
+                "days_present": int(40 * (0.60 + i * 0.03)),
+                "days_absent": 40 - int(40 * (0.60 + i * 0.03)),
+                "total_incidents": 4,
+                "positive_incidents": 1,
+                "negative_incidents": 3
+            }
+        }
+        for i in range(10)
+    ]
+    body = "\n".join(json.dumps(student) for student in students)
+    
+    try:
+        response = requests.post(
+            f"{BASE_URL}/batch-predict/stream",
+            data=body,
+            headers={"Content-Type": "application/x-ndjson"},
+            stream=True
+        )
+        print(f"Status: {response.status_code}")
+        
+        predictions = [json.loads(line) for line in response.iter_lines() if line]
+        print(f"\n✓ Streamed {len(predictions)} predictions")
+        for pred in predictions[:3]:
+            if 'risk_level' in pred:
+                print(f"  - {pred['student_id']}: {pred['risk_level']} risk")
+        
+        return response.status_code == 200 and len(predictions) == len(students)
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+
 def test_feature_importance():
     """Test that feature importance is returned"""
     print("\nTesting feature importance...")
@@ -239,6 +284,7 @@ if __name__ == "__main__":
         "ML Prediction": test_prediction(),
         "Insufficient Data": test_insufficient_data(),
         "Batch Prediction": test_batch_prediction(),
+        "Streaming Batch Prediction": test_batch_prediction_stream(),
         "Feature Importance": test_feature_importance()
     }
     